@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_json_decoders.py
+----------------------------------------------------------------
+캐시된 companyfacts 코퍼스에서 JSON 디코더별 처리량(MB/s)을 측정.
+파일은 미리 메모리에 읽어(압축 객체는 해제) 디스크 I/O를 제외하고 디코드 시간만 잰다.
+
+USAGE (예)
+  python scripts/bench_json_decoders.py --cache-dir .cache/companyfacts --limit 100
+  python scripts/bench_json_decoders.py --facts-dir data/companyfacts --taxonomies std
+"""
+import argparse, pathlib, sys, time
+
+import select_xbrl_tags as sxt
+
+
+def collect_payloads(args) -> list:
+    if args.facts_dir:
+        paths = sorted(pathlib.Path(args.facts_dir).glob("*.json"))
+    else:
+        objects = pathlib.Path(args.cache_dir) / "objects"
+        paths = sorted(objects.rglob("*.json.gz")) + sorted(pathlib.Path(args.cache_dir).glob("*.json"))
+        paths = [p for p in paths if p.name != sxt.CacheStore.MANIFEST]
+    if args.limit:
+        paths = paths[:args.limit]
+    return [sxt.read_json_bytes(p) for p in paths]
+
+
+def bench(decoder: str, payloads: list, taxonomies, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for raw in payloads:
+            sxt.decode_facts_json(raw, taxonomies, decoder=decoder)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark JSON decoders on the companyfacts cache")
+    ap.add_argument("--cache-dir", default=sxt._COMPANYFACTS_CACHE_DIR, help="Company Facts cache dir")
+    ap.add_argument("--facts-dir", help="Directory of plain companyfacts JSON files (instead of the cache)")
+    ap.add_argument("--limit", type=int, help="Max files to load")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed passes per decoder; best pass is reported (default: 3)")
+    ap.add_argument("--taxonomies", help="Also decode with a taxonomy filter, e.g. 'std'")
+    args = ap.parse_args()
+
+    payloads = collect_payloads(args)
+    if not payloads:
+        raise SystemExit("No companyfacts files found")
+    total_mb = sum(len(p) for p in payloads) / 1e6
+    print(f"[INFO] {len(payloads)} files, {total_mb:.1f} MB decoded JSON", file=sys.stderr)
+
+    modes = [("all", None)]
+    if args.taxonomies:
+        modes.append((args.taxonomies, sxt.resolve_facts_taxonomies(args.taxonomies)))
+
+    print(f"{'decoder':<10} {'taxonomies':<12} {'seconds':>9} {'MB/s':>9}")
+    for decoder in sxt.available_json_decoders():
+        for label, taxonomies in modes:
+            dt = bench(decoder, payloads, taxonomies, max(1, args.repeat))
+            print(f"{decoder:<10} {label:<12} {dt:>9.3f} {total_mb / dt:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,14 +20,20 @@ USAGE (예)
     --debug --debug-file logs/debug.log
 """
 from __future__ import annotations
-import os, re, csv, math, json, argparse, pathlib, sys, time
+import os, re, csv, math, json, argparse, pathlib, sys, time, bisect, itertools
 from typing import Dict, List, Optional, Tuple, Set
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 import threading
+import atexit
+import asyncio
+import queue
 import tempfile
+import gzip
+import hashlib
 import shutil
+import zipfile
 import dotenv
 
 dotenv.load_dotenv()
@@ -37,6 +43,26 @@ try:
 except Exception:
     requests = None
 
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgspec
+except Exception:
+    msgspec = None
+
 # ================= RDF/TTL 내보내기 (인스턴스만) =================
 def _ttl_escape(s: str) -> str:
     if s is None:
@@ -93,24 +119,33 @@ def _parse_computed_from(computed_from: str) -> List[str]:
             metrics.append(part)
     return metrics
 
-def emit_efin_ttl(
-    companies: List[dict],
-    observations: List[dict],
-    outfile: str,
-    benchmarks: List[dict] = None,
-    rankings: List[dict] = None,
-    include_industry_scope: bool = False,
-    include_sector_scope: bool = False,
-):
+class TtlVocabulary:
     """
-    스키마(ttl)는 입력으로 받는 외부 파일을 사용하고, 여기서는 '인스턴스'만 생성한다.
-    prefix는 예시 네임스페이스(efin:)로 고정. 필요시 외부에서 prefix 매핑.
-    
-    efin_schema.ttl 기준으로:
-    - Sector/Industry를 인스턴스로 생성하고 ObjectProperty로 연결
-    - computed_from를 파싱하여 computedFromMetric으로 구조화
-    - 벤치마크 및 랭킹 인스턴스 생성
+    여러 관측값/회사가 공유하는 인스턴스(Sector/Industry/Unit/Currency/XBRLConcept) 추적.
+    처음 나올 때 기록만 했다가(고유 값 수만큼) 뒤에서 한 번씩 출력하며, 샤드별로 모은 것을 merge로 합칠 수 있음
+    (industry_sector는 전체 회사 목록으로 모은 vocab에만 의존)
     """
+    __slots__ = ("sectors", "industries", "industry_sector", "units", "currencies", "concepts")
+
+    def __init__(self):
+        self.sectors: Set[str] = set()
+        self.industries: Set[str] = set()
+        self.industry_sector: Dict[str, str] = {}  # industry -> sector
+        self.units: Set[str] = set()
+        self.currencies: Set[str] = set()
+        self.concepts: Dict[str, dict] = {}  # qname -> {iri, namespace}
+
+    def merge(self, other: "TtlVocabulary"):
+        # industry_sector는 합치지 않음: Industry→Sector 대응은 전체 회사 순서에서 처음 나온 회사가 정하므로
+        # 샤드 일부만 본 대응은 단일 파일에 없는 inSectorOf를 만들 수 있음 (전체 회사로 모은 쪽이 기준)
+        self.sectors |= other.sectors
+        self.industries |= other.industries
+        self.units |= other.units
+        self.currencies |= other.currencies
+        for qname, info in other.concepts.items():
+            self.concepts.setdefault(qname, info)
+
+def _ttl_prefix_lines() -> List[str]:
     # 인스턴스 파일은 스키마를 import하므로 최소한의 prefix만 선언
     # 스키마에서 정의된 모든 prefix는 스키마 import를 통해 사용 가능
     prefixes = [
@@ -124,7 +159,11 @@ def emit_efin_ttl(
     lines.append("# 이 파일은 efin_schema.ttl을 import하여 스키마의 클래스와 속성을 사용합니다.")
     lines.extend(prefixes)
     lines.append("")
+    return lines
+
+def _ttl_ontology_header_lines() -> List[str]:
     # 인스턴스 파일을 별도 온톨로지로 선언하고 스키마를 import
+    lines = []
     lines.append("#################################################################")
     lines.append("# Ontology Header for Instances")
     lines.append("#################################################################")
@@ -135,20 +174,12 @@ def emit_efin_ttl(
     lines.append("  rdfs:comment \"EFIN 재무 온톨로지의 인스턴스 데이터. 스키마 온톨로지에서 정의된 클래스와 속성을 사용하여 실제 재무 데이터를 표현함. 스키마의 모든 prefix와 import는 스키마 import를 통해 상속됨.\"@ko ;")
     lines.append("  owl:imports <https://w3id.org/edgar-fin/2024#> .")
     lines.append("")
+    return lines
 
-    # Sector/Industry 인스턴스 추적 (중복 방지)
-    sectors_seen: Set[str] = set()
-    industries_seen: Set[str] = set()
-    industry_sector_map: Dict[str, str] = {}  # industry -> sector
-    
-    # Unit 인스턴스 추적 (중복 방지)
-    units_seen: Set[str] = set()
-    currencies_seen: Set[str] = set()
-    
-    # XBRLConcept 인스턴스 추적 (중복 방지)
-    xbrl_concepts_seen: Dict[str, dict] = {}  # qname -> {iri, namespace}
-
-    # 회사들
+def _iter_company_ttl(companies, vocab: TtlVocabulary):
+    # 회사들 (Sector/Industry는 vocab에 기록만 하고 _iter_scope_ttl에서 출력)
+    lines = []
+    sectors_seen, industries_seen, industry_sector_map = vocab.sectors, vocab.industries, vocab.industry_sector
     for c in companies:
         cik = str(c.get("cik","")).zfill(10)
         sym = (c.get("symbol","") or "").upper()
@@ -194,7 +225,9 @@ def emit_efin_ttl(
         
         lines[-1] = lines[-1].rstrip(" ;")
         lines.append(".")
+        yield from lines; lines.clear()
 
+def _needs_sector_all(benchmarks, rankings) -> bool:
     # 전체 벤치마크/랭킹을 위한 Sector-All 인스턴스 필요 여부 확인
     needs_sector_all = False
     if benchmarks:
@@ -207,7 +240,11 @@ def emit_efin_ttl(
             if not r.get("industry", "").strip() and not r.get("sector", "").strip():
                 needs_sector_all = True
                 break
-    
+    return needs_sector_all
+
+def _iter_scope_ttl(vocab: TtlVocabulary, needs_sector_all: bool):
+    lines = []
+    sectors_seen, industries_seen, industry_sector_map = vocab.sectors, vocab.industries, vocab.industry_sector
     # Sector 인스턴스 생성
     if sectors_seen or needs_sector_all:
         lines.append("")
@@ -229,10 +266,17 @@ def emit_efin_ttl(
                 sector = industry_sector_map[industry]
                 sector_iri = f"efin:Sector{_iri_camel_case(sector)}"
                 lines.append(f"{industry_iri} efin:inSectorOf {sector_iri} .")
+    yield from lines
 
+def _iter_observation_ttl(observations, vocab: TtlVocabulary):
+    """관측값 문장을 내보내고 첫 번째 관측값을 반환 (랭킹 fy 대체값)"""
     # 관측값들 (메트릭 수준)
-    lines.append("")
+    lines = [""]
+    units_seen, currencies_seen, xbrl_concepts_seen = vocab.units, vocab.currencies, vocab.concepts
+    first_obs = None
     for o in observations:
+        if first_obs is None:
+            first_obs = o
         cik = str(o.get("cik","")).zfill(10)
         fy = str(o.get("fy",""))
         metric = o.get("metric","")
@@ -398,7 +442,12 @@ def emit_efin_ttl(
 
         lines[-1] = lines[-1].rstrip(" ;")
         lines.append(".")
+        yield from lines; lines.clear()
+    return first_obs
 
+def _iter_concept_ttl(vocab: TtlVocabulary):
+    lines = []
+    units_seen, currencies_seen, xbrl_concepts_seen = vocab.units, vocab.currencies, vocab.concepts
     # Unit 인스턴스 생성
     if units_seen:
         lines.append("")
@@ -429,9 +478,18 @@ def emit_efin_ttl(
                 lines.append(f'  efin:hasNamespace "{_ttl_escape(namespace)}"^^xsd:anyURI ;')
             lines[-1] = lines[-1].rstrip(" ;")
             lines.append(".")
+            yield from lines; lines.clear()
+    yield from lines
 
+def _iter_benchmark_ttl(benchmarks, include_industry_scope: bool, include_sector_scope: bool):
+    lines = []
     # 벤치마크 인스턴스 생성
     if benchmarks:
+        missing = [percentile_field(p) for p in TTL_BENCHMARK_PERCENTILES if percentile_field(p) not in benchmarks[0]]
+        if missing:
+            # 다른 --benchmark-percentiles로 만든 benchmarks CSV에서 읽은 경우
+            print(f"[WARN] benchmarks have no {', '.join(missing)} column; TTL benchmarks will omit those percentiles",
+                  file=sys.stderr)
         lines.append("")
         lines.append("# 벤치마크 통계")
         for b in benchmarks:
@@ -453,6 +511,16 @@ def emit_efin_ttl(
                 lines.append(f"  efin:forIndustry efin:Industry{_iri_camel_case(industry)} ;")
                 lines.append(f"  efin:forMetric efin:{_iri_safe(metric)} ;")
                 lines.append(f"  efin:forFiscalYear {int(fy)} ;")
+            elif sector:
+                # 섹터(Sector) 스코프 벤치마크: 플래그가 켜진 경우에만 생성
+                # 스키마에 섹터 전용 클래스가 없으므로 섹터 TopRanking과 같이 AllBenchmark + forSector 사용
+                if not include_sector_scope:
+                    continue
+                bench_iri = f"efin:AllBenchmarkSector{_iri_camel_case(sector)}{_iri_camel_case(metric)}{fy}"
+                lines.append(f"{bench_iri} a efin:AllBenchmark ;")
+                lines.append(f"  efin:forSector efin:Sector{_iri_camel_case(sector)} ;")
+                lines.append(f"  efin:forMetric efin:{_iri_safe(metric)} ;")
+                lines.append(f"  efin:forFiscalYear {int(fy)} ;")
             else:
                 # 전체 벤치마크 (industry와 sector가 모두 빈 값) - AllBenchmark 클래스 사용
                 bench_iri = f"efin:AllBenchmark{_iri_camel_case(metric)}{fy}"
@@ -466,8 +534,8 @@ def emit_efin_ttl(
             median = b.get("median_value")
             max_val = b.get("max_value")
             min_val = b.get("min_value")
-            p25 = b.get("percentile25")
-            p75 = b.get("percentile75")
+            p25 = b.get(percentile_field(TTL_BENCHMARK_PERCENTILES[0]))
+            p75 = b.get(percentile_field(TTL_BENCHMARK_PERCENTILES[1]))
             sample_size = b.get("sample_size")
             
             if avg is not None:
@@ -487,7 +555,11 @@ def emit_efin_ttl(
             
             lines[-1] = lines[-1].rstrip(" ;")
             lines.append(".")
+            yield from lines; lines.clear()
+    yield from lines
 
+def _iter_ranking_ttl(rankings, first_obs, include_industry_scope: bool, include_sector_scope: bool):
+    lines = []
     # 랭킹 인스턴스 생성
     if rankings:
         lines.append("")
@@ -500,11 +572,9 @@ def emit_efin_ttl(
             if isinstance(first_r, dict):
                 fy_ranking = str(first_r.get("fy", ""))
         
-        # fy가 없으면 observations에서 추출 시도
-        if not fy_ranking and observations:
-            first_obs = observations[0]
-            if isinstance(first_obs, dict):
-                fy_ranking = str(first_obs.get("fy", ""))
+        # fy가 없으면 첫 번째 observation에서 추출 시도
+        if not fy_ranking and first_obs is not None:
+            fy_ranking = str(first_obs.get("fy", ""))
         
         if not fy_ranking:
             fy_ranking = ""  # 빈 문자열로 처리
@@ -524,6 +594,8 @@ def emit_efin_ttl(
             
             if not metric or not ranking_type or not cik:
                 continue
+            # 여러 연도를 한 파일에 쓸 때(--fy-output combined)는 행마다 자기 fy
+            fy_row = str(r.get("fy") or "") or fy_ranking
             
             # TopRanking 인스턴스는 Top10 레코드만 대상으로 생성 (전체 순위 All 등은 CSV에만 유지)
             if ranking_type != "Top10":
@@ -542,17 +614,17 @@ def emit_efin_ttl(
                 # Industry별 랭킹
                 scope_type = "industry"
                 scope_value = industry
-                ranking_iri = f"efin:TopRanking{_iri_camel_case(scope_value)}{_iri_camel_case(metric)}{ranking_type}{fy_ranking}{cik.zfill(10)}"
+                ranking_iri = f"efin:TopRanking{_iri_camel_case(scope_value)}{_iri_camel_case(metric)}{ranking_type}{fy_row}{cik.zfill(10)}"
             elif sector:
                 # Sector별 랭킹
                 scope_type = "sector"
                 scope_value = sector
-                ranking_iri = f"efin:TopRankingSector{_iri_camel_case(scope_value)}{_iri_camel_case(metric)}{ranking_type}{fy_ranking}{cik.zfill(10)}"
+                ranking_iri = f"efin:TopRankingSector{_iri_camel_case(scope_value)}{_iri_camel_case(metric)}{ranking_type}{fy_row}{cik.zfill(10)}"
             else:
                 # 전체 랭킹
                 scope_type = "all"
                 scope_value = "All"
-                ranking_iri = f"efin:TopRankingAll{_iri_camel_case(metric)}{ranking_type}{fy_ranking}{cik.zfill(10)}"
+                ranking_iri = f"efin:TopRankingAll{_iri_camel_case(metric)}{ranking_type}{fy_row}{cik.zfill(10)}"
 
             # 업종/섹터 스코프 TopRanking는 Composite 지표에 대해서는 항상 생성
             # (Composite Top10 리더 Company 클래스 추론에 필요)
@@ -579,8 +651,8 @@ def emit_efin_ttl(
                 lines.append(f"  efin:forSector efin:SectorAll ;")
             
             lines.append(f"  efin:forMetric efin:{_iri_safe(metric)} ;")
-            if fy_ranking:
-                lines.append(f"  efin:forFiscalYear {int(fy_ranking)} ;")
+            if fy_row:
+                lines.append(f"  efin:forFiscalYear {int(fy_row)} ;")
             lines.append(f'  efin:hasRankingType "{_ttl_escape(ranking_type)}" ;')
             lines.append(f"  efin:hasRank {rank_int} ;")
             
@@ -603,159 +675,574 @@ def emit_efin_ttl(
             
             lines[-1] = lines[-1].rstrip(" ;")
             lines.append(".")
+            yield from lines; lines.clear()
             
             # 회사를 랭킹에 연결
             comp_iri = f"efin:CIK{cik.zfill(10)}"
             lines.append(f"{comp_iri} efin:hasRanking {ranking_iri} .")
 
-    with open(outfile, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines))
+    yield from lines
 
-def compute_benchmarks(tags_csv_path: str, fy: int) -> List[dict]:
+def iter_efin_ttl_lines(
+    companies: List[dict],
+    observations,
+    benchmarks: List[dict] = None,
+    rankings: List[dict] = None,
+    include_industry_scope: bool = False,
+    include_sector_scope: bool = False,
+):
     """
-    tags_{fy}.csv를 읽어서 산업별/섹터별 벤치마크 통계를 계산
-    
-    핵심 지표: ROE, ROIC, NetProfitMargin, DebtToEquity, CurrentRatio,
-              RevenueGrowthYoY, NetIncomeGrowthYoY, OperatingMargin, AssetTurnover
+    인스턴스 TTL을 한 줄씩 내보내는 제너레이터 (emit_efin_ttl이 파일에 나눠 씀).
+    문장(". "으로 끝나는 블록) 단위로만 버퍼에 모았다가 내보내므로 메모리는 관측값 수와 무관하고,
+    observations는 한 번만 순회하므로 이터레이터여도 됨.
+    Unit/Currency/XBRLConcept/Sector/Industry는 처음 나올 때 TtlVocabulary에만 기록했다가 뒤에서 출력.
+
+    스키마(ttl)는 입력으로 받는 외부 파일을 사용하고, 여기서는 '인스턴스'만 생성한다.
+    prefix는 예시 네임스페이스(efin:)로 고정. 필요시 외부에서 prefix 매핑.
     
-    Returns:
-        List[dict]: 벤치마크 통계 리스트 (CSV로 저장할 형식)
+    efin_schema.ttl 기준으로:
+    - Sector/Industry를 인스턴스로 생성하고 ObjectProperty로 연결
+    - computed_from를 파싱하여 computedFromMetric으로 구조화
+    - 벤치마크 및 랭킹 인스턴스 생성
     """
-    import statistics
-    
-    # 벤치마크는 핵심 지표 세트(BENCHMARK_RANKING_METRICS)에 대해서만 계산
-    KEY_METRICS = BENCHMARK_RANKING_METRICS
-    
-    benchmarks = []
-    
-    # CSV 읽기
-    with open(tags_csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-    
-    # 산업별/전체 그룹화
-    industry_groups: Dict[Tuple[str, str], List[float]] = {}  # (industry, metric) -> values
-    all_groups: Dict[str, List[float]] = {}  # metric -> values (전체 벤치마크용)
-    
-    for row in rows:
-        industry = row.get("industry", "").strip()
-        sector = row.get("sector", "").strip()
-        metric = row.get("metric", "").strip()
-        value_str = row.get("value", "").strip()
-        
-        if not industry or not metric or not value_str:
+    vocab = TtlVocabulary()
+    yield from _ttl_prefix_lines()
+    yield from _ttl_ontology_header_lines()
+    yield from _iter_company_ttl(companies, vocab)
+    yield from _iter_scope_ttl(vocab, _needs_sector_all(benchmarks, rankings))
+    first_obs = yield from _iter_observation_ttl(observations, vocab)
+    yield from _iter_concept_ttl(vocab)
+    yield from _iter_benchmark_ttl(benchmarks, include_industry_scope, include_sector_scope)
+    yield from _iter_ranking_ttl(rankings, first_obs, include_industry_scope, include_sector_scope)
+
+# N-Triples/N-Quads 변환: 병렬 로더(tdb2.tdbloader --loader=parallel 등)가 줄 단위로 나눠 읽을 수 있는 형식
+EMIT_FORMATS = ("ttl", "nt", "nq")
+_RDF_TYPE_IRI = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+_XSD = "http://www.w3.org/2001/XMLSchema#"
+# IRI / (타입·언어 태그가 붙을 수 있는) 문자열 리터럴 / 그 외 토큰
+_TTL_TERM_RE = re.compile(r'<[^>]*>|"(?:[^"\\]|\\.)*"(?:\^\^\S+|@[A-Za-z0-9-]+)?|\S+')
+
+def default_emit_graph(fy) -> str:
+    # N-Quads 기본 그래프: 회계연도별 named graph
+    return f"<https://w3id.org/edgar-fin/2024/instances/fy{fy}>"
+
+def iter_ntriples(ttl_lines, graph: Optional[str] = None):
+    """
+    iter_efin_ttl_lines의 Turtle 줄을 트리플당 한 줄(N-Triples, graph가 있으면 N-Quads)로 변환.
+    emitter가 만드는 형태만 다룸: @prefix, 한 줄 문장 "S p O .",
+    "S p O ;"(또는 주어만 있는 줄) 뒤에 "  p O ;"가 이어지고 "." 또는 " ."로 끝나는 블록
+    """
+    prefixes: Dict[str, str] = {}
+    tail = f" {graph} ." if graph else " ."
+
+    def term(tok: str) -> str:
+        if tok.startswith("<"):
+            return tok
+        if tok.startswith('"'):
+            lexical, sep, dtype = tok.rpartition('"^^')
+            if sep:
+                return f'{lexical}"^^{term(dtype)}'.replace("\n", "\\n").replace("\r", "\\r")
+            return tok.replace("\n", "\\n").replace("\r", "\\r")
+        if tok == "a":
+            return _RDF_TYPE_IRI
+        if tok in ("true", "false"):
+            return f'"{tok}"^^<{_XSD}boolean>'
+        if tok.lstrip("+-").isdigit():
+            return f'"{tok}"^^<{_XSD}integer>'
+        prefix, sep, local = tok.partition(":")
+        if sep and prefix in prefixes:
+            return f"<{prefixes[prefix]}{local}>"
+        raise ValueError(f"cannot convert Turtle term to N-Triples: {tok!r}")
+
+    subject = None
+    for line in ttl_lines:
+        text = line.strip()
+        if not text or text.startswith("#"):
             continue
-        
-        if metric not in KEY_METRICS:
+        if text.startswith("@prefix"):
+            _, name, iri = text.split()[:3]
+            prefixes[name.rstrip(":")] = iri[1:-1]
             continue
-        
-        try:
-            value = float(value_str)
-            if math.isnan(value) or math.isinf(value):
-                continue
-        except (ValueError, TypeError):
+        toks = _TTL_TERM_RE.findall(text)
+        end = toks.pop() if toks[-1] in (";", ".") else None
+        if not line[:1].isspace() and toks:
+            # 들여쓰기 없는 줄은 새 주어로 시작
+            subject = term(toks.pop(0))
+        if len(toks) == 2:
+            yield f"{subject} {term(toks[0])} {term(toks[1])}{tail}"
+        elif toks:
+            raise ValueError(f"cannot convert Turtle line to N-Triples: {line!r}")
+        if end == ".":
+            subject = None
+
+def write_lines_chunked(outfile: str, lines, chunk_lines: int = 8192, compress: Optional[str] = None,
+                        final_newline: bool = False):
+    """
+    줄 이터레이터를 chunk_lines줄씩 묶어 씀 ("\n".join과 같은 내용, final_newline이면 마지막 줄바꿈 추가).
+    compress="gzip"이면 gzip 스트림으로 기록
+    """
+    opener = gzip.open if compress == "gzip" else open
+    with opener(outfile, "wt", encoding="utf-8") as f:
+        sep = ""
+        chunk: List[str] = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                f.write(sep + "\n".join(chunk))
+                sep = "\n"; chunk.clear()
+        if chunk:
+            f.write(sep + "\n".join(chunk))
+            sep = "\n"
+        if final_newline and sep:
+            f.write("\n")
+
+def emit_efin_ttl(
+    companies: List[dict],
+    observations,
+    outfile: str,
+    benchmarks: List[dict] = None,
+    rankings: List[dict] = None,
+    include_industry_scope: bool = False,
+    include_sector_scope: bool = False,
+    fmt: str = "ttl",
+    compress: Optional[str] = None,
+    graph: Optional[str] = None,
+) -> str:
+    """
+    인스턴스를 outfile에 스트리밍으로 기록하고 실제 경로를 반환 (내용은 iter_efin_ttl_lines 참고).
+    fmt: "ttl" | "nt" | "nq" (nq는 graph IRI 필요, 보통 default_emit_graph(fy))
+    compress="gzip"이면 .gz를 붙여 gzip으로 기록
+    """
+    if fmt not in EMIT_FORMATS:
+        raise ValueError(f"unknown emit format: {fmt!r} (choose from {', '.join(EMIT_FORMATS)})")
+    if fmt == "nq" and not graph:
+        raise ValueError("N-Quads output needs a graph IRI")
+    if compress == "gzip" and not str(outfile).endswith(".gz"):
+        outfile = f"{outfile}.gz"
+    lines = iter_efin_ttl_lines(
+        companies, observations, benchmarks, rankings,
+        include_industry_scope=include_industry_scope, include_sector_scope=include_sector_scope)
+    if fmt != "ttl":
+        lines = iter_ntriples(lines, graph if fmt == "nq" else None)
+    write_lines_chunked(outfile, lines, compress=compress, final_newline=fmt != "ttl")
+    return outfile
+
+def rows_for_fy(rows, fy) -> list:
+    # tags/benchmarks/rankings 행 중 fy 컬럼이 fy인 것 (dict 행과 TagRow 모두)
+    fy = str(fy)
+    return [r for r in rows or [] if str(r.get("fy")) == fy]
+
+def emit_efin_nquads_by_fy(
+    companies: List[dict],
+    observations,
+    outfile: str,
+    years,
+    benchmarks: List[dict] = None,
+    rankings: List[dict] = None,
+    include_industry_scope: bool = False,
+    include_sector_scope: bool = False,
+    compress: Optional[str] = None,
+) -> str:
+    """
+    여러 연도를 담은 결과(--fy-output combined)를 N-Quads 한 파일로 기록하되, 연도마다 default_emit_graph(fy)
+    그래프에 그 연도만 --fy로 따로 실행했을 때와 같은 쿼드를 씀 (회사·섹터 등 공유 인스턴스는 그래프마다 반복)
+    """
+    if compress == "gzip" and not str(outfile).endswith(".gz"):
+        outfile = f"{outfile}.gz"
+    observations = list(observations)
+
+    def lines():
+        for y in years:
+            yield from iter_ntriples(iter_efin_ttl_lines(
+                companies, rows_for_fy(observations, y), rows_for_fy(benchmarks, y), rows_for_fy(rankings, y),
+                include_industry_scope=include_industry_scope, include_sector_scope=include_sector_scope),
+                default_emit_graph(y))
+
+    write_lines_chunked(outfile, lines(), compress=compress, final_newline=True)
+    return outfile
+
+# --emit-shards N: 관측값을 CIK별로 나눠 독립적으로 유효한 파일 N개를 프로세스 풀에서 병렬로 기록.
+# 공유 인스턴스(Sector/Industry/Unit/Currency/XBRLConcept)와 온톨로지 헤더·벤치마크·랭킹은 header 샤드 하나에만 씀
+def shard_path(outfile: str, name: str) -> str:
+    # data/instances_2024.ttl -> data/instances_2024.header.ttl, data/instances_2024.part0001.ttl
+    path = pathlib.Path(outfile)
+    return str(path.with_name(f"{path.stem}.{name}{path.suffix}"))
+
+def partition_by_cik(companies, observations, shards: int) -> List[Tuple[List[dict], list]]:
+    """
+    회사/관측값을 CIK 단위로 shards개로 분할 (관측값이 많은 CIK부터 가장 가벼운 샤드에 배정).
+    샤드 안의 순서는 입력 순서를 유지하고, 빈 샤드는 빠짐
+    """
+    by_cik: Dict[str, list] = {}
+    for o in observations:
+        by_cik.setdefault(str(o.get("cik", "")).zfill(10), []).append(o)
+    for c in companies:
+        by_cik.setdefault(str(c.get("cik", "")).zfill(10), [])
+    loads = [0] * shards
+    assign: Dict[str, int] = {}
+    for cik in sorted(by_cik, key=lambda k: (-len(by_cik[k]), k)):
+        i = loads.index(min(loads))
+        assign[cik] = i
+        loads[i] += len(by_cik[cik]) + 1
+    parts: List[Tuple[List[dict], list]] = [([], []) for _ in range(shards)]
+    for c in companies:
+        parts[assign[str(c.get("cik", "")).zfill(10)]][0].append(c)
+    for cik, rows in by_cik.items():
+        parts[assign[cik]][1].extend(rows)
+    return [p for p in parts if p[0] or p[1]]
+
+def _emit_ttl_shard(task) -> Tuple[str, TtlVocabulary]:
+    """워커 진입점: 회사+관측값 샤드 하나를 기록하고, 모은 공유 인스턴스를 돌려줌 (header 샤드에서 병합)"""
+    companies, observations, outfile, fmt, compress, graph = task
+    vocab = TtlVocabulary()
+
+    def lines():
+        yield from _ttl_prefix_lines()
+        yield from _iter_company_ttl(companies, vocab)
+        yield from _iter_observation_ttl(observations, vocab)
+
+    out = lines() if fmt == "ttl" else iter_ntriples(lines(), graph if fmt == "nq" else None)
+    write_lines_chunked(outfile, out, compress=compress, final_newline=fmt != "ttl")
+    return outfile, vocab
+
+def emit_efin_ttl_sharded(
+    companies: List[dict],
+    observations,
+    outfile: str,
+    shards: int,
+    benchmarks: List[dict] = None,
+    rankings: List[dict] = None,
+    include_industry_scope: bool = False,
+    include_sector_scope: bool = False,
+    fmt: str = "ttl",
+    compress: Optional[str] = None,
+    graph: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> List[str]:
+    """
+    emit_efin_ttl의 샤드 버전: 기록한 파일 경로 목록(header 샤드가 먼저)을 반환.
+    모든 파일을 합치면 단일 파일과 같은 트리플 집합이 됨
+    """
+    if fmt not in EMIT_FORMATS:
+        raise ValueError(f"unknown emit format: {fmt!r} (choose from {', '.join(EMIT_FORMATS)})")
+    if fmt == "nq" and not graph:
+        raise ValueError("N-Quads output needs a graph IRI")
+    if compress == "gzip" and not str(outfile).endswith(".gz"):
+        outfile = f"{outfile}.gz"
+    stem = outfile[:-3] if compress == "gzip" else outfile
+    ext = ".gz" if compress == "gzip" else ""
+
+    observations = list(observations)
+    parts = partition_by_cik(companies, observations, max(1, shards))
+    tasks = [(cos, obs, shard_path(stem, f"part{i + 1:04d}") + ext, fmt, compress, graph)
+             for i, (cos, obs) in enumerate(parts)]
+    # Sector/Industry 대응은 회사 순서에 따라 정해지므로 전체 회사 목록으로 header에서 다시 모음
+    vocab = TtlVocabulary()
+    for _ in _iter_company_ttl(companies, vocab):
+        pass
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_emit_ttl_shard, tasks))
+    else:
+        results = [_emit_ttl_shard(t) for t in tasks]
+    for _, shard_vocab in results:
+        vocab.merge(shard_vocab)
+
+    def header():
+        yield from _ttl_prefix_lines()
+        yield from _ttl_ontology_header_lines()
+        yield from _iter_scope_ttl(vocab, _needs_sector_all(benchmarks, rankings))
+        yield from _iter_concept_ttl(vocab)
+        yield from _iter_benchmark_ttl(benchmarks, include_industry_scope, include_sector_scope)
+        yield from _iter_ranking_ttl(rankings, observations[0] if observations else None,
+                                     include_industry_scope, include_sector_scope)
+
+    header_path = shard_path(stem, "header") + ext
+    out = header() if fmt == "ttl" else iter_ntriples(header(), graph if fmt == "nq" else None)
+    write_lines_chunked(header_path, out, compress=compress, final_newline=fmt != "ttl")
+    return [header_path] + [path for path, _ in results]
+
+# ----------------------- 결과 집합 (단계 간 메모리 전달) -------------------------
+# 추출 → 벤치마크 → 랭킹 → wide/TTL 단계는 ResultSet을 그대로 넘겨받고, CSV는 마지막에 쓰기만 함.
+# 각 단계 함수는 행 목록 대신 CSV 경로도 받으므로 파일에서 따로 실행할 수 있음.
+TAGS_FIELDS = ("cik", "symbol", "name", "sector", "industry", "sic", "sic_description", "fye", "fy",
+               "metric", "is_derived", "value", "unit", "period_type", "end", "form", "accn",
+               "source_type", "selected_tag", "composite_name", "computed_from", "confidence", "reason", "components")
+COMPANIES_FIELDS = ("symbol", "cik", "name", "sector", "industry", "sic", "sic_description", "fye")
+RANKINGS_FIELDS = ("cik", "symbol", "industry", "sector", "metric", "ranking_type",
+                   "rank", "value", "composite_score", "fy")
+
+class TagRow:
+    """
+    tags CSV 한 행. TAGS_FIELDS 이름의 슬롯에 CSV에 쓰는 문자열을 그대로 두고,
+    num에는 value를 미리 float로 바꿔 둔 값(비었거나 유한한 숫자가 아니면 None)을 둠 → 후속 단계가 다시 파싱하지 않음.
+    기존 dict 행처럼 row.get("metric") / row["value"]로도 읽을 수 있음
+    """
+    __slots__ = TAGS_FIELDS + ("num",)
+
+    def __init__(self, *values):
+        for field, value in zip(TAGS_FIELDS, values):
+            setattr(self, field, value)
+        self.num = _finite_float(self.value)
+
+    @classmethod
+    def from_mapping(cls, row: dict) -> "TagRow":
+        return cls(*((row.get(field) or "") for field in TAGS_FIELDS))
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in TAGS_FIELDS else default
+
+    def __getitem__(self, key: str):
+        if key not in TAGS_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        return isinstance(other, TagRow) and self.values() == other.values()
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, field) for field in TAGS_FIELDS)
+
+    def __getstate__(self):
+        return self.values()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+def read_csv_rows(path) -> List[dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+def _rows_from(source) -> list:
+    # 단계 입력: CSV 경로면 읽고, 이미 메모리에 있는 행 목록이면 그대로
+    return read_csv_rows(source) if isinstance(source, (str, os.PathLike)) else source
+
+def write_csv_rows(path, fieldnames, rows):
+    """CSV 출력 전용 (dict 또는 TagRow 행, 없는 필드/None은 빈 값)"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(fieldnames)
+        for row in rows:
+            w.writerow([row.get(field, "") for field in fieldnames])
+
+class ResultSet:
+    """
+    한 번의 실행 결과: companies(dict 행), tags(TagRow), benchmarks/rankings(dict 행, 계산 전/실패 시 None).
+    from_csv로 이전 실행의 CSV에서 다시 만들어 후속 단계만 따로 돌릴 수 있음
+    """
+    __slots__ = ("fy", "companies", "tags", "benchmarks", "rankings")
+
+    def __init__(self, fy: int, companies: Optional[List[dict]] = None, tags: Optional[List[TagRow]] = None,
+                 benchmarks: Optional[List[dict]] = None, rankings: Optional[List[dict]] = None):
+        self.fy = fy
+        self.companies = companies if companies is not None else []
+        self.tags = tags if tags is not None else []
+        self.benchmarks = benchmarks
+        self.rankings = rankings
+
+    @classmethod
+    def from_csv(cls, fy: int, tags_csv=None, companies_csv=None, benchmarks_csv=None, rankings_csv=None) -> "ResultSet":
+        def read(path):
+            return read_csv_rows(path) if path and os.path.exists(path) else None
+        tags = read(tags_csv)
+        return cls(fy, read(companies_csv), [TagRow.from_mapping(r) for r in tags or []],
+                   read(benchmarks_csv), read(rankings_csv))
+
+# 벤치마크 통계: 스코프(industry/sector/all) × 메트릭 그룹별 평균/중앙값/최소/최대/백분위수
+BENCHMARK_SCOPES = ("industry", "sector", "all")
+BENCHMARK_PERCENTILES = (25.0, 75.0)
+# 인스턴스 TTL이 쓰는 백분위수 (스키마의 efin:hasPercentile25/75). --benchmark-percentiles와 무관하게 항상 계산
+TTL_BENCHMARK_PERCENTILES = (25.0, 75.0)
+# 정렬된 값에서 (n-1)*q 위치의 보간 방식 (numpy.percentile의 method와 같은 이름/정의)
+BENCHMARK_INTERPOLATIONS = ("linear", "lower", "higher", "nearest", "midpoint")
+
+def percentile_field(p: float) -> str:
+    return f"percentile{p:g}"
+
+def benchmark_fieldnames(percentiles=BENCHMARK_PERCENTILES) -> List[str]:
+    return (["industry", "sector", "metric", "fy", "average_value", "median_value", "max_value", "min_value"]
+            + [percentile_field(p) for p in percentiles] + ["sample_size"])
+
+def parse_percentiles(spec: str) -> Tuple[float, ...]:
+    # "25,75" / "10,50,90" → (25.0, 75.0) ...
+    try:
+        ps = tuple(float(x) for x in spec.split(",") if x.strip())
+    except ValueError:
+        raise ValueError(f"invalid percentile list: {spec!r}")
+    if not ps or any(not 0 <= p <= 100 for p in ps):
+        raise ValueError(f"percentiles must be in [0, 100]: {spec!r}")
+    return ps
+
+def _finite_float(value) -> Optional[float]:
+    value = safe_float(value)
+    return value if value is not None and math.isfinite(value) else None
+
+def _tag_row_value(row) -> Optional[float]:
+    # tags 행의 value (CSV 문자열 또는 숫자) → 유한 float, 아니면 None
+    return row.num if isinstance(row, TagRow) else _finite_float(row.get("value", ""))
+
+def _percentile_positions(counts, q: float, method: str):
+    # 그룹 크기 n에 대해 (n-1)*q 위치의 (하한 인덱스, 상한 인덱스, 비율) - 스칼라/배열 공용
+    pos = (counts - 1) * (q / 100.0)
+    lo = pos // 1
+    if method == "lower":
+        return lo, lo, 0.0
+    hi = lo + (pos > lo)
+    if method == "higher":
+        return hi, hi, 0.0
+    if method == "nearest":
+        idx = round(pos) if isinstance(pos, float) else np.around(pos)
+        return idx, idx, 0.0
+    if method == "midpoint":
+        return lo, hi, 0.5
+    return lo, hi, pos - lo
+
+def _interpolate(a, b, frac, method: str):
+    return (a + b) / 2 if method == "midpoint" else a + (b - a) * frac
+
+def _group_stats_numpy(vals, codes, n_groups: int, percentiles, method: str) -> dict:
+    # 그룹 코드와 값으로 한 번 정렬한 뒤 그룹 경계(starts/counts)에서 모든 통계를 배열 연산으로 계산
+    order = np.lexsort((vals, codes))
+    sv = vals[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    ends = starts + counts - 1
+
+    mid_lo, mid_hi = (counts - 1) // 2, counts // 2
+    stats = {
+        "average_value": np.add.reduceat(sv, starts) / counts,
+        "median_value": (sv[starts + mid_lo] + sv[starts + mid_hi]) / 2,
+        "max_value": sv[ends],
+        "min_value": sv[starts],
+        "sample_size": counts,
+    }
+    for p in percentiles:
+        lo, hi, frac = _percentile_positions(counts, p, method)
+        stats[percentile_field(p)] = _interpolate(sv[starts + lo.astype(np.int64)], sv[starts + hi.astype(np.int64)], frac, method)
+    return {k: v.tolist() for k, v in stats.items()}
+
+def _group_stats_python(values_by_group: List[List[float]], percentiles, method: str) -> dict:
+    # numpy가 없을 때: 같은 정의를 그룹별 sorted()로 계산
+    stats = {k: [] for k in ("average_value", "median_value", "max_value", "min_value", "sample_size")}
+    stats.update({percentile_field(p): [] for p in percentiles})
+    for values in values_by_group:
+        sv = sorted(values); n = len(sv)
+        stats["average_value"].append(math.fsum(sv) / n)
+        stats["median_value"].append((sv[(n - 1) // 2] + sv[n // 2]) / 2)
+        stats["max_value"].append(sv[-1]); stats["min_value"].append(sv[0])
+        stats["sample_size"].append(n)
+        for p in percentiles:
+            lo, hi, frac = _percentile_positions(n, p, method)
+            stats[percentile_field(p)].append(_interpolate(sv[int(lo)], sv[int(hi)], frac, method))
+    return stats
+
+def compute_benchmarks(tags, fy: int, percentiles=BENCHMARK_PERCENTILES, method: str = "linear",
+                       scopes=BENCHMARK_SCOPES) -> List[dict]:
+    """
+    tags 행(메모리의 dict 목록 또는 tags_{fy}.csv 경로)으로 산업별/섹터별/전체 벤치마크 통계를 계산
+
+    행은 한 번만 훑어 스코프별 (그룹, 메트릭) 코드와 값 배열을 만들고,
+    numpy가 있으면 스코프마다 한 번의 정렬로 mean/median/min/max/백분위수를 함께 계산.
+    percentiles: 백분위수 목록 (컬럼 percentile{p}), method: BENCHMARK_INTERPOLATIONS 중 하나
+    표본이 2개 미만인 그룹은 제외. 섹터 스코프 행은 industry가 빈 값, 전체는 industry/sector 모두 빈 값.
+
+    Returns:
+        List[dict]: 벤치마크 통계 리스트 (CSV로 저장할 형식, benchmark_fieldnames 순서)
+    """
+    if method not in BENCHMARK_INTERPOLATIONS:
+        raise ValueError(f"unknown percentile interpolation: {method!r} (choose from {', '.join(BENCHMARK_INTERPOLATIONS)})")
+    # 벤치마크는 핵심 지표 세트(BENCHMARK_RANKING_METRICS)에 대해서만 계산
+    KEY_METRICS = set(BENCHMARK_RANKING_METRICS)
+
+    tags = _rows_from(tags)
+
+    # 스코프별 그룹 키 → 코드 (처음 나온 순서 유지), 행별 코드/값
+    groups: Dict[str, Dict[tuple, int]] = {scope: {} for scope in scopes}
+    codes: Dict[str, List[int]] = {scope: [] for scope in scopes}
+    values: List[float] = []
+    industry_sector: Dict[str, str] = {}
+
+    for row in tags:
+        industry = (row.get("industry") or "").strip()
+        sector = (row.get("sector") or "").strip()
+        metric = (row.get("metric") or "").strip()
+        if not industry or metric not in KEY_METRICS:
             continue
-        
-        # 산업별 통계
-        key = (industry, metric)
-        if key not in industry_groups:
-            industry_groups[key] = []
-        industry_groups[key].append(value)
-        
-        # 전체 통계 (모든 회사 데이터 집계)
-        if metric not in all_groups:
-            all_groups[metric] = []
-        all_groups[metric].append(value)
-    
-    # 산업별 벤치마크 계산
-    for (industry, metric), values in industry_groups.items():
-        if len(values) < 2:  # 최소 2개 샘플 필요
+        value = _tag_row_value(row)
+        if value is None:
             continue
-        
-        sector = industry_sector_map.get(industry, "")
-        sorted_values = sorted(values)
-        n = len(sorted_values)
-        
-        benchmarks.append({
-            "industry": industry,
-            "sector": sector,
-            "metric": metric,
-            "fy": fy,
-            "average_value": statistics.mean(values),
-            "median_value": statistics.median(values),
-            "max_value": max(values),
-            "min_value": min(values),
-            "percentile25": sorted_values[int(n * 0.25)] if n > 0 else None,
-            "percentile75": sorted_values[int(n * 0.75)] if n > 0 else None,
-            "sample_size": n
-        })
-    
-    # 전체 벤치마크 계산 (모든 회사 데이터 집계)
-    for metric, values in all_groups.items():
-        if len(values) < 2:
+        industry_sector.setdefault(industry, sector)
+        values.append(value)
+        for scope in scopes:
+            if scope == "industry":
+                key = (industry, "", metric)
+            elif scope == "sector":
+                # 섹터가 없는 행은 섹터 스코프에서 제외 (코드 -1)
+                key = ("", sector, metric) if sector else None
+            else:
+                key = ("", "", metric)
+            table = groups[scope]
+            codes[scope].append(-1 if key is None else table.setdefault(key, len(table)))
+
+    benchmarks = []
+    value_arr = np.asarray(values, dtype=np.float64) if np is not None else None
+    for scope in scopes:
+        keys = list(groups[scope])
+        if not keys:
             continue
-        
-        sorted_values = sorted(values)
-        n = len(sorted_values)
-        
-        benchmarks.append({
-            "industry": "",  # 전체는 빈 값
-            "sector": "",    # 전체는 빈 값
-            "metric": metric,
-            "fy": fy,
-            "average_value": statistics.mean(values),
-            "median_value": statistics.median(values),
-            "max_value": max(values),
-            "min_value": min(values),
-            "percentile25": sorted_values[int(n * 0.25)] if n > 0 else None,
-            "percentile75": sorted_values[int(n * 0.75)] if n > 0 else None,
-            "sample_size": n
-        })
-    
+        if np is not None:
+            code_arr = np.asarray(codes[scope], dtype=np.int64)
+            keep = code_arr >= 0
+            stats = _group_stats_numpy(value_arr[keep], code_arr[keep], len(keys), percentiles, method)
+        else:
+            by_group: List[List[float]] = [[] for _ in keys]
+            for code, value in zip(codes[scope], values):
+                if code >= 0:
+                    by_group[code].append(value)
+            stats = _group_stats_python(by_group, percentiles, method)
+        for i, (industry, sector, metric) in enumerate(keys):
+            if stats["sample_size"][i] < 2:  # 최소 2개 샘플 필요
+                continue
+            row = {"industry": industry, "sector": industry_sector.get(industry, "") if industry else sector,
+                   "metric": metric, "fy": fy}
+            row.update((field, stats[field][i]) for field in benchmark_fieldnames(percentiles)[4:])
+            benchmarks.append(row)
     return benchmarks
 
-def compute_rankings(tags_csv_path: str, benchmarks_csv_path: str, fy: int) -> List[dict]:
+def compute_rankings(tags, benchmarks, fy: int) -> List[dict]:
     """
-    tags_{fy}.csv와 benchmarks_{fy}.csv를 읽어서 랭킹 계산
+    tags 행(메모리의 행 목록 또는 tags_{fy}.csv 경로)으로 랭킹 계산 (benchmarks는 현재 사용하지 않음)
     
     각 지표별로 산업/섹터 내 상위 10/50/100 선정 및 전체 랭킹 계산
     종합 점수 기반 랭킹도 계산 (모든 핵심 지표의 정규화된 점수 합산)
     
     Returns:
-        List[dict]: 랭킹 리스트 (CSV로 저장할 형식)
+        List[dict]: 랭킹 리스트 (CSV로 저장할 형식, RANKINGS_FIELDS)
     """
     # 랭킹은 핵심 지표 세트(BENCHMARK_RANKING_METRICS)에 대해서만 계산
     KEY_METRICS = BENCHMARK_RANKING_METRICS
     
     rankings = []
     
-    # tags CSV 읽기
-    with open(tags_csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        tag_rows = list(reader)
-    
     # 회사별 메트릭 값 수집
     company_metrics: Dict[Tuple[str, str, str], Dict[str, float]] = {}  # (cik, industry, sector) -> {metric: value}
     
-    for row in tag_rows:
+    for row in _rows_from(tags):
         cik = row.get("cik", "").strip()
         symbol = row.get("symbol", "").strip()
         industry = row.get("industry", "").strip()
         sector = row.get("sector", "").strip()
         metric = row.get("metric", "").strip()
-        value_str = row.get("value", "").strip()
         
-        if not cik or not industry or not metric or not value_str:
+        if not cik or not industry or not metric:
             continue
         
         if metric not in KEY_METRICS:
             continue
         
-        try:
-            value = float(value_str)
-            if math.isnan(value) or math.isinf(value):
-                continue
-        except (ValueError, TypeError):
+        value = _tag_row_value(row)
+        if value is None:
             continue
         
         key = (cik, industry, sector)
@@ -763,372 +1250,183 @@ def compute_rankings(tags_csv_path: str, benchmarks_csv_path: str, fy: int) -> L
             company_metrics[key] = {"symbol": symbol}
         company_metrics[key][metric] = value
     
-    # 산업별 랭킹 계산
+    # 그룹화는 한 번만: (산업, 메트릭) / 메트릭별 (cik, symbol, value) 목록, 산업별 섹터(처음 나온 회사 기준)
     industry_groups: Dict[Tuple[str, str], List[Tuple[str, str, float]]] = {}  # (industry, metric) -> [(cik, symbol, value), ...]
-    
+    all_groups: Dict[str, List[Tuple[str, str, float]]] = {}  # metric -> [(cik, symbol, value), ...]
+    industry_sector: Dict[str, str] = {}
+
     for (cik, industry, sector), metrics in company_metrics.items():
+        industry_sector.setdefault(industry, sector)
         symbol = metrics.get("symbol", "")
         for metric in KEY_METRICS:
             if metric not in metrics:
                 continue
-            value = metrics[metric]
-            key = (industry, metric)
-            if key not in industry_groups:
-                industry_groups[key] = []
-            industry_groups[key].append((cik, symbol, value))
-    
-    # 각 산업-메트릭 조합에 대해 랭킹 생성
-    for (industry, metric), companies in industry_groups.items():
-        # 값 기준 내림차순 정렬 (높은 값이 좋은 지표)
-        # 단, DebtToEquity는 낮은 값이 좋으므로 오름차순
-        reverse = metric != "DebtToEquity"
+            entry = (cik, symbol, metrics[metric])
+            industry_groups.setdefault((industry, metric), []).append(entry)
+            all_groups.setdefault(metric, []).append(entry)
+
+    def rank_group(companies, industry: str, sector: str, metric: str, composite: bool = False):
+        # 값 기준 내림차순 정렬 (높은 값이 좋은 지표), 단 DebtToEquity는 낮은 값이 좋으므로 오름차순
+        # Top10 행 + 전체(All) 행을 추가하고 정렬된 목록을 반환
+        reverse = composite or metric != "DebtToEquity"
         sorted_companies = sorted(companies, key=lambda x: x[2], reverse=reverse)
-        
-        # 섹터 찾기
-        sector = ""
-        for (cik, ind, sec), _ in company_metrics.items():
-            if ind == industry:
-                sector = sec
-                break
-        
-        # Top10만 생성 (Top50/Top100 제거)
-        for top_n, ranking_type in [(10, "Top10")]:
-            for rank, (cik, symbol, value) in enumerate(sorted_companies[:top_n], 1):
-                rankings.append({
-                    "cik": cik,
-                    "symbol": symbol,
-                    "industry": industry,
-                    "sector": sector,
-                    "metric": metric,
-                    "ranking_type": ranking_type,
-                    "rank": rank,
-                    "value": value,
-                    "composite_score": None  # 개별 메트릭 랭킹이므로 None
-                })
-        
-        # 전체 랭킹 생성 (Industry별)
-        for rank, (cik, symbol, value) in enumerate(sorted_companies, 1):
+        ranked = [("Top10", rank, c) for rank, c in enumerate(sorted_companies[:10], 1)]
+        ranked += [("All", rank, c) for rank, c in enumerate(sorted_companies, 1)]
+        for ranking_type, rank, (cik, symbol, value) in ranked:
             rankings.append({
                 "cik": cik,
                 "symbol": symbol,
                 "industry": industry,
                 "sector": sector,
                 "metric": metric,
-                "ranking_type": "All",
+                "ranking_type": ranking_type,
                 "rank": rank,
-                "value": value,
-                "composite_score": None
+                "value": None if composite else value,
+                "composite_score": value if composite else None,
+                "fy": fy
             })
-    
-    # 전체 랭킹 계산
-    all_groups: Dict[str, List[Tuple[str, str, float]]] = {}  # metric -> [(cik, symbol, value), ...]
-    
-    for (cik, industry, sector), metrics in company_metrics.items():
-        symbol = metrics.get("symbol", "")
-        for metric in KEY_METRICS:
-            if metric not in metrics:
-                continue
-            value = metrics[metric]
-            if metric not in all_groups:
-                all_groups[metric] = []
-            all_groups[metric].append((cik, symbol, value))
-    
-    # 각 메트릭에 대해 전체 랭킹 생성
+        return sorted_companies
+
+    def value_range(sorted_companies, metric: str) -> Optional[Tuple[float, float]]:
+        # 정렬된 목록의 양 끝이 (min, max). 값이 2개 미만이면 정규화하지 않음
+        if len(sorted_companies) < 2:
+            return None
+        lo, hi = sorted_companies[-1][2], sorted_companies[0][2]
+        return (hi, lo) if metric == "DebtToEquity" else (lo, hi)
+
+    # 산업-메트릭 / 전체-메트릭 랭킹 (개별 메트릭 랭킹이므로 composite_score는 None)
+    industry_ranges: Dict[Tuple[str, str], Tuple[float, float]] = {}
+    for (industry, metric), companies in industry_groups.items():
+        bounds = value_range(rank_group(companies, industry, industry_sector[industry], metric), metric)
+        if bounds:
+            industry_ranges[(industry, metric)] = bounds
+
+    all_ranges: Dict[str, Tuple[float, float]] = {}
     for metric, companies in all_groups.items():
-        # 값 기준 내림차순 정렬 (높은 값이 좋은 지표)
-        # 단, DebtToEquity는 낮은 값이 좋으므로 오름차순
-        reverse = metric != "DebtToEquity"
-        sorted_companies = sorted(companies, key=lambda x: x[2], reverse=reverse)
-        
-        # Top10만 생성 (Top50/Top100 제거)
-        for top_n, ranking_type in [(10, "Top10")]:
-            for rank, (cik, symbol, value) in enumerate(sorted_companies[:top_n], 1):
-                rankings.append({
-                    "cik": cik,
-                    "symbol": symbol,
-                    "industry": "",  # 전체는 빈 값
-                    "sector": "",   # 전체는 빈 값
-                    "metric": metric,
-                    "ranking_type": ranking_type,
-                    "rank": rank,
-                    "value": value,
-                    "composite_score": None  # 개별 메트릭 랭킹이므로 None
-                })
-        
-        # 전체 랭킹 생성 (All scope)
-        for rank, (cik, symbol, value) in enumerate(sorted_companies, 1):
-            rankings.append({
-                "cik": cik,
-                "symbol": symbol,
-                "industry": "",  # 전체는 빈 값
-                "sector": "",   # 전체는 빈 값
-                "metric": metric,
-                "ranking_type": "All",
-                "rank": rank,
-                "value": value,
-                "composite_score": None
-            })
-    
-    # 종합 점수 기반 랭킹 계산
-    # 각 메트릭을 정규화(0-1)하여 합산
-    industry_composite: Dict[str, List[Tuple[str, str, float]]] = {}  # industry -> [(cik, symbol, composite_score), ...]
-    
-    for (cik, industry, sector), metrics in company_metrics.items():
-        symbol = metrics.get("symbol", "")
-        
-        # 해당 산업의 모든 회사 메트릭 값 수집 (정규화용)
-        industry_values: Dict[str, List[float]] = {}
-        for (cik2, ind, sec), metrics2 in company_metrics.items():
-            if ind != industry:
-                continue
-            for metric in KEY_METRICS:
-                if metric not in metrics2:
-                    continue
-                if metric not in industry_values:
-                    industry_values[metric] = []
-                industry_values[metric].append(metrics2[metric])
-        
-        # 정규화된 점수 계산
-        composite_score = 0.0
+        bounds = value_range(rank_group(companies, "", "", metric), metric)  # 전체는 industry/sector 빈 값
+        if bounds:
+            all_ranges[metric] = bounds
+
+    # 종합 점수: 각 메트릭을 그룹 내 min/max로 정규화(0-1)하여 합산
+    def composite_score(metrics: Dict[str, float], ranges: Dict, scope) -> float:
+        score = 0.0
         for metric in KEY_METRICS:
-            if metric not in metrics or metric not in industry_values:
-                continue
-            
-            value = metrics[metric]
-            values = industry_values[metric]
-            
-            if not values or len(values) < 2:
+            bounds = ranges.get((scope, metric) if scope is not None else metric)
+            if metric not in metrics or bounds is None:
                 continue
-            
-            # 정규화: (value - min) / (max - min)
-            min_val = min(values)
-            max_val = max(values)
-            
+            min_val, max_val = bounds
             if max_val == min_val:
                 normalized = 0.5
             else:
-                normalized = (value - min_val) / (max_val - min_val)
-            
+                normalized = (metrics[metric] - min_val) / (max_val - min_val)
             # DebtToEquity는 낮은 값이 좋으므로 반전
             if metric == "DebtToEquity":
                 normalized = 1.0 - normalized
-            
-            composite_score += normalized
-        
-        if industry not in industry_composite:
-            industry_composite[industry] = []
-        industry_composite[industry].append((cik, symbol, composite_score))
-    
-    # 종합 랭킹 생성 (Industry별)
+            score += normalized
+        return score
+
+    industry_composite: Dict[str, List[Tuple[str, str, float]]] = {}  # industry -> [(cik, symbol, composite_score), ...]
+    all_composite: List[Tuple[str, str, float]] = []  # [(cik, symbol, composite_score), ...]
+    for (cik, industry, sector), metrics in company_metrics.items():
+        symbol = metrics.get("symbol", "")
+        industry_composite.setdefault(industry, []).append((cik, symbol, composite_score(metrics, industry_ranges, industry)))
+        all_composite.append((cik, symbol, composite_score(metrics, all_ranges, None)))
+
+    # 종합 랭킹 (Industry별, 전체)
     for industry, companies in industry_composite.items():
-        sorted_companies = sorted(companies, key=lambda x: x[2], reverse=True)
-        
-        # 섹터 찾기
-        sector = ""
-        for (cik, ind, sec), _ in company_metrics.items():
-            if ind == industry:
-                sector = sec
-                break
-        
-        # 종합 점수 Top10만 생성
-        for top_n, ranking_type in [(10, "Top10")]:
-            for rank, (cik, symbol, composite_score) in enumerate(sorted_companies[:top_n], 1):
-                rankings.append({
-                    "cik": cik,
-                    "symbol": symbol,
-                    "industry": industry,
-                    "sector": sector,
-                    "metric": "Composite",
-                    "ranking_type": ranking_type,
-                    "rank": rank,
-                    "value": None,  # 종합 랭킹이므로 개별 값 없음
-                    "composite_score": composite_score
-                })
-        
-        # 전체 랭킹 생성 (Industry별 Composite)
-        for rank, (cik, symbol, composite_score) in enumerate(sorted_companies, 1):
-            rankings.append({
-                "cik": cik,
-                "symbol": symbol,
-                "industry": industry,
-                "sector": sector,
-                "metric": "Composite",
-                "ranking_type": "All",
-                "rank": rank,
-                "value": None,
-                "composite_score": composite_score
-            })
+        rank_group(companies, industry, industry_sector[industry], "Composite", composite=True)
+    rank_group(all_composite, "", "", "Composite", composite=True)
+
+    return rankings
+
+def create_wide_format_csv(tags, rankings, companies_csv_path: str, fy: int, output_path: str):
+    """
+    tags와 rankings로 wide format CSV 생성
     
-    # 전체 종합 점수 기반 랭킹 계산
-    all_composite: List[Tuple[str, str, float]] = []  # [(cik, symbol, composite_score), ...]
+    기업당 하나의 row로 변환하며, 모든 메트릭을 컬럼으로 포함하고
+    각 메트릭의 Industry/Sector/All 랭킹을 컬럼으로 추가합니다.
     
-    # 전체 회사 메트릭 값 수집 (정규화용)
-    all_values: Dict[str, List[float]] = {}
-    for (cik2, ind, sec), metrics2 in company_metrics.items():
-        for metric in KEY_METRICS:
-            if metric not in metrics2:
-                continue
-            if metric not in all_values:
-                all_values[metric] = []
-            all_values[metric].append(metrics2[metric])
+    Args:
+        tags: tags 행 목록 또는 tags CSV 파일 경로
+        rankings: rankings 행 목록 또는 rankings CSV 파일 경로 (파일이 없으면 랭킹 컬럼은 빈 값)
+        companies_csv_path: companies CSV 파일 경로
+        fy: fiscal year
+        output_path: 출력 파일 경로
+    """
+    # tags 행을 CIK별로 그룹화
+    company_metrics: Dict[str, Dict[str, Optional[float]]] = {}  # cik -> {metric: value}
+    company_info: Dict[str, dict] = {}  # cik -> {symbol, name, sector, industry, ...}
+    all_metrics: Set[str] = set()
     
-    for (cik, industry, sector), metrics in company_metrics.items():
-        symbol = metrics.get("symbol", "")
+    for row in _rows_from(tags):
+        cik = row.get("cik", "").strip()
+        if not cik:
+            continue
         
-        # 정규화된 점수 계산
-        composite_score = 0.0
-        for metric in KEY_METRICS:
-            if metric not in metrics or metric not in all_values:
-                continue
-            
-            value = metrics[metric]
-            values = all_values[metric]
-            
-            if not values or len(values) < 2:
-                continue
-            
-            # 정규화: (value - min) / (max - min)
-            min_val = min(values)
-            max_val = max(values)
-            
-            if max_val == min_val:
-                normalized = 0.5
-            else:
-                normalized = (value - min_val) / (max_val - min_val)
-            
-            # DebtToEquity는 낮은 값이 좋으므로 반전
-            if metric == "DebtToEquity":
-                normalized = 1.0 - normalized
-            
-            composite_score += normalized
+        metric = row.get("metric", "").strip()
+        value_str = row.get("value", "").strip()
         
-        all_composite.append((cik, symbol, composite_score))
-    
-    # 전체 종합 랭킹 생성
-    sorted_all_composite = sorted(all_composite, key=lambda x: x[2], reverse=True)
-    
-    # 전체 종합 점수 Top10만 생성
-    for top_n, ranking_type in [(10, "Top10")]:
-        for rank, (cik, symbol, composite_score) in enumerate(sorted_all_composite[:top_n], 1):
-            rankings.append({
+        if cik not in company_metrics:
+            company_metrics[cik] = {}
+            company_info[cik] = {
                 "cik": cik,
-                "symbol": symbol,
-                "industry": "",  # 전체는 빈 값
-                "sector": "",   # 전체는 빈 값
-                "metric": "Composite",
-                "ranking_type": ranking_type,
-                "rank": rank,
-                "value": None,  # 종합 랭킹이므로 개별 값 없음
-                "composite_score": composite_score
-            })
-    
-    # 전체 랭킹 생성 (All scope Composite)
-    for rank, (cik, symbol, composite_score) in enumerate(sorted_all_composite, 1):
-        rankings.append({
-            "cik": cik,
-            "symbol": symbol,
-            "industry": "",  # 전체는 빈 값
-            "sector": "",   # 전체는 빈 값
-            "metric": "Composite",
-            "ranking_type": "All",
-            "rank": rank,
-            "value": None,
-            "composite_score": composite_score
-        })
-    
-    return rankings
-
-def create_wide_format_csv(tags_csv_path: str, rankings_csv_path: str, companies_csv_path: str, fy: int, output_path: str):
-    """
-    tags.csv와 rankings.csv를 읽어서 wide format CSV 생성
-    
-    기업당 하나의 row로 변환하며, 모든 메트릭을 컬럼으로 포함하고
-    각 메트릭의 Industry/Sector/All 랭킹을 컬럼으로 추가합니다.
-    
-    Args:
-        tags_csv_path: tags CSV 파일 경로
-        rankings_csv_path: rankings CSV 파일 경로
-        companies_csv_path: companies CSV 파일 경로
-        fy: fiscal year
-        output_path: 출력 파일 경로
-    """
-    # tags CSV 읽기 및 CIK별로 그룹화
-    company_metrics: Dict[str, Dict[str, Optional[float]]] = {}  # cik -> {metric: value}
-    company_info: Dict[str, dict] = {}  # cik -> {symbol, name, sector, industry, ...}
-    all_metrics: Set[str] = set()
-    
-    with open(tags_csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            cik = row.get("cik", "").strip()
-            if not cik:
-                continue
-            
-            metric = row.get("metric", "").strip()
-            value_str = row.get("value", "").strip()
-            
-            if cik not in company_metrics:
-                company_metrics[cik] = {}
-                company_info[cik] = {
-                    "cik": cik,
-                    "symbol": row.get("symbol", "").strip(),
-                    "name": row.get("name", "").strip(),
-                    "sector": row.get("sector", "").strip(),
-                    "industry": row.get("industry", "").strip(),
-                    "sic": row.get("sic", "").strip(),
-                    "sic_description": row.get("sic_description", "").strip(),
-                    "fye": row.get("fye", "").strip(),
-                }
-            
-            if metric:
-                all_metrics.add(metric)
-                if value_str:
-                    try:
-                        value = float(value_str)
-                        if not (math.isnan(value) or math.isinf(value)):
-                            company_metrics[cik][metric] = value
-                    except (ValueError, TypeError):
-                        company_metrics[cik][metric] = None
-                else:
+                "symbol": row.get("symbol", "").strip(),
+                "name": row.get("name", "").strip(),
+                "sector": row.get("sector", "").strip(),
+                "industry": row.get("industry", "").strip(),
+                "sic": row.get("sic", "").strip(),
+                "sic_description": row.get("sic_description", "").strip(),
+                "fye": row.get("fye", "").strip(),
+            }
+        
+        if metric:
+            all_metrics.add(metric)
+            if value_str:
+                try:
+                    value = float(value_str)
+                    if not (math.isnan(value) or math.isinf(value)):
+                        company_metrics[cik][metric] = value
+                except (ValueError, TypeError):
                     company_metrics[cik][metric] = None
-    
-    # rankings CSV 읽기 및 랭킹 정보 수집
+            else:
+                company_metrics[cik][metric] = None
+
+    # rankings 행에서 랭킹 정보 수집
     # 구조: {(cik, metric, scope): rank}
     # scope: "Industry", "Sector", "All"
     rankings_map: Dict[Tuple[str, str, str], int] = {}  # (cik, metric, scope) -> rank
     
-    if os.path.exists(rankings_csv_path):
-        with open(rankings_csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                cik = row.get("cik", "").strip()
-                metric = row.get("metric", "").strip()
-                ranking_type = row.get("ranking_type", "").strip()
-                rank_str = row.get("rank", "").strip()
-                industry = row.get("industry", "").strip()
-                sector = row.get("sector", "").strip()
-                
-                if not cik or not metric or not ranking_type or not rank_str:
-                    continue
-                
-                # ranking_type이 "All"인 경우만 전체 랭킹으로 사용
-                if ranking_type != "All":
-                    continue
-                
-                try:
-                    rank = int(rank_str)
-                except (ValueError, TypeError):
-                    continue
-                
-                # scope 결정: Industry, Sector, All
-                if industry:
-                    scope = "Industry"
-                elif sector:
-                    scope = "Sector"
-                else:
-                    scope = "All"
-                
-                rankings_map[(cik, metric, scope)] = rank
+    if isinstance(rankings, (str, os.PathLike)):
+        rankings = read_csv_rows(rankings) if os.path.exists(rankings) else []
+    for row in rankings or []:
+        cik = row.get("cik", "").strip()
+        metric = row.get("metric", "").strip()
+        ranking_type = row.get("ranking_type", "").strip()
+        rank_str = str(row.get("rank", "")).strip()
+        industry = row.get("industry", "").strip()
+        sector = row.get("sector", "").strip()
+        
+        if not cik or not metric or not ranking_type or not rank_str:
+            continue
+        
+        # ranking_type이 "All"인 경우만 전체 랭킹으로 사용
+        if ranking_type != "All":
+            continue
+        
+        try:
+            rank = int(rank_str)
+        except (ValueError, TypeError):
+            continue
+        
+        # scope 결정: Industry, Sector, All
+        if industry:
+            scope = "Industry"
+        elif sector:
+            scope = "Sector"
+        else:
+            scope = "All"
+        
+        rankings_map[(cik, metric, scope)] = rank
     
     # 모든 메트릭 정렬 (일관된 순서를 위해)
     sorted_metrics = sorted(all_metrics)
@@ -1191,7 +1489,11 @@ def create_wide_format_csv(tags_csv_path: str, rankings_csv_path: str, companies
     
     print(f"[OK] wrote wide format CSV: {output_path}")
 
-def emit_after_csv(args, companies, obs_rows):
+def emit_after_csv(args, companies, obs_rows, benchmarks=None, rankings=None):
+    """
+    --emit-ttl: 메모리의 결과로 인스턴스 TTL 생성.
+    비어 있거나(None) 넘겨받지 못한 입력만 args의 CSV 경로에서 읽음 (단독 실행용)
+    """
     try:
         if not hasattr(args, "emit_ttl") or not args.emit_ttl:
             return
@@ -1202,29 +1504,61 @@ def emit_after_csv(args, companies, obs_rows):
             if not co_fp or not obs_fp:
                 return
             if (not companies) and os.path.exists(co_fp):
-                with open(co_fp, newline="", encoding="utf-8") as f:
-                    companies = list(csv.DictReader(f))
+                companies = read_csv_rows(co_fp)
             if (not obs_rows) and os.path.exists(obs_fp):
-                with open(obs_fp, newline="", encoding="utf-8") as f:
-                    obs_rows = list(csv.DictReader(f))
+                obs_rows = read_csv_rows(obs_fp)
         
-        # 벤치마크 및 랭킹 CSV 읽기
-        benchmarks = []
-        rankings = []
+        # 벤치마크 및 랭킹: 넘겨받지 못한 경우에만 CSV 읽기
         benchmarks_fp = getattr(args, "out_benchmarks", None)
         rankings_fp = getattr(args, "out_rankings", None)
         
-        if benchmarks_fp and os.path.exists(benchmarks_fp):
-            with open(benchmarks_fp, newline="", encoding="utf-8") as f:
-                benchmarks = list(csv.DictReader(f))
+        if benchmarks is None:
+            benchmarks = read_csv_rows(benchmarks_fp) if benchmarks_fp and os.path.exists(benchmarks_fp) else []
         
-        if rankings_fp and os.path.exists(rankings_fp):
-            with open(rankings_fp, newline="", encoding="utf-8") as f:
-                rankings = list(csv.DictReader(f))
+        if rankings is None:
+            rankings = read_csv_rows(rankings_fp) if rankings_fp and os.path.exists(rankings_fp) else []
         
         include_industry_scope = getattr(args, "include_industry_scope", False)
         include_sector_scope = getattr(args, "include_sector_scope", False)
-        emit_efin_ttl(
+        fmt = getattr(args, "emit_format", "ttl") or "ttl"
+        compress = getattr(args, "emit_compress", None)
+        graph = getattr(args, "emit_graph", None) or (default_emit_graph(args.fy) if fmt == "nq" else None)
+        label = {"ttl": "RDF Turtle", "nt": "N-Triples", "nq": "N-Quads"}[fmt]
+        shards = getattr(args, "emit_shards", 1) or 1
+        years = getattr(args, "fy_years", None) or ()
+        if fmt == "nq" and not getattr(args, "emit_graph", None) and len(years) > 1:
+            # --fy-output combined: 범위 이름 그래프 하나 대신 연도별 그래프
+            if shards > 1:
+                paths = [p for y in years for p in emit_efin_ttl_sharded(
+                    companies or [], rows_for_fy(obs_rows, y), shard_path(args.emit_ttl, f"fy{y}"), shards,
+                    rows_for_fy(benchmarks, y), rows_for_fy(rankings, y),
+                    include_industry_scope=include_industry_scope, include_sector_scope=include_sector_scope,
+                    fmt=fmt, compress=None if compress == "none" else compress, graph=default_emit_graph(y))]
+                print(f"[emit-ttl] wrote {label} in {len(paths)} shards over {len(years)} fiscal-year graphs")
+                return
+            outfile = emit_efin_nquads_by_fy(
+                companies or [], obs_rows or [], args.emit_ttl, years, benchmarks, rankings,
+                include_industry_scope=include_industry_scope, include_sector_scope=include_sector_scope,
+                compress=None if compress == "none" else compress)
+            print(f"[emit-ttl] wrote {label} ({len(years)} fiscal-year graphs) to: {outfile}")
+            return
+        if shards > 1:
+            paths = emit_efin_ttl_sharded(
+                companies or [],
+                obs_rows or [],
+                args.emit_ttl,
+                shards,
+                benchmarks,
+                rankings,
+                include_industry_scope=include_industry_scope,
+                include_sector_scope=include_sector_scope,
+                fmt=fmt,
+                compress=None if compress == "none" else compress,
+                graph=graph,
+            )
+            print(f"[emit-ttl] wrote {label} in {len(paths)} shards: {paths[0]} (+ {len(paths) - 1} parts)")
+            return
+        outfile = emit_efin_ttl(
             companies or [],
             obs_rows or [],
             args.emit_ttl,
@@ -1232,21 +1566,54 @@ def emit_after_csv(args, companies, obs_rows):
             rankings,
             include_industry_scope=include_industry_scope,
             include_sector_scope=include_sector_scope,
+            fmt=fmt,
+            compress=None if compress == "none" else compress,
+            graph=graph,
         )
-        print(f"[emit-ttl] wrote RDF Turtle to: {args.emit_ttl}")
+        print(f"[emit-ttl] wrote {label} to: {outfile}")
     except Exception as e:
         print(f"[emit-ttl] failed: {e}")
 
 # ──────────────────────────────────────────────────────────────
 # API 속도 제한 상태
-_last_api_call_time: Optional[float] = None
-_api_rate_limit_delay: float = 0.1  # SEC 가이드라인에 따라 초당 10개 요청
-_rate_limit_lock = threading.Lock()
+class TokenBucket:
+    """
+    초당 rate개 토큰이 차는 버킷. reserve()는 락 안에서 토큰만 선점하고 기다릴 시간을 돌려주므로,
+    실제 대기는 락 밖에서 이뤄져 다른 스레드/코루틴이 줄을 서는 것을 막지 않음.
+    capacity=1이면 요청 간격이 정확히 1/rate초로 고정됨(버스트 없음)
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+_SEC_BUCKET = TokenBucket(rate=10.0)  # SEC 가이드라인에 따라 초당 10개 요청
 
 # ──────────────────────────────────────────────────────────────
 # 캐시 설정
 _COMPANYFACTS_CACHE_DIR = ".cache/companyfacts"
 _SUBMISSIONS_CACHE_DIR   = ".cache/submissions"
+_TICKERS_CACHE_DIR       = ".cache/tickers"
 _DATE_FORMAT = "%Y%m%d"
 
 # ------------------------ 메트릭 목록 ------------------------
@@ -1283,6 +1650,9 @@ BENCHMARK_RANKING_METRICS = [
 ]
 
 STD_PREFIXES = {"us-gaap","ifrs-full","dei","srt"}
+# SEC가 배포하는 표준 택소노미 접두사. 여기에 없는 companyfacts 택소노미는 제출사 확장(extension)으로 봄
+SEC_STANDARD_TAXONOMIES = STD_PREFIXES | {"invest","country","currency","exch","naics","sic","stpr","ecd","cyd",
+                                          "cef","vip","oef","rxp","spac","snj","ffd","fnd","sro"}
 
 @dataclass(frozen=True)
 class Candidate:
@@ -1359,42 +1729,113 @@ def get_user_agent(args) -> str:
     return (args.user_agent or os.getenv("SEC_USER_AGENT") or "").strip()
 
 def wait_for_rate_limit():
-    global _last_api_call_time
-    with _rate_limit_lock:
-        if _last_api_call_time is not None:
-            elapsed = time.time() - _last_api_call_time
-            if elapsed < _api_rate_limit_delay:
-                time.sleep(_api_rate_limit_delay - elapsed)
-        _last_api_call_time = time.time()
-
-def http_get(url: str, ua: Optional[str] = None, timeout: int = 45, max_retries: int = 3, dbg: Optional[Debugger] = None):
+    _SEC_BUCKET.acquire()
+
+def retry_after_seconds(value: Optional[str], default: float) -> float:
+    # Retry-After: 초 단위 숫자 또는 HTTP-date. 해석 불가면 default
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        dt = parsedate_to_datetime(value)
+        return max(0.0, (dt - datetime.now(dt.tzinfo)).total_seconds())
+    except Exception:
+        return default
+
+class FetchStats:
+    """요청별 (url, status, 지연시간 초) 기록. status 0 = 연결 오류/타임아웃"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: List[Tuple[str, int, float]] = []
+        self.retries = 0
+
+    def record(self, url: str, status: int, seconds: float):
+        with self._lock:
+            self.samples.append((url, status, seconds))
+
+    def note_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            lat = sorted(sec for _, _, sec in self.samples)
+            errors = sum(1 for _, st, _ in self.samples if st == 0 or st >= 400)
+            not_modified = sum(1 for _, st, _ in self.samples if st == 304)
+            retries = self.retries
+        if not lat:
+            return {"requests": 0, "retries": retries, "errors": errors}
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(round(p * (len(lat) - 1))))] * 1000, 1)
+        return {"requests": len(lat), "not_modified": not_modified, "retries": retries, "errors": errors,
+                "mean_ms": round(sum(lat) / len(lat) * 1000, 1),
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": round(lat[-1] * 1000, 1)}
+
+    def format(self) -> str:
+        return " ".join(f"{k}={v}" for k, v in self.summary().items())
+
+_FETCH_STATS = FetchStats()
+
+# 프로세스 전역 세션: 호스트별 keep-alive 커넥션 풀을 재사용 (요청마다 TCP/TLS 핸드셰이크 방지)
+_HTTP_SESSION = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    global _HTTP_SESSION
+    with _http_session_lock:
+        if _HTTP_SESSION is None:
+            sess = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _HTTP_SESSION = sess
+    return _HTTP_SESSION
+
+def http_get(url: str, ua: Optional[str] = None, timeout: int = 45, max_retries: int = 3, dbg: Optional[Debugger] = None,
+             headers: Optional[Dict[str, str]] = None):
+    """headers에 If-None-Match/If-Modified-Since를 넣으면 304 응답도 그대로 반환 (status_code로 확인)"""
     if requests is None:
         raise RuntimeError("requests is required. pip install requests")
-    headers = {}
-    if "sec.gov" in url:
+    headers = dict(headers or {})
+    sec = "sec.gov" in url
+    if sec:
         ua = ua or os.getenv("SEC_USER_AGENT")
         if not ua:
             raise RuntimeError("SEC requests require --user-agent or SEC_USER_AGENT env")
         headers["User-Agent"] = ua
-        wait_for_rate_limit()
     else:
         headers["User-Agent"] = ua or "Mozilla/5.0"
     for attempt in range(max_retries):
+        # 재시도도 SEC 요청 한 건이므로 시도마다 토큰을 받음 (AsyncSecFetcher.fetch와 동일)
+        if sec:
+            wait_for_rate_limit()
+        t0 = time.monotonic()
         try:
-            r = requests.get(url, headers=headers, timeout=timeout)
+            r = get_http_session().get(url, headers=headers, timeout=timeout)
+            _FETCH_STATS.record(url, r.status_code, time.monotonic() - t0)
             r.raise_for_status()
             return r
         except requests.exceptions.HTTPError as e:
             if e.response is not None and e.response.status_code in (429, 503):
-                wait_time = (2 ** attempt) * 2
+                # 마지막 시도면 기다리지 않고 실패
+                if attempt == max_retries - 1:
+                    break
+                wait_time = retry_after_seconds(e.response.headers.get("Retry-After"), (2 ** attempt) * 2)
+                _FETCH_STATS.note_retry()
                 msg = f"[WARN] HTTP {e.response.status_code} for {url}, retry {attempt+1}/{max_retries} after {wait_time}s"
                 print(msg, file=sys.stderr)
                 if dbg: dbg.log(msg)
                 time.sleep(wait_time); continue
             raise
         except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            _FETCH_STATS.record(url, 0, time.monotonic() - t0)
             if attempt < max_retries - 1:
                 wait_time = (2 ** attempt) * 1
+                _FETCH_STATS.note_retry()
                 msg = f"[WARN] {type(e).__name__} for {url}, retry {attempt+1}/{max_retries} after {wait_time}s"
                 print(msg, file=sys.stderr)
                 if dbg: dbg.log(msg)
@@ -1402,77 +1843,498 @@ def http_get(url: str, ua: Optional[str] = None, timeout: int = 45, max_retries:
             raise
     raise RuntimeError(f"Failed to fetch {url} after {max_retries} retries")
 
+# ----------------------- JSON 디코더 --------------------------
+# 캐시 읽기/API 응답 파싱에 공통으로 쓰는 디코더. orjson/msgspec가 있으면 우선 사용하고 없으면 표준 json
+def _decode_stdlib(raw):
+    return json.loads(raw)
+
+def _decode_orjson(raw):
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # 버전에 따라 orjson은 64비트를 넘는 정수를 거부하므로 표준 json으로 재시도
+        return json.loads(raw)
+
+def _decode_msgspec(raw):
+    return msgspec.json.decode(raw)
+
+_JSON_DECODERS = {"orjson": _decode_orjson, "msgspec": _decode_msgspec, "stdlib": _decode_stdlib}
+
+def available_json_decoders() -> List[str]:
+    mods = {"orjson": orjson, "msgspec": msgspec, "stdlib": json}
+    return [name for name in _JSON_DECODERS if mods[name] is not None]
+
+_json_decoder_name: str = available_json_decoders()[0]
+_facts_taxonomies: Optional[frozenset] = None
+
+def configure_json(decoder: str = "auto", facts_taxonomies=None):
+    """
+    decoder: auto|orjson|msgspec|stdlib
+    facts_taxonomies: 주어지면 companyfacts의 facts 중 해당 택소노미만 남김
+                      ("std" = STD_PREFIXES + 후보 태그 택소노미 + 제출사 확장 택소노미)
+    """
+    global _json_decoder_name, _facts_taxonomies
+    avail = available_json_decoders()
+    if decoder in (None, "", "auto"):
+        decoder = avail[0]
+    if decoder not in avail:
+        raise RuntimeError(f"JSON decoder '{decoder}' is not installed (available: {', '.join(avail)})")
+    _json_decoder_name = decoder
+    _facts_taxonomies = resolve_facts_taxonomies(facts_taxonomies)
+
+# 택소노미 집합에 이 표식이 있으면 SEC 표준이 아닌(=제출사 확장) 택소노미도 모두 남김
+EXTENSION_TAXONOMIES = "*ext"
+
+def resolve_facts_taxonomies(spec) -> Optional[frozenset]:
+    # "std"는 확장 택소노미를 유지해야 direct-growth 채굴·확장 태그 제안 결과가 필터 없이 돌린 것과 같아짐
+    if not spec:
+        return None
+    names = [spec] if isinstance(spec, str) else list(spec)
+    out: Set[str] = set()
+    for n in names:
+        for t in str(n).split(","):
+            t = t.strip()
+            if t == "std":
+                out |= STD_PREFIXES | {c.qname.split(":", 1)[0] for lst in CANDIDATES.values() for c in lst}
+                out.add(EXTENSION_TAXONOMIES)
+            elif t:
+                out.add(t)
+    return frozenset(out) if out else None
+
+def keep_taxonomy(name: str, taxonomies: frozenset) -> bool:
+    return name in taxonomies or (EXTENSION_TAXONOMIES in taxonomies and name not in SEC_STANDARD_TAXONOMIES)
+
+def suggestion_taxonomies(path: str) -> List[str]:
+    # --suggestions JSONL의 qname 접두사 (택소노미 필터에 더해 제안 태그가 잘려 나가지 않게 함)
+    out: Dict[str, None] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    qname = json.loads(line).get("qname") or ""
+                except Exception:
+                    continue
+                if ":" in qname:
+                    out[qname.split(":", 1)[0]] = None
+    except OSError as e:
+        print(f"[WARN] Failed to read suggestions {path}: {e}", file=sys.stderr)
+    return list(out)
+
+def decode_json(raw, decoder: Optional[str] = None):
+    return _JSON_DECODERS[decoder or _json_decoder_name](raw)
+
+def decode_facts_json(raw, taxonomies: Optional[frozenset] = None, decoder: Optional[str] = None) -> dict:
+    """
+    companyfacts 디코드. taxonomies가 주어지면 facts.<taxonomy> 중 필요한 것만 남김.
+    msgspec은 나머지 택소노미를 Raw로 건너뛰어 아예 파싱하지 않고, 다른 디코더는 파싱 후 버림
+    """
+    decoder = decoder or _json_decoder_name
+    if taxonomies is None:
+        return decode_json(raw, decoder)
+    if decoder == "msgspec":
+        top = msgspec.json.decode(raw, type=Dict[str, msgspec.Raw])
+        facts_raw = top.pop("facts", None)
+        out = {k: msgspec.json.decode(v) for k, v in top.items()}
+        if facts_raw is not None:
+            tax = msgspec.json.decode(facts_raw, type=Dict[str, msgspec.Raw])
+            out["facts"] = {k: msgspec.json.decode(v) for k, v in tax.items() if keep_taxonomy(k, taxonomies)}
+        return out
+    return prune_facts(decode_json(raw, decoder), taxonomies)
+
+def prune_facts(facts: dict, taxonomies: Optional[frozenset] = None) -> dict:
+    taxonomies = _facts_taxonomies if taxonomies is None else taxonomies
+    if taxonomies is None or not isinstance(facts, dict) or not isinstance(facts.get("facts"), dict):
+        return facts
+    facts["facts"] = {k: v for k, v in facts["facts"].items() if keep_taxonomy(k, taxonomies)}
+    return facts
+
+def read_json_bytes(path) -> bytes:
+    if isinstance(path, ArchiveMember):
+        return read_archive_member(path)
+    if str(path).endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    with open(path, "rb") as f:
+        return f.read()
+
+def load_json_file(path) -> dict:
+    return decode_json(read_json_bytes(path))
+
+def load_facts_file(path) -> dict:
+    return decode_facts_json(read_json_bytes(path), _facts_taxonomies)
+
 # ----------------------- 캐시 유틸리티 -----------------------
-def _date_str():
-    return datetime.now().strftime("%Y%m%d")
+_DEFAULT_CACHE_TTL_HOURS = 24.0
+_cache_ttl_seconds: float = _DEFAULT_CACHE_TTL_HOURS * 3600
 
-def cf_cache_path(cache_dir: str, cik: str) -> pathlib.Path:
-    padded = str(cik).zfill(10)
-    return pathlib.Path(cache_dir) / f"CIK{padded}_{_date_str()}.json"
+def configure_cache(ttl_hours: Optional[float]):
+    global _cache_ttl_seconds
+    _cache_ttl_seconds = max(0.0, float(_DEFAULT_CACHE_TTL_HOURS if ttl_hours is None else ttl_hours)) * 3600
 
-def cf_find_existing(cache_dir: str, cik: str) -> Optional[pathlib.Path]:
-    p = pathlib.Path(cache_dir)
-    if not p.exists(): return None
-    fname = cf_cache_path(cache_dir, cik).name
-    want = p / fname
-    return want if want.exists() else None
-
-def cf_save(cache_dir: str, cik: str, data: dict):
-    path = cf_cache_path(cache_dir, cik)
+def _atomic_write_bytes(path: pathlib.Path, payload: bytes):
+    # 같은 디렉터리의 임시 파일에 쓴 뒤 os.replace → 중단돼도 반쯤 쓰인 파일이 남지 않음
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def cf_cleanup(cache_dir: str, cik: str):
-    p = pathlib.Path(cache_dir)
-    if not p.exists(): return
-    padded = str(cik).zfill(10)
-    today = _date_str()
-    for fp in sorted(p.glob(f"CIK{padded}_*.json")):
-        if today not in fp.name:
-            try: fp.unlink()
-            except Exception: pass
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except Exception: pass
+        raise
+
+class CacheStore:
+    """
+    내용 주소(content-addressed) JSON 캐시.
+      {root}/manifest.json                    key → {object, sha256, bytes, fetched_at, checked_at, etag, last_modified}
+      {root}/manifest.journal                 manifest.json 이후 바뀐 항목 ([key, entry] JSON 한 줄씩 덧붙임)
+      {root}/objects/ab/<sha256>.json.gz      gzip으로 압축한 compact JSON (같은 내용은 한 번만 저장)
+    신선도는 달력 날짜가 아니라 checked_at 기준 TTL로 판단. put/touch는 journal에 한 줄만 덧붙이고,
+    journal이 항목 수보다 길어지거나 flush()(프로세스 종료 시 자동) 때 manifest.json으로 원자적으로 합침.
+    legacy_prefix가 주어지면 예전 날짜별 캐시({prefix}{key}_YYYYMMDD.json)를 처음 조회할 때 가져옴
+    """
+    MANIFEST = "manifest.json"
+    JOURNAL = "manifest.journal"
+    # journal 줄 수가 max(이 값, 항목 수)를 넘으면 합침 → 항목당 쓰기 비용이 상수
+    COMPACT_MIN_LINES = 1024
+
+    def __init__(self, root, legacy_prefix: Optional[str] = None):
+        self.root = pathlib.Path(root)
+        self.legacy_prefix = legacy_prefix
+        self._lock = threading.RLock()
+        self._entries: Optional[Dict[str, dict]] = None
+        self._journal_lines = 0
+
+    # --- manifest ---
+    def _manifest(self) -> Dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self.root / self.MANIFEST, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("entries", {})
+            except FileNotFoundError:
+                self._entries = {}
+            torn = False
+            try:
+                with open(self.root / self.JOURNAL, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            key, e = json.loads(line)
+                        except ValueError:
+                            torn = True  # 쓰다 중단된 줄
+                            continue
+                        self._entries[key] = e
+                        self._journal_lines += 1
+            except FileNotFoundError:
+                pass
+            if torn:
+                # 깨진 줄 뒤에 덧붙이면 다음 줄까지 망가지므로 바로 합쳐서 journal을 비움
+                self.flush()
+        return self._entries
+
+    def _record(self, key: str):
+        # 바뀐 항목 하나만 journal에 덧붙임 (호출자가 _lock을 잡고 있음)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / self.JOURNAL, "a", encoding="utf-8") as f:
+            f.write(json.dumps([key, self._entries[key]], ensure_ascii=False, sort_keys=True) + "\n")
+        self._journal_lines += 1
+        if self._journal_lines > max(self.COMPACT_MIN_LINES, len(self._entries)):
+            self.flush()
+
+    def flush(self):
+        # journal을 manifest.json으로 합침. manifest를 먼저 원자적으로 바꾼 뒤 journal을 지우므로
+        # 그 사이에 중단돼도 다시 읽을 때 journal 재생 결과는 같음
+        with self._lock:
+            if self._entries is None or not self._journal_lines:
+                return
+            payload = json.dumps({"version": 1, "entries": self._entries}, ensure_ascii=False, sort_keys=True)
+            _atomic_write_bytes(self.root / self.MANIFEST, payload.encode("utf-8"))
+            try: (self.root / self.JOURNAL).unlink()
+            except FileNotFoundError: pass
+            self._journal_lines = 0
+
+    # --- 조회 ---
+    def entry(self, key: str) -> Optional[dict]:
+        with self._lock:
+            e = self._manifest().get(key)
+            if e is None and self.legacy_prefix is not None:
+                e = self._import_legacy(key)
+            return e
+
+    def is_fresh(self, e: Optional[dict]) -> bool:
+        return bool(e) and (time.time() - e.get("checked_at", 0)) < _cache_ttl_seconds
+
+    def object_path(self, e: dict) -> pathlib.Path:
+        return self.root / "objects" / e["object"]
+
+    def path(self, key: str) -> Optional[pathlib.Path]:
+        # 신선도와 무관하게 현재 객체 경로
+        e = self.entry(key)
+        return self.object_path(e) if e else None
+
+    def lookup(self, key: str) -> Optional[pathlib.Path]:
+        # TTL 안에 있는 항목만 반환 (manifest 한 번 조회)
+        e = self.entry(key)
+        return self.object_path(e) if self.is_fresh(e) else None
+
+    def read(self, key: str) -> Optional[dict]:
+        p = self.path(key)
+        return load_json_file(p) if p else None
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        e = self.entry(key) or {}
+        headers = {}
+        if e.get("etag"):
+            headers["If-None-Match"] = e["etag"]
+        if e.get("last_modified"):
+            headers["If-Modified-Since"] = e["last_modified"]
+        return headers
+
+    # --- 쓰기 ---
+    def put(self, key: str, data: dict, resp_headers=None, fetched_at: Optional[float] = None) -> pathlib.Path:
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        obj = f"{digest[:2]}/{digest}.json.gz"
+        target = self.root / "objects" / obj
+        # 압축은 잠금 밖에서 하되, 객체 존재 확인·쓰기와 manifest 등록은 잠금 안에서 함께
+        # (그 사이 다른 키의 put이 같은 객체를 안 쓰는 것으로 보고 지우지 않도록)
+        packed = None if target.exists() else gzip.compress(raw, compresslevel=6, mtime=0)
+        now = time.time()
+        with self._lock:
+            if not target.exists():
+                _atomic_write_bytes(target, packed or gzip.compress(raw, compresslevel=6, mtime=0))
+            entries = self._manifest()
+            old = entries.get(key)
+            entries[key] = {
+                "object": obj, "sha256": digest, "bytes": len(raw),
+                "fetched_at": fetched_at or now, "checked_at": fetched_at or now,
+                **_validators_from(resp_headers),
+            }
+            self._record(key)
+            if old and old["object"] != obj:
+                self._drop_object_if_unused(old["object"])
+        return target
+
+    def touch(self, key: str, resp_headers=None) -> bool:
+        # 304 Not Modified: 내용은 그대로 두고 checked_at(및 갱신된 검증자)만 반영
+        with self._lock:
+            e = self._manifest().get(key)
+            if not e:
+                return False
+            e["checked_at"] = time.time()
+            e.update(_validators_from(resp_headers))
+            self._record(key)
+            return True
+
+    def _drop_object_if_unused(self, obj: str):
+        if any(e["object"] == obj for e in self._entries.values()):
+            return
+        try: (self.root / "objects" / obj).unlink()
+        except Exception: pass
+
+    def _import_legacy(self, key: str) -> Optional[dict]:
+        if not self.root.exists():
+            return None
+        olds = sorted(self.root.glob(f"{self.legacy_prefix}{key}_*.json"), key=lambda fp: fp.name)
+        if not olds:
+            return None
+        latest = olds[-1]
+        try:
+            data = load_json_file(latest)
+            validators = {}
+            try:
+                with open(latest.with_name(latest.name + ".validators"), "r", encoding="utf-8") as f:
+                    validators = json.load(f)
+            except Exception:
+                pass
+            self.put(key, data, fetched_at=latest.stat().st_mtime)
+            self._entries[key].update({k: v for k, v in validators.items() if k in ("etag", "last_modified")})
+            self._record(key)
+        except Exception:
+            return None
+        for fp in olds:
+            for q in (fp, fp.with_name(fp.name + ".validators")):
+                try: q.unlink()
+                except Exception: pass
+        return self._entries[key]
+
+def _validators_from(resp_headers) -> dict:
+    if resp_headers is None:
+        return {}
+    return {k: resp_headers.get(h) for k, h in (("etag", "ETag"), ("last_modified", "Last-Modified")) if resp_headers.get(h)}
+
+_CACHE_STORES: Dict[Tuple[str, Optional[str]], CacheStore] = {}
+_cache_stores_lock = threading.Lock()
+
+def get_cache_store(root, legacy_prefix: Optional[str] = None) -> CacheStore:
+    key = (os.path.abspath(str(root)), legacy_prefix)
+    with _cache_stores_lock:
+        if key not in _CACHE_STORES:
+            _CACHE_STORES[key] = CacheStore(root, legacy_prefix=legacy_prefix)
+        return _CACHE_STORES[key]
+
+@atexit.register
+def flush_cache_stores():
+    # 남은 journal을 manifest.json으로 합침 (다음 실행은 journal만 있어도 같은 내용을 읽음)
+    with _cache_stores_lock:
+        stores = list(_CACHE_STORES.values())
+    for store in stores:
+        try: store.flush()
+        except Exception as e: print(f"[WARN] cache manifest flush failed for {store.root}: {e}", file=sys.stderr)
+
+def _cik_key(cik: str) -> str:
+    return f"CIK{str(cik).zfill(10)}"
+
+# companyfacts 캐시 (키: CIK0000320193)
+def cf_store(cache_dir: str) -> CacheStore:
+    return get_cache_store(cache_dir, legacy_prefix="")
+
+def cf_cache_path(cache_dir: str, cik: str) -> Optional[pathlib.Path]:
+    return cf_store(cache_dir).path(_cik_key(cik))
+
+def cf_find_existing(cache_dir: str, cik: str) -> Optional[pathlib.Path]:
+    return cf_store(cache_dir).lookup(_cik_key(cik))
+
+def cf_save(cache_dir: str, cik: str, data: dict, resp_headers=None) -> pathlib.Path:
+    return cf_store(cache_dir).put(_cik_key(cik), data, resp_headers)
 
 # 제출물 캐시
-def subs_cache_path(cache_dir: str, cik: str) -> pathlib.Path:
-    padded = str(cik).zfill(10)
-    return pathlib.Path(cache_dir) / f"submissions_CIK{padded}_{_date_str()}.json"
+def subs_store(cache_dir: str) -> CacheStore:
+    return get_cache_store(cache_dir, legacy_prefix="submissions_")
+
+def subs_cache_path(cache_dir: str, cik: str) -> Optional[pathlib.Path]:
+    return subs_store(cache_dir).path(_cik_key(cik))
 
 def subs_find_existing(cache_dir: str, cik: str) -> Optional[pathlib.Path]:
-    p = pathlib.Path(cache_dir)
-    if not p.exists(): return None
-    want = subs_cache_path(cache_dir, cik)
-    return want if want.exists() else None
+    return subs_store(cache_dir).lookup(_cik_key(cik))
 
-def subs_save(cache_dir: str, cik: str, data: dict):
-    path = subs_cache_path(cache_dir, cik)
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def subs_cleanup(cache_dir: str, cik: str):
-    p = pathlib.Path(cache_dir)
-    if not p.exists(): return
-    padded = str(cik).zfill(10)
-    today = _date_str()
-    for fp in sorted(p.glob(f"submissions_CIK{padded}_*.json")):
-        if today not in fp.name:
-            try: fp.unlink()
-            except Exception: pass
+def subs_save(cache_dir: str, cik: str, data: dict, resp_headers=None) -> pathlib.Path:
+    return subs_store(cache_dir).put(_cik_key(cik), data, resp_headers)
 
 # ----------------------- SEC 페처 --------------------------
+def companyfacts_url(cik: str) -> str:
+    return f"https://data.sec.gov/api/xbrl/companyfacts/CIK{str(cik).zfill(10)}.json"
+
+def submissions_url(cik: str) -> str:
+    return f"https://data.sec.gov/submissions/CIK{str(cik).zfill(10)}.json"
+
 def fetch_company_facts(cik: str, ua: Optional[str], dbg: Debugger) -> dict:
-    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{str(cik).zfill(10)}.json"
+    url = companyfacts_url(cik)
     dbg.log(f"[HTTP] GET {url}")
-    return http_get(url, ua=ua, dbg=dbg).json()
+    return decode_json(http_get(url, ua=ua, dbg=dbg).content)
 
 def fetch_sec_submissions(cik: str, ua: Optional[str], dbg: Debugger) -> dict:
-    url = f"https://data.sec.gov/submissions/CIK{str(cik).zfill(10)}.json"
+    url = submissions_url(cik)
     dbg.log(f"[HTTP] GET {url}")
-    return http_get(url, ua=ua, dbg=dbg).json()
+    return decode_json(http_get(url, ua=ua, dbg=dbg).content)
+
+def refresh_cached_json(store: CacheStore, key: str, url: str, ua: Optional[str], dbg: Optional[Debugger],
+                        revalidate: bool = True) -> Optional[dict]:
+    """
+    store[key]를 새로 채움. revalidate면 저장된 검증자(ETag/Last-Modified)로 조건부 요청을 보내
+    304면 checked_at만 갱신하고 None(→ 호출측이 캐시에서 로드), 200이면 저장 후 dict 반환
+    """
+    headers = store.conditional_headers(key) if revalidate else {}
+    if dbg: dbg.log(f"[HTTP] GET {url}" + (" (conditional)" if headers else ""))
+    r = http_get(url, ua=ua, dbg=dbg, headers=headers)
+    body = (lambda: decode_json(r.content)) if r.status_code != 304 else None
+    return _commit_cached_json(store, key, url, r.status_code, body, r.headers)
+
+def _commit_cached_json(store: CacheStore, key: str, url: str, status: int, body, resp_headers) -> Optional[dict]:
+    if status == 304:
+        if not store.touch(key, resp_headers):
+            raise RuntimeError(f"Unexpected 304 for {url} without a cached copy")
+        return None
+    data = body() if callable(body) else body
+    store.put(key, data, resp_headers)
+    return data
+
+# ----------------------- 비동기 SEC 페처 --------------------------
+class AsyncSecFetcher:
+    """
+    aiohttp 기반 SEC 페처 (--fetch-backend async).
+    ClientSession 하나(keep-alive 커넥션 풀)를 공유하고, 모든 요청은 bucket을 거쳐 초당 rate를 넘지 않음.
+    429/503은 Retry-After(없으면 지수 백오프)만큼 기다린 뒤 재시도하며, 요청별 지연시간은 stats에 기록
+    """
+    def __init__(self, ua: Optional[str], dbg: Optional[Debugger] = None, bucket: Optional[TokenBucket] = None,
+                 stats: Optional[FetchStats] = None, concurrency: int = 10, timeout: int = 45, max_retries: int = 3):
+        self.ua = ua or os.getenv("SEC_USER_AGENT")
+        self.dbg = dbg
+        self.bucket = bucket or _SEC_BUCKET
+        self.stats = stats or _FETCH_STATS
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session = None
+
+    async def __aenter__(self):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for --fetch-backend async. pip install aiohttp")
+        if not self.ua:
+            raise RuntimeError("SEC requests require --user-agent or SEC_USER_AGENT env")
+        self._session = aiohttp.ClientSession(
+            headers={"User-Agent": self.ua},
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _warn(self, msg: str):
+        print(msg, file=sys.stderr)
+        if self.dbg: self.dbg.log(msg)
+
+    async def get_json(self, url: str):
+        return (await self.fetch(url))[1]
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """(status, JSON 또는 None(304), 응답 헤더) 반환"""
+        if self.dbg: self.dbg.log(f"[HTTP] GET {url}" + (" (conditional)" if headers else ""))
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire_async()
+            t0 = time.monotonic()
+            wait_time = None
+            try:
+                async with self._session.get(url, headers=headers) as r:
+                    if r.status == 304:
+                        self.stats.record(url, r.status, time.monotonic() - t0)
+                        return r.status, None, dict(r.headers)
+                    body = await r.read()
+                    self.stats.record(url, r.status, time.monotonic() - t0)
+                    status = r.status
+                    if status in (429, 503):
+                        wait_time = retry_after_seconds(r.headers.get("Retry-After"), (2 ** attempt) * 2)
+                    else:
+                        r.raise_for_status()
+                        resp_headers = dict(r.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self.stats.record(url, 0, time.monotonic() - t0)
+                if attempt < self.max_retries - 1:
+                    self.stats.note_retry()
+                    wait_time = (2 ** attempt) * 1
+                    self._warn(f"[WARN] {type(e).__name__} for {url}, retry {attempt+1}/{self.max_retries} after {wait_time}s")
+                    await asyncio.sleep(wait_time); continue
+                raise
+            if wait_time is not None:
+                # 응답을 다 읽고 async with를 빠져나와 커넥션을 풀에 돌려준 뒤 대기. 마지막 시도면 기다리지 않고 실패
+                if attempt == self.max_retries - 1:
+                    break
+                self.stats.note_retry()
+                self._warn(f"[WARN] HTTP {status} for {url}, retry {attempt+1}/{self.max_retries} after {wait_time}s")
+                await asyncio.sleep(wait_time); continue
+            # 수십 MB짜리 companyfacts 파싱이 이벤트 루프를 막지 않도록 스레드에서 처리
+            return status, await asyncio.to_thread(decode_json, body), resp_headers
+        raise RuntimeError(f"Failed to fetch {url} after {self.max_retries} retries")
 
 # ----------------------- 팩트 헬퍼 -------------------------
 def get_unit_records(facts_json: dict, qname: str) -> Dict[str, List[dict]]:
+    if isinstance(facts_json, CompanyFactIndex):
+        facts_json = facts_json.raw
     try: tax, tag = qname.split(":")
     except ValueError: return {}
     return (facts_json.get("facts", {}).get(tax, {}) or {}).get(tag, {}).get("units", {}) or {}
@@ -1484,19 +2346,522 @@ def iter_all_facts(facts_json: dict, qname: str):
             if isinstance(val, (int, float)):
                 yield unit, rec
 
+# ----------------------- 팩트 인덱스 -------------------------
+_ANNUAL_FPS = ("FY","CY","FYR")
+
+class FactRecord:
+    """
+    companyfacts 레코드 1건을 선택기용으로 미리 파싱해 둔 형태.
+    end 날짜/서수, fp·qtrs·form 플래그를 한 번만 계산한다.
+    pos는 unit 배열 내 원래 순서 (동점 시 기존 선택 결과와 같은 레코드를 고르기 위함)
+    """
+    __slots__ = ("unit","pos","end","end_date","end_ord","val","fp","is_annual","qtrs","form","accn","segment")
+
+    def __init__(self, unit: str, pos: int, rec: dict, end_date: date):
+        self.unit = unit
+        self.pos = pos
+        self.end = rec.get("end")
+        self.end_date = end_date
+        self.end_ord = end_date.toordinal()
+        self.val = rec.get("val")
+        self.fp = rec.get("fp")
+        self.is_annual = (self.fp or "").upper() in _ANNUAL_FPS
+        self.qtrs = rec.get("qtrs")
+        self.form = rec.get("form")
+        self.accn = rec.get("accn")
+        self.segment = rec.get("segment")
+
+    @classmethod
+    def from_values(cls, unit: str, pos: int, end: Optional[str], end_ord: int, val, fp: Optional[str],
+                    qtrs, form: Optional[str], accn: Optional[str], segment) -> "FactRecord":
+        # 컬럼 저장소에서 읽은 값으로 직접 생성 (dict 레코드 없이)
+        r = cls.__new__(cls)
+        r.unit = unit; r.pos = pos; r.end = end
+        r.end_date = date.fromordinal(end_ord); r.end_ord = end_ord
+        r.val = val; r.fp = fp; r.is_annual = (fp or "").upper() in _ANNUAL_FPS
+        r.qtrs = qtrs; r.form = form; r.accn = accn; r.segment = segment
+        return r
+
+    def as_pick(self, fp=None) -> dict:
+        return {"unit": self.unit, "end": self.end, "form": self.form,
+                "fp": self.fp if fp is None else fp, "val": float(self.val),
+                "accn": self.accn, "segment": self.segment}
+
+class CompanyFactIndex:
+    """
+    회사 1곳의 companyfacts 인덱스: qname -> unit -> (end 서수 정렬 리스트, 레코드 리스트).
+    main()에서 회사당 한 번 만들고 모든 선택기가 공유한다.
+    qname별 파싱은 처음 조회될 때 한 번만 수행 (lazy).
+    숫자 val이 아니거나 end를 파싱할 수 없는 레코드는 어떤 선택기도 쓰지 않으므로 인덱스에서 제외.
+    """
+    def __init__(self, facts_json: Optional[dict]):
+        self.raw = facts_json or {}
+        self._concepts: Dict[str, Dict[str, Tuple[List[int], List[FactRecord]]]] = {}
+        # 선택 결과 캐시: (metric, fy, prefer_unit, tol_days, period_type, sector) -> 결과 dict
+        # main()의 기본 메트릭, compute_growth_set, compute_other_derived가 같은 결과를 공유
+        self._selections: Dict[tuple, dict] = {}
+        self._pick_arrays: Dict[Tuple[str, str], PickArrays] = {}
+        # direct-growth 후보 (메트릭 -> qname 목록). 회계연도와 무관하므로 회사당 한 번만 분류
+        self._direct_growth: Optional[Dict[str, List[str]]] = None
+        self.selection_hits = 0
+        self.selection_misses = 0
+
+    def concept(self, qname: str) -> Dict[str, Tuple[List[int], List[FactRecord]]]:
+        units = self._concepts.get(qname)
+        if units is None:
+            units = {}
+            for unit, arr in get_unit_records(self.raw, qname).items():
+                recs = []
+                for pos, rec in enumerate(arr or []):
+                    if not isinstance(rec.get("val"), (int, float)): continue
+                    end = parse_date(rec.get("end"))
+                    if not end: continue
+                    recs.append(FactRecord(unit, pos, rec, end))
+                recs.sort(key=lambda r: (r.end_ord, r.pos))
+                units[unit] = ([r.end_ord for r in recs], recs)
+            self._concepts[qname] = units
+        return units
+
+    def cached_selection(self, key: tuple) -> Optional[dict]:
+        hit = self._selections.get(key)
+        if hit is None:
+            self.selection_misses += 1
+        else:
+            self.selection_hits += 1
+        return hit
+
+    def store_selection(self, key: tuple, result: dict) -> dict:
+        self._selections[key] = result
+        return result
+
+    def has_concept(self, qname: str) -> bool:
+        return bool(get_unit_records(self.raw, qname))
+
+    def nearest_end_distance(self, qname: str, anchor_ords: List[int]) -> Optional[int]:
+        return _nearest_end_distance([ords for ords, _ in self.concept(qname).values()], anchor_ords)
+
+    def pick_arrays(self, qname: str, prefer_unit: str) -> "PickArrays":
+        # smart_pick_arrays 입력: concept의 모든 unit 레코드를 (unit 우선순위 순으로) 이어 붙인 배열
+        key = (qname, prefer_unit)
+        arrs = self._pick_arrays.get(key)
+        if arrs is None:
+            units = self.concept(qname)
+            order = [prefer_unit] + [u for u in units if u != prefer_unit]
+            recs: List[FactRecord] = []; ranks: List[int] = []
+            for rank, unit in enumerate(order):
+                series = units.get(unit)
+                if not series: continue
+                recs.extend(series[1]); ranks.extend([rank] * len(series[1]))
+            arrs = self._pick_arrays[key] = PickArrays(
+                np.fromiter((r.end_ord for r in recs), dtype=np.int64, count=len(recs)),
+                np.fromiter((r.is_annual for r in recs), dtype=bool, count=len(recs)),
+                np.fromiter((r.qtrs == 4 for r in recs), dtype=bool, count=len(recs)),
+                np.asarray(ranks, dtype=np.int64),
+                np.fromiter((r.pos for r in recs), dtype=np.int64, count=len(recs)),
+                recs.__getitem__)
+        return arrs
+
+    def direct_growth_candidates(self) -> Dict[str, List[str]]:
+        if self._direct_growth is None:
+            self._direct_growth = classify_direct_growth_tags(self.qnames())
+        return self._direct_growth
+
+    def qnames(self):
+        for tax, items in (self.raw.get("facts") or {}).items():
+            for tag in items.keys():
+                yield f"{tax}:{tag}"
+
+    def window(self, qname: str, prefer_unit: str, lo: int, hi: int) -> List[Tuple[int, FactRecord]]:
+        """
+        end 서수가 [lo, hi] 안에 있는 레코드를 (unit 우선순위, 레코드)로 반환 (이진 탐색)
+        unit 우선순위는 기존 pool 순서와 동일: prefer_unit 먼저, 나머지는 원래 순서
+        """
+        units = self.concept(qname)
+        order = [prefer_unit] + [u for u in units if u != prefer_unit]
+        out = []
+        for rank, unit in enumerate(order):
+            series = units.get(unit)
+            if not series: continue
+            ords, recs = series
+            i = bisect.bisect_left(ords, lo)
+            j = bisect.bisect_right(ords, hi)
+            out.extend((rank, r) for r in recs[i:j])
+        return out
+
+def _nearest_end_distance(series, anchor_ords: List[int]) -> Optional[int]:
+    """
+    unit별로 정렬된 end 서수 시퀀스들에서 앵커에 가장 가까운 레코드까지의 거리(일). 레코드가 없으면 None.
+    앵커마다 이진 탐색 위치의 양옆만 보면 됨
+    """
+    best = None
+    for ords in series:
+        n = len(ords)
+        for a in anchor_ords:
+            i = bisect.bisect_left(ords, a)
+            for j in (i - 1, i):
+                if 0 <= j < n:
+                    d = abs(int(ords[j]) - a)
+                    if best is None or d < best:
+                        best = d
+    return best
+
+def as_fact_index(facts) -> CompanyFactIndex:
+    return facts if isinstance(facts, CompanyFactIndex) else CompanyFactIndex(facts)
+
+def _tolerance_windows(anchors: List[date], tol_days: int) -> List[Tuple[int, int]]:
+    # 앵커별 [a-tol, a+tol] 구간을 서수로 만들고 겹치면 병합
+    spans = sorted((a.toordinal() - tol_days, a.toordinal() + tol_days) for a in anchors)
+    merged: List[Tuple[int, int]] = []
+    for lo, hi in spans:
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+# 허용 구간 안 레코드 수가 이 값 이상일 때만 벡터화 경로 사용 (그 아래에서는 순회가 더 빠름)
+VECTOR_PICK_MIN_ROWS = 96
+
+class PickArrays:
+    """
+    smart_pick_arrays 입력 배열 묶음 (같은 길이, 같은 행 순서).
+    end_ord: end 서수, annual: fp가 FY/CY/FYR, q4: qtrs == 4, rank: unit 우선순위, pos: unit 배열 내 원래 순서.
+    record(i)는 i번째 행의 FactRecord (선택된 행만 만들면 됨)
+    """
+    __slots__ = ("end_ord", "annual", "q4", "rank", "pos", "record")
+
+    def __init__(self, end_ord, annual, q4, rank, pos, record):
+        self.end_ord = end_ord; self.annual = annual; self.q4 = q4
+        self.rank = rank; self.pos = pos; self.record = record
+
+def smart_pick_arrays(arrs: PickArrays, anchor_ords: List[int], tol_days: int, only: Optional[str] = None) -> int:
+    """
+    smart_pick의 벡터화 버전: 허용 구간/거리/점수를 한 번에 계산하고 선택된 행 번호(없으면 -1) 반환.
+    순위 = (score, end, 낮은 unit 우선순위, 낮은 pos) → smart_pick과 같은 레코드
+    """
+    if not len(arrs.end_ord):
+        return -1
+    dist = np.abs(arrs.end_ord[None, :] - np.asarray(anchor_ords, dtype=np.int64)[:, None]).min(axis=0)
+    mask = dist <= tol_days
+    if only == "annual":
+        mask &= arrs.annual
+    elif only == "q4":
+        mask &= arrs.q4
+    idx = np.flatnonzero(mask)
+    if not idx.size:
+        return -1
+    score = arrs.annual[idx] * 5 - dist[idx]
+    best = np.lexsort((arrs.pos[idx], arrs.rank[idx], -arrs.end_ord[idx], -score))[0]
+    return int(idx[best])
+
+def smart_pick_indexed(index: CompanyFactIndex, qname: str, anchors: List[date], tol_days: int,
+                       prefer_unit: str, only: Optional[str] = None) -> Optional[FactRecord]:
+    """
+    smart_pick과 동일한 점수/동점 규칙을 인덱스 위에서 적용.
+    only: "annual"(fp FY/CY/FYR), "q4"(qtrs==4), None(전체)
+    허용 구간 안의 레코드가 VECTOR_PICK_MIN_ROWS개 이상이면(numpy 필요) smart_pick_arrays로 한 번에 계산,
+    그보다 적으면 구간 안의 레코드를 순회하는 편이 빠름 (배열 연산의 호출당 고정 비용)
+    """
+    anchor_ords = [a.toordinal() for a in anchors]
+    windows = [index.window(qname, prefer_unit, lo, hi) for lo, hi in _tolerance_windows(anchors, tol_days)]
+    if np is not None and sum(map(len, windows)) >= VECTOR_PICK_MIN_ROWS:
+        arrs = index.pick_arrays(qname, prefer_unit)
+        i = smart_pick_arrays(arrs, anchor_ords, tol_days, only)
+        return arrs.record(i) if i >= 0 else None
+    best = None; best_rec = None
+    for window in windows:
+        for rank, r in window:
+            if only == "annual" and not r.is_annual: continue
+            if only == "q4" and r.qtrs != 4: continue
+            dist = min(abs(r.end_ord - a) for a in anchor_ords)
+            score = -dist + (5 if r.is_annual else 0)
+            # 기존 smart_pick은 (score, end)가 같으면 pool에서 먼저 나온 레코드를 유지
+            key = (score, r.end_ord, -rank, -r.pos)
+            if best is None or key > best:
+                best = key; best_rec = r
+    return best_rec
+
+# ----------------------- 컬럼 팩트 저장소 -------------------------
+# companyfacts JSON을 회사별 컬럼(.npy)으로 한 번 적재해 두고, 이후 실행에서는 mmap으로 읽음.
+#   {root}/CIK0000320193/meta.json   원본 서명, 최상위 메타(cik, entityName...), 개념/단위 구간 표, 문자열 표
+#   {root}/CIK0000320193/ints.npy    정수 컬럼들 (FACT_INT_COLUMNS 순서, 컬럼마다 연속된 int32 행)
+#   {root}/CIK0000320193/val.npy     float64 값 컬럼
+# 행 = 숫자 val과 해석 가능한 end를 가진 레코드 (개념, 단위, end, 원래 순서로 정렬).
+# 문자열 컬럼(end, fp, form, accn, segment)은 문자열 표의 코드, 날짜는 서수, -1 = 값 없음
+FACT_INT_COLUMNS = ("concept", "unit", "pos", "end", "end_ord", "start_ord", "filed_ord",
+                    "fy", "fp", "form", "accn", "qtrs", "segment")
+_FACT_STORE_VERSION = 1
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("numpy is required for the columnar fact store. pip install numpy")
+
+def _date_ord(s) -> int:
+    d = parse_date(s) if isinstance(s, str) else None
+    return d.toordinal() if d else -1
+
+def build_fact_columns(facts: dict) -> Tuple[dict, "np.ndarray", "np.ndarray"]:
+    """companyfacts dict → (meta, 정수 컬럼 2차원 배열, val 배열). CompanyFactIndex.concept()와 같은 레코드/순서"""
+    _require_numpy()
+    strings: List[str] = []
+    codes: Dict[str, int] = {}
+    def code(s) -> int:
+        if s is None:
+            return -1
+        if not isinstance(s, str):
+            s = json.dumps(s, ensure_ascii=False, sort_keys=True)
+        c = codes.get(s)
+        if c is None:
+            c = codes[s] = len(strings); strings.append(s)
+        return c
+    units: List[str] = []
+    unit_codes: Dict[str, int] = {}
+    cols: Dict[str, list] = {name: [] for name in FACT_INT_COLUMNS + ("val",)}
+    concepts = []
+    for tax, items in (facts.get("facts") or {}).items():
+        for tag, body in (items or {}).items():
+            qname = f"{tax}:{tag}"
+            cid = len(concepts)
+            spans = []
+            for unit, arr in ((body or {}).get("units") or {}).items():
+                uid = unit_codes.setdefault(unit, len(units))
+                if uid == len(units): units.append(unit)
+                rows = []
+                for pos, rec in enumerate(arr or []):
+                    if not isinstance(rec.get("val"), (int, float)): continue
+                    end = parse_date(rec.get("end"))
+                    if not end: continue
+                    rows.append((end.toordinal(), pos, rec))
+                rows.sort(key=lambda t: (t[0], t[1]))
+                lo = len(cols["pos"])
+                for end_ord, pos, rec in rows:
+                    q = rec.get("qtrs")
+                    cols["concept"].append(cid); cols["unit"].append(uid); cols["pos"].append(pos)
+                    cols["end"].append(code(rec.get("end"))); cols["end_ord"].append(end_ord)
+                    cols["start_ord"].append(_date_ord(rec.get("start"))); cols["filed_ord"].append(_date_ord(rec.get("filed")))
+                    cols["val"].append(float(rec["val"]))
+                    cols["fy"].append(rec["fy"] if isinstance(rec.get("fy"), int) else -1)
+                    cols["fp"].append(code(rec.get("fp"))); cols["form"].append(code(rec.get("form")))
+                    cols["accn"].append(code(rec.get("accn")))
+                    # 선택기는 qtrs == 4 여부만 보므로 정수가 아니면 -1(없음)으로 둠
+                    cols["qtrs"].append(q if isinstance(q, int) and 0 <= q < 2**31 else (4 if q == 4 else -1))
+                    cols["segment"].append(code(rec.get("segment")))
+                spans.append([unit, lo, len(cols["pos"])])
+            concepts.append([qname, spans])
+    meta = {
+        "version": _FACT_STORE_VERSION,
+        "top": {k: v for k, v in facts.items() if k != "facts"},
+        "concepts": concepts, "units": units, "strings": strings,
+        "rows": len(cols["pos"]),
+    }
+    ints = np.asarray([cols[name] for name in FACT_INT_COLUMNS], dtype="int32").reshape(len(FACT_INT_COLUMNS), -1)
+    return meta, ints, np.asarray(cols["val"], dtype="float64")
+
+class ColumnarFactIndex(CompanyFactIndex):
+    """
+    컬럼 저장소 위의 CompanyFactIndex. JSON을 다시 파싱하지 않고,
+    window()는 mmap된 end 서수 컬럼에서 이진 탐색한 뒤 구간 안의 행만 FactRecord로 만든다
+    """
+    def __init__(self, path, meta: Optional[dict] = None):
+        _require_numpy()
+        self.path = pathlib.Path(path)
+        if meta is None:
+            with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        super().__init__(meta["top"])
+        self.meta = meta
+        self._strings = meta["strings"]
+        self._table = {qname: spans for qname, spans in meta["concepts"]}
+        if meta["rows"]:
+            ints = np.load(self.path / "ints.npy", mmap_mode="r")
+            vals = np.load(self.path / "val.npy", mmap_mode="r")
+        else:
+            ints = np.zeros((len(FACT_INT_COLUMNS), 0), dtype="int32"); vals = np.zeros(0, dtype="float64")
+        self.columns = {name: ints[i] for i, name in enumerate(FACT_INT_COLUMNS)}
+        self.columns["val"] = vals
+        self._records: Dict[int, FactRecord] = {}
+        self._annual_codes = np.array([s.upper() in _ANNUAL_FPS for s in self._strings] or [False], dtype=bool)
+
+    def _str(self, c: int) -> Optional[str]:
+        return self._strings[c] if c >= 0 else None
+
+    def record(self, row: int, unit: str) -> FactRecord:
+        r = self._records.get(row)
+        if r is None:
+            c = self.columns
+            qtrs = int(c["qtrs"][row]); seg = int(c["segment"][row])
+            r = self._records[row] = FactRecord.from_values(
+                unit, int(c["pos"][row]), self._str(int(c["end"][row])), int(c["end_ord"][row]), float(c["val"][row]),
+                self._str(int(c["fp"][row])), qtrs if qtrs >= 0 else None, self._str(int(c["form"][row])),
+                self._str(int(c["accn"][row])), json.loads(self._strings[seg]) if seg >= 0 else None)
+        return r
+
+    def concept(self, qname: str) -> Dict[str, Tuple[List[int], List[FactRecord]]]:
+        units = self._concepts.get(qname)
+        if units is None:
+            units = {}
+            for unit, lo, hi in self._table.get(qname, []):
+                units[unit] = (self.columns["end_ord"][lo:hi].tolist(), [self.record(k, unit) for k in range(lo, hi)])
+            self._concepts[qname] = units
+        return units
+
+    def pick_arrays(self, qname: str, prefer_unit: str) -> PickArrays:
+        # concept의 행은 unit별로 연속 → 전체 구간을 mmap 슬라이스로 그대로 사용
+        key = (qname, prefer_unit)
+        arrs = self._pick_arrays.get(key)
+        if arrs is None:
+            spans = self._table.get(qname) or []
+            lo = min((a for _, a, _ in spans), default=0); hi = max((b for _, _, b in spans), default=0)
+            c = self.columns
+            order = [prefer_unit] + [u for u, _, _ in spans if u != prefer_unit]
+            unit_rank = np.zeros(len(self.meta["units"]), dtype=np.int64)
+            names = {u: i for i, u in enumerate(self.meta["units"])}
+            for rank, u in enumerate(order):
+                if u in names: unit_rank[names[u]] = rank
+            fp = c["fp"][lo:hi]
+            units = c["unit"][lo:hi]
+            arrs = self._pick_arrays[key] = PickArrays(
+                c["end_ord"][lo:hi].astype(np.int64), (fp >= 0) & self._annual_codes[np.maximum(fp, 0)],
+                c["qtrs"][lo:hi] == 4, unit_rank[units], c["pos"][lo:hi].astype(np.int64),
+                lambda i, lo=lo, units=units: self.record(lo + i, self.meta["units"][int(units[i])]))
+        return arrs
+
+    def window(self, qname: str, prefer_unit: str, lo: int, hi: int) -> List[Tuple[int, FactRecord]]:
+        spans = {unit: (a, b) for unit, a, b in self._table.get(qname) or []}
+        order = [prefer_unit] + [u for u in spans if u != prefer_unit]
+        out = []
+        for rank, unit in enumerate(order):
+            a, b = spans.get(unit, (0, 0))
+            if a == b: continue
+            ords = self.columns["end_ord"][a:b]
+            i = a + int(np.searchsorted(ords, lo, side="left"))
+            j = a + int(np.searchsorted(ords, hi, side="right"))
+            out.extend((rank, self.record(k, unit)) for k in range(i, j))
+        return out
+
+    def has_concept(self, qname: str) -> bool:
+        return bool(self._table.get(qname))
+
+    def nearest_end_distance(self, qname: str, anchor_ords: List[int]) -> Optional[int]:
+        return _nearest_end_distance([self.columns["end_ord"][a:b] for _, a, b in self._table.get(qname) or []], anchor_ords)
+
+    def qnames(self):
+        yield from self._table
+
+class FactColumnStore:
+    """회사별 컬럼 디렉터리 관리. meta.json의 source 서명이 원본과 다르면 다시 적재"""
+    def __init__(self, root):
+        _require_numpy()
+        self.root = pathlib.Path(root)
+
+    def path_for(self, key: str) -> pathlib.Path:
+        return self.root / key
+
+    def open(self, key: str, source: str) -> Optional[ColumnarFactIndex]:
+        path = self.path_for(key)
+        try:
+            with open(path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get("version") != _FACT_STORE_VERSION or meta.get("source") != source:
+            return None
+        return ColumnarFactIndex(path, meta)
+
+    def ingest(self, key: str, facts: dict, source: str) -> ColumnarFactIndex:
+        meta, ints, vals = build_fact_columns(facts)
+        meta["source"] = source
+        target = self.path_for(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = pathlib.Path(tempfile.mkdtemp(dir=self.root, prefix=f".{key}."))
+        try:
+            np.save(tmp / "ints.npy", ints)
+            np.save(tmp / "val.npy", vals)
+            with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            # 디렉터리 교체: 기존 것을 옆으로 치운 뒤 rename (읽는 쪽은 항상 완성된 디렉터리만 봄)
+            old = None
+            if target.exists():
+                old = self.root / f".{key}.old.{os.getpid()}"
+                os.replace(target, old)
+            os.replace(tmp, target)
+            if old is not None:
+                shutil.rmtree(old, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return ColumnarFactIndex(target, meta)
+
+_fact_store: Optional[FactColumnStore] = None
+
+def configure_fact_store(root: Optional[str]):
+    global _fact_store
+    _fact_store = FactColumnStore(root) if root else None
+
+def fact_source_signature(path) -> str:
+    # 캐시 객체는 파일명이 내용 해시, bulk zip 멤버는 CRC+크기, 그 외 파일은 크기+수정시각. taxonomy 필터가 다르면 다른 적재본
+    if isinstance(path, ArchiveMember):
+        return path.signature() + "|" + (",".join(sorted(_facts_taxonomies)) if _facts_taxonomies else "*")
+    p = pathlib.Path(path)
+    if p.name.endswith(".json.gz") and re.fullmatch(r"[0-9a-f]{64}", p.name[:-len(".json.gz")]):
+        sig = p.name[:-len(".json.gz")]
+    else:
+        st = p.stat()
+        sig = f"{st.st_size}-{st.st_mtime_ns}"
+    return sig + "|" + (",".join(sorted(_facts_taxonomies)) if _facts_taxonomies else "*")
+
+def open_company_facts(path, key: Optional[str] = None, facts: Optional[dict] = None):
+    """
+    companyfacts 열기. 컬럼 저장소가 설정돼 있으면 ColumnarFactIndex(없거나 원본이 바뀌었으면 적재),
+    아니면 dict. facts가 이미 메모리에 있으면 파일을 다시 읽지 않음
+    """
+    if _fact_store is None:
+        return prune_facts(facts) if facts is not None else load_facts_file(path)
+    key = key or f"CIK{cik_from_facts_path(path)}"
+    source = fact_source_signature(path)
+    index = _fact_store.open(key, source)
+    if index is None:
+        index = _fact_store.ingest(key, prune_facts(facts) if facts is not None else load_facts_file(path), source)
+    return index
+
 # ----------------------- 회계연도 윈도우 ------------------------------
-def parse_date(s: Optional[str]) -> Optional[date]:
-    if not s: return None
+# 날짜 문자열 → date 캐시. 같은 end/start 문자열이 레코드·개념·회사마다 반복되므로 프로세스에서 한 번만 파싱
+# (같은 날짜는 같은 date 객체를 공유). 크기가 한도를 넘으면 비움
+_DATE_CACHE: Dict[str, Optional[date]] = {}
+_DATE_CACHE_MAX = 1 << 16
+
+def _parse_date_uncached(s) -> Optional[date]:
+    # 대부분은 정확히 YYYY-MM-DD → fromisoformat (strptime보다 훨씬 빠름). 그 모양이 아니거나 실패하면 기존 형식들로
+    if len(s) == 10 and s[4] == "-" and s[7] == "-":
+        try: return date.fromisoformat(s)
+        except ValueError: pass
     for fmt in ("%Y-%m-%d","%Y/%m/%d","%m/%d/%Y"):
         try: return datetime.strptime(s, fmt).date()
         except Exception: pass
     return None
 
+def parse_date(s: Optional[str]) -> Optional[date]:
+    if not s: return None
+    if not isinstance(s, str): return None
+    d = _DATE_CACHE.get(s, _DATE_CACHE)
+    if d is _DATE_CACHE:
+        if len(_DATE_CACHE) >= _DATE_CACHE_MAX:
+            _DATE_CACHE.clear()
+        d = _DATE_CACHE[s] = _parse_date_uncached(s)
+    return d
+
+# (fy, fiscalYearEnd) → 앵커 날짜. 회사·연도마다 선택기 호출 수백 번이 같은 앵커를 씀
+_ANCHOR_CACHE: Dict[Tuple[int, str], Tuple[date, date]] = {}
+
 def anchors_for_fy(fy: int, submissions: dict) -> List[date]:
-    fye = str(submissions.get("fiscalYearEnd") or "1231").strip()
-    if not re.fullmatch(r"\d{4}", fye): fye = "1231"
-    mm, dd = int(fye[:2]), int(fye[2:])
-    return [date(fy, mm, dd), date(fy+1, mm, dd)]
+    raw = str(submissions.get("fiscalYearEnd") or "1231")
+    anchors = _ANCHOR_CACHE.get((fy, raw))
+    if anchors is None:
+        fye = raw.strip()
+        if not re.fullmatch(r"\d{4}", fye): fye = "1231"
+        mm, dd = int(fye[:2]), int(fye[2:])
+        anchors = _ANCHOR_CACHE[(fy, raw)] = (date(fy, mm, dd), date(fy+1, mm, dd))
+    return list(anchors)
 
 def within_tolerance(d: date, anchors: List[date], tol_days: int) -> bool:
     return any(abs((d - a).days) <= tol_days for a in anchors)
@@ -1560,6 +2925,9 @@ def score_adj(form: Optional[str], unit: Optional[str], fp: Optional[str], has_s
     if industry_hit: s += 0.02
     return s
 
+# score_adj가 줄 수 있는 최대 가산점 (10-K·USD·FY·세그먼트 없음·산업 일치)
+SCORE_ADJ_MAX = score_adj("10-K", "USD", "FY", False, True)
+
 # ----------------------- 정적 후보 (긴 목록) --------------
 # (주요 표준 후보 + 산업별 후보 + IFRS 포함. 필요시 확장 태그는 채굴/힌트로 커버)
 CANDIDATES: Dict[str, List[Candidate]] = {
@@ -1743,28 +3111,44 @@ _DIRECT_GROWTH_BLACKLIST = [
     "IncomeTax", "TaxExpense", "TaxBenefit", "TaxProvision"
 ]
 
+# 미리 컴파일한 매처: 메트릭별 패턴을 하나로 합친 정규식, 모든 메트릭을 합친 사전 필터, 블랙리스트.
+# 모든 패턴이 (?:^|:)로 시작하므로 공통 접두를 밖으로 빼서 합침 (각 위치에서 접두가 먼저 실패해 훨씬 빠름)
+_DIRECT_GROWTH_ANCHOR = "(?:^|:)"
+
+def _compile_growth_patterns(pats) -> "re.Pattern":
+    if not all(p.startswith(_DIRECT_GROWTH_ANCHOR) for p in pats):
+        raise ValueError(f"direct-growth patterns must start with {_DIRECT_GROWTH_ANCHOR}")
+    return re.compile(_DIRECT_GROWTH_ANCHOR + "(?:" + "|".join(f"(?:{p[len(_DIRECT_GROWTH_ANCHOR):]})" for p in pats) + ")",
+                      re.IGNORECASE)
+
+_DIRECT_GROWTH_RX = {m: _compile_growth_patterns(pats) for m, pats in _DIRECT_GROWTH_PATS.items()}
+_DIRECT_GROWTH_ANY_RX = _compile_growth_patterns([p for pats in _DIRECT_GROWTH_PATS.values() for p in pats])
+_DIRECT_GROWTH_BLACKLIST_RX = re.compile("|".join(re.escape(k) for k in _DIRECT_GROWTH_BLACKLIST), re.IGNORECASE)
+
 def _is_valid_direct_growth_tag(qname: str, metric_name: str) -> bool:
     """
     direct-growth 태그가 실제로 해당 메트릭과 관련있는지 검증
     - Tax, Reconciliation, Enacted 등 관련 없는 키워드 블랙리스트 체크
     """
-    qn_upper = qname.upper()
-    for blacklisted in _DIRECT_GROWTH_BLACKLIST:
-        if blacklisted.upper() in qn_upper:
-            return False
-    return True
+    return _DIRECT_GROWTH_BLACKLIST_RX.search(qname) is None
 
-def _mine_direct_growth_candidates(facts_json: dict, metric_name: str) -> List[str]:
-    out=[]; facts=facts_json.get("facts") or {}
-    pats = _DIRECT_GROWTH_PATS.get(metric_name, [])
-    for tax, items in facts.items():
-        for tag in items.keys():
-            qn=f"{tax}:{tag}"
-            if any(re.search(rx, qn, re.IGNORECASE) for rx in pats):
-                if _is_valid_direct_growth_tag(qn, metric_name):
-                    out.append(qn)
+def classify_direct_growth_tags(qnames) -> Dict[str, List[str]]:
+    """
+    회사의 모든 태그를 한 번 훑어 성장률 메트릭별 direct-growth 후보로 분류 (원래 태그 순서 유지).
+    대부분의 태그는 합친 사전 필터 한 번에 걸러지고, 통과한 태그만 메트릭별 정규식과 블랙리스트를 확인
+    """
+    out: Dict[str, List[str]] = {m: [] for m in _DIRECT_GROWTH_RX}
+    for qn in qnames:
+        if _DIRECT_GROWTH_ANY_RX.search(qn) is None or _DIRECT_GROWTH_BLACKLIST_RX.search(qn) is not None:
+            continue
+        for metric, rx in _DIRECT_GROWTH_RX.items():
+            if rx.search(qn):
+                out[metric].append(qn)
     return out
 
+def _mine_direct_growth_candidates(facts_json, metric_name: str) -> List[str]:
+    return as_fact_index(facts_json).direct_growth_candidates().get(metric_name, [])
+
 # --------------------- 간단한 유틸리티 -----------------------------
 def safe_float(x) -> Optional[float]:
     try:
@@ -1776,110 +3160,120 @@ def safe_float(x) -> Optional[float]:
     except Exception:
         return None
 
-def add_row(rows: List[dict], company_meta: dict, fy: int, metric: str, is_derived: bool,
+def add_row(rows: List[TagRow], company_meta: dict, fy: int, metric: str, is_derived: bool,
             value: Optional[float], unit: str, period_type: str, end: str, form: str, accn: str,
             source_type: str, selected_tag: str, composite_name: str, computed_from: str,
             confidence: Optional[float], reason: str, components_obj=None):
     """
-    tags.csv(원복 스키마) 한 줄 추가
-    """
-    rows.append({
-        "cik": company_meta.get("cik",""),
-        "symbol": company_meta.get("symbol",""),
-        "name": company_meta.get("name",""),
-        "sector": company_meta.get("sector",""),
-        "industry": company_meta.get("industry",""),
-        "sic": company_meta.get("sic",""),
-        "sic_description": company_meta.get("sic_description",""),
-        "fye": company_meta.get("fye",""),
-        "fy": str(fy),
-        "metric": metric,
-        "is_derived": "true" if is_derived else "false",
-        "value": "" if value is None else f"{float(value):.6f}",
-        "unit": unit or "",
-        "period_type": period_type or "",
-        "end": end or "",
-        "form": form or "",
-        "accn": accn or "",
-        "source_type": source_type or "",
-        "selected_tag": selected_tag or "",
-        "composite_name": composite_name or "",
-        "computed_from": computed_from or "",
-        "confidence": "" if confidence is None else f"{float(confidence):.3f}",
-        "reason": reason or "",
-        "components": "[]" if not components_obj else json.dumps(components_obj, ensure_ascii=False)
-    })
+    tags.csv(원복 스키마) 한 줄 추가 (TAGS_FIELDS 순서의 TagRow)
+    """
+    rows.append(TagRow(
+        company_meta.get("cik",""),
+        company_meta.get("symbol",""),
+        company_meta.get("name",""),
+        company_meta.get("sector",""),
+        company_meta.get("industry",""),
+        company_meta.get("sic",""),
+        company_meta.get("sic_description",""),
+        company_meta.get("fye",""),
+        str(fy),
+        metric,
+        "true" if is_derived else "false",
+        "" if value is None else f"{float(value):.6f}",
+        unit or "",
+        period_type or "",
+        end or "",
+        form or "",
+        accn or "",
+        source_type or "",
+        selected_tag or "",
+        composite_name or "",
+        computed_from or "",
+        "" if confidence is None else f"{float(confidence):.3f}",
+        reason or "",
+        "[]" if not components_obj else json.dumps(components_obj, ensure_ascii=False),
+    ))
 
 # --------------------- 선택기 (연간 / 시점) --------------
-def pick_best_annual(facts_json: dict, qname: str, fy: int, submissions: dict, dbg: Debugger,
+def pick_best_annual(facts_json, qname: str, fy: int, submissions: dict, dbg: Debugger,
                      prefer_unit="USD", tol_days=90, accept_missing_fp=True):
-    unit_map = get_unit_records(facts_json, qname)
-    if not unit_map:
+    index = as_fact_index(facts_json)
+    if not index.has_concept(qname):
         dbg.log(f"[annual] no units for {qname}")
         return None
     anchors = anchors_for_fy(fy, submissions)
-    pool=[]; order=[prefer_unit]+[u for u in unit_map if u!=prefer_unit]
-    for unit in order:
-        for rec in unit_map.get(unit, []):
-            if not isinstance(rec.get("val"), (int,float)): continue
-            pool.append((unit, rec))
-
-    pass1=[(u,r) for (u,r) in pool if (r.get("fp") or "").upper() in ("FY","CY","FYR")]
-    chosen = smart_pick([r for (_,r) in pass1], anchors, tol_days, dbg)
+
+    chosen = smart_pick_indexed(index, qname, anchors, tol_days, prefer_unit, only="annual")
     if chosen:
-        chosen_unit = [u for (u,r) in pass1 if r is chosen][0]
-        return ("annual", {"unit":chosen_unit, "end":chosen.get("end"), "form":chosen.get("form"), "fp":chosen.get("fp"),
-                           "val":float(chosen.get("val")), "accn":chosen.get("accn"), "segment":chosen.get("segment")})
+        return ("annual", chosen.as_pick())
 
-    pass2=[(u,r) for (u,r) in pool if r.get("qtrs")==4]
-    chosen = smart_pick([r for (_,r) in pass2], anchors, tol_days, dbg)
+    chosen = smart_pick_indexed(index, qname, anchors, tol_days, prefer_unit, only="q4")
     if chosen:
-        chosen_unit = [u for (u,r) in pass2 if r is chosen][0]
-        return ("ytd-q4", {"unit":chosen_unit, "end":chosen.get("end"), "form":chosen.get("form"), "fp":"FY",
-                           "val":float(chosen.get("val")), "accn":chosen.get("accn"), "segment":chosen.get("segment")})
+        return ("ytd-q4", chosen.as_pick(fp="FY"))
 
     if accept_missing_fp:
-        chosen = smart_pick([r for (_,r) in pool], anchors, tol_days, dbg)
+        chosen = smart_pick_indexed(index, qname, anchors, tol_days, prefer_unit)
         if chosen:
-            chosen_unit = [u for (u,r) in pool if r is chosen][0]
-            return ("lenient", {"unit":chosen_unit, "end":chosen.get("end"), "form":chosen.get("form"), "fp":chosen.get("fp") or "",
-                                "val":float(chosen.get("val")), "accn":chosen.get("accn"), "segment":chosen.get("segment")})
+            return ("lenient", chosen.as_pick(fp=chosen.fp or ""))
     return None
 
-def pick_best_instant(facts_json: dict, qname: str, fy: int, submissions: dict, dbg: Debugger,
+def pick_best_instant(facts_json, qname: str, fy: int, submissions: dict, dbg: Debugger,
                       prefer_unit="USD", tol_days=120):
-    unit_map = get_unit_records(facts_json, qname)
-    if not unit_map:
+    index = as_fact_index(facts_json)
+    if not index.has_concept(qname):
         dbg.log(f"[instant] no units for %s" % qname)
         return None
     anchors = anchors_for_fy(fy, submissions)
-    pool=[]
-    order=[prefer_unit]+[u for u in unit_map if u!=prefer_unit]
-    for unit in order:
-        for rec in unit_map.get(unit, []):
-            if not isinstance(rec.get("val"), (int,float)): continue
-            pool.append((unit, rec))
-    chosen = smart_pick([r for (_,r) in pool], anchors, tol_days, dbg)
+    chosen = smart_pick_indexed(index, qname, anchors, tol_days, prefer_unit)
     if chosen:
-        unit = [u for (u,r) in pool if r is chosen][0]
-        return {"unit":unit, "end":chosen.get("end"), "form":chosen.get("form"), "fp":chosen.get("fp"),
-                "val":float(chosen.get("val")), "accn":chosen.get("accn"), "segment":chosen.get("segment")}
+        return chosen.as_pick()
     return None
 
 # --------------------- 간단한 선택기 (기본) -----------------
+# 후보가 하나도 안 잡히면 tolerance를 이만큼씩 넓혀 다시 시도 (넓힌 단계는 점수 -0.02)
+SELECT_WIDENS = (0, 60, 120, 180)
+
+# 상한 비교 여유: 점수 합산 순서에 따른 부동소수 오차와 math.isclose 동점 판정보다 넉넉하게
+_BOUND_EPS = 1e-6
+
+def candidate_bounds(metric_name: str, sector: str, bonus: float) -> Tuple[List[Candidate], List[Tuple[float, float]]]:
+    """
+    metric_name 후보 중 sector에 해당하는 것(선언 순서 유지)과, 위치별 (이 후보의 최대 점수, 이 위치부터 남은 후보의 최대 점수).
+    최대 점수 = base_score + bonus (출처 유형·score_adj 가산점의 최댓값). 선택기는 현재 최고점이 이 상한보다
+    높으면 pick을 호출하지 않고 건너뛰거나 멈춤 — 선언 순서대로 비교하므로 동점(end) 규칙까지 결과가 같음
+    """
+    # industry_only 필터링: None이면 모든 섹터, 지정되면 해당 섹터만
+    cands = [c for c in CANDIDATES.get(metric_name, []) if c.industry_only is None or sector in c.industry_only]
+    bounds: List[Tuple[float, float]] = []
+    rest = -math.inf
+    for cand in reversed(cands):
+        own = cand.base_score + bonus
+        rest = max(rest, own)
+        bounds.append((own, rest))
+    bounds.reverse()
+    return cands, bounds
+
 def select_base_duration(facts, fy, submissions, dbg, metric_name, prefer_unit="USD", tol_days=90, sector=None):
+    index = as_fact_index(facts)
+    key = (metric_name, fy, prefer_unit, tol_days, "duration", sector)
+    cached = index.cached_selection(key)
+    if cached is not None:
+        return cached
     best=None
     # sector 정보 추출 (submissions에서)
     if sector is None:
         sector = infer_sector_industry(submissions)[0]
-    
-    for widen in (0, 60, 120, 180):
-        for cand in CANDIDATES.get(metric_name, []):
-            # industry_only 필터링: None이면 모든 섹터, 지정되면 해당 섹터만
-            if cand.industry_only is not None and sector not in cand.industry_only:
+    cands, bounds = candidate_bounds(metric_name, sector, 0.012 + SCORE_ADJ_MAX)
+
+    for widen in SELECT_WIDENS:
+        penalty = 0.02 if widen else 0.0
+        for i, cand in enumerate(cands):
+            # 남은 후보 전체 / 이 후보의 상한으로도 현재 최고점을 못 넘으면 건너뜀 (순서·동점 규칙은 그대로)
+            if best is not None and bounds[i][1] - penalty < best[0] - _BOUND_EPS:
+                break
+            if best is not None and bounds[i][0] - penalty < best[0] - _BOUND_EPS:
                 continue
-            
-            res = pick_best_annual(facts, cand.qname, fy, submissions, dbg, prefer_unit, tol_days+widen, accept_missing_fp=True)
+            res = pick_best_annual(index, cand.qname, fy, submissions, dbg, prefer_unit, tol_days+widen, accept_missing_fp=True)
             if res and res[1]:
                 p=res[1]; typ=res[0]
                 industry_hit = (cand.industry_only is None) or (sector in cand.industry_only)
@@ -1889,22 +3283,30 @@ def select_base_duration(facts, fy, submissions, dbg, metric_name, prefer_unit="
                      "end":p["end"],"form":p["form"],"accn":p["accn"],"confidence":max(0,min(1,score))}
                 if (best is None) or (score>best[0]) or (math.isclose(score,best[0]) and out["end"]>(best[1]["end"] or "")):
                     best=(score,out)
-        if best: return best[1]
-    return {"source_type":"none","reason":"no candidate matched"}
+        if best: break
+    result = best[1] if best else {"source_type":"none","reason":"no candidate matched"}
+    return index.store_selection(key, result)
 
 def select_base_instant(facts, fy, submissions, dbg, metric_name, prefer_unit="USD", tol_days=120, sector=None):
+    index = as_fact_index(facts)
+    key = (metric_name, fy, prefer_unit, tol_days, "instant", sector)
+    cached = index.cached_selection(key)
+    if cached is not None:
+        return cached
     best=None
     # sector 정보 추출 (submissions에서)
     if sector is None:
         sector = infer_sector_industry(submissions)[0]
-    
-    for widen in (0, 60, 120, 180):
-        for cand in CANDIDATES.get(metric_name, []):
-            # industry_only 필터링: None이면 모든 섹터, 지정되면 해당 섹터만
-            if cand.industry_only is not None and sector not in cand.industry_only:
+    cands, bounds = candidate_bounds(metric_name, sector, SCORE_ADJ_MAX)
+
+    for widen in SELECT_WIDENS:
+        penalty = 0.02 if widen else 0.0
+        for i, cand in enumerate(cands):
+            if best is not None and bounds[i][1] - penalty < best[0] - _BOUND_EPS:
+                break
+            if best is not None and bounds[i][0] - penalty < best[0] - _BOUND_EPS:
                 continue
-            
-            p = pick_best_instant(facts, cand.qname, fy, submissions, dbg, prefer_unit, tol_days+widen)
+            p = pick_best_instant(index, cand.qname, fy, submissions, dbg, prefer_unit, tol_days+widen)
             if p:
                 industry_hit = (cand.industry_only is None) or (sector in cand.industry_only)
                 score=cand.base_score + score_adj(p.get("form"), p.get("unit"), p.get("fp"), bool(p.get("segment")), industry_hit) - (0.02 if widen else 0.0)
@@ -1912,8 +3314,9 @@ def select_base_instant(facts, fy, submissions, dbg, metric_name, prefer_unit="U
                      "end":p["end"],"form":p["form"],"accn":p["accn"],"confidence":max(0,min(1,score))}
                 if (best is None) or (score>best[0]) or (math.isclose(score,best[0]) and out["end"]>(best[1]["end"] or "")):
                     best=(score,out)
-        if best: return best[1]
-    return {"source_type":"none","reason":"no candidate matched"}
+        if best: break
+    result = best[1] if best else {"source_type":"none","reason":"no candidate matched"}
+    return index.store_selection(key, result)
 
 # 편의 래퍼 함수들
 def select_revenue(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=90):
@@ -2007,6 +3410,9 @@ def select_income_tax_expense(facts, fy, submissions, dbg, prefer_unit="USD", to
 def select_pretax_income(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=90):
     return select_base_duration(facts, fy, submissions, dbg, "PreTaxIncome", prefer_unit, tol_days)
 
+def select_cash(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=120):
+    return select_base_instant(facts, fy, submissions, dbg, "CashAndCashEquivalents", prefer_unit, tol_days)
+
 # --------------------- 파생 헬퍼 -------------------------
 def avg_two(a: float, b: float) -> Optional[float]:
     try: return (float(a) + float(b)) / 2.0
@@ -2027,7 +3433,7 @@ def derive_total_debt(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=1
     return {"source_type":"none","reason":"no debt components"}
 
 # --------------------- Growth 전용 보강 ------------------------
-def _pick_prior_year_relaxed(facts_json: dict, qname: str, fy: int, submissions: dict, dbg: Debugger,
+def _pick_prior_year_relaxed(facts_json, qname: str, fy: int, submissions: dict, dbg: Debugger,
                               prefer_unit="USD", period_type="duration"):
     """
     전년도 데이터를 더 유연하게 추출하는 함수
@@ -2035,116 +3441,71 @@ def _pick_prior_year_relaxed(facts_json: dict, qname: str, fy: int, submissions:
     - FY/FP 태그가 없어도 전년도 범위 내 데이터 수용
     - period_type이 "duration"이면 annual 데이터, "instant"이면 instant 데이터 검색
     """
-    unit_map = get_unit_records(facts_json, qname)
-    if not unit_map:
+    index = as_fact_index(facts_json)
+    if not index.has_concept(qname):
         dbg.log(f"[prior_year_relaxed] no units for {qname}")
         return None
     
     # 전년도 fiscal year end 기준으로 범위 계산
-    fye = str(submissions.get("fiscalYearEnd") or "1231").strip()
-    if not re.fullmatch(r"\d{4}", fye):
-        fye = "1231"
-    mm, dd = int(fye[:2]), int(fye[2:])
-    
     # 전년도 범위: (fy-2, mm, dd) ~ (fy, mm, dd) ± 180일
-    prior_fye = date(fy-1, mm, dd)
-    prior_year_start = date(fy-2, mm, dd) + timedelta(days=1)
-    prior_year_end = date(fy, mm, dd)
+    prior_fye, prior_year_end = anchors_for_fy(fy-1, submissions)
+    prior_year_start = anchors_for_fy(fy-2, submissions)[0] + timedelta(days=1)
     
     # 더 넓은 범위 허용 (±180일)
     search_start = prior_year_start - timedelta(days=180)
     search_end = prior_year_end + timedelta(days=180)
     
-    pool = []
-    order = [prefer_unit] + [u for u in unit_map if u != prefer_unit]
-    
-    for unit in order:
-        for rec in unit_map.get(unit, []):
-            if not isinstance(rec.get("val"), (int, float)):
-                continue
-            rec_end = parse_date(rec.get("end"))
-            if rec_end and search_start <= rec_end <= search_end:
-                pool.append((unit, rec))
-    
+    pool = index.window(qname, prefer_unit, search_start.toordinal(), search_end.toordinal())
     if not pool:
         dbg.log(f"[prior_year_relaxed] no records in prior year range for {qname}")
         return None
     
+    # prior_fye에 가장 가까운 레코드 (동점이면 기존 pool 순서상 먼저 나온 것)
+    prior_ord = prior_fye.toordinal()
+    def closest(recs):
+        best = None; best_key = None
+        for rank, r in recs:
+            key = (abs(r.end_ord - prior_ord), rank, r.pos)
+            if best_key is None or key < best_key:
+                best = r; best_key = key
+        return best
+
     # instant 타입의 경우 간단하게 가장 가까운 것 선택
     if period_type == "instant":
-        best = None
-        best_dist = None
-        for unit, rec in pool:
-            rec_end = parse_date(rec.get("end"))
-            if rec_end:
-                dist = abs((rec_end - prior_fye).days)
-                if best is None or dist < best_dist:
-                    best = (unit, rec)
-                    best_dist = dist
-        if best:
-            unit, rec = best
-            return {"unit": unit, "end": rec.get("end"), "form": rec.get("form"),
-                   "fp": rec.get("fp"), "val": float(rec.get("val")),
-                   "accn": rec.get("accn"), "segment": rec.get("segment")}
-        return None
+        best = closest(pool)
+        return best.as_pick() if best else None
     
-    # duration 타입의 경우 FY/FP 태그 우선 선택
-    # FY/FP 태그가 있는 레코드 우선 선택
-    pass1 = [(u, r) for (u, r) in pool if (r.get("fp") or "").upper() in ("FY", "CY", "FYR")]
-    if pass1:
-        # 가장 가까운 end date 선택 (prior_fye에 가장 가까운 것)
-        best = None
-        best_dist = None
-        for unit, rec in pass1:
-            rec_end = parse_date(rec.get("end"))
-            if rec_end:
-                dist = abs((rec_end - prior_fye).days)
-                if best is None or dist < best_dist:
-                    best = (unit, rec)
-                    best_dist = dist
-        if best:
-            unit, rec = best
-            return ("annual", {"unit": unit, "end": rec.get("end"), "form": rec.get("form"),
-                              "fp": rec.get("fp"), "val": float(rec.get("val")),
-                              "accn": rec.get("accn"), "segment": rec.get("segment")})
+    # duration 타입의 경우 FY/FP 태그가 있는 레코드 우선 선택
+    best = closest([(k, r) for (k, r) in pool if r.is_annual])
+    if best:
+        return ("annual", best.as_pick())
     
     # qtrs==4인 레코드 선택
-    pass2 = [(u, r) for (u, r) in pool if r.get("qtrs") == 4]
-    if pass2:
-        best = None
-        best_dist = None
-        for unit, rec in pass2:
-            rec_end = parse_date(rec.get("end"))
-            if rec_end:
-                dist = abs((rec_end - prior_fye).days)
-                if best is None or dist < best_dist:
-                    best = (unit, rec)
-                    best_dist = dist
-        if best:
-            unit, rec = best
-            return ("ytd-q4", {"unit": unit, "end": rec.get("end"), "form": rec.get("form"),
-                               "fp": "FY", "val": float(rec.get("val")),
-                               "accn": rec.get("accn"), "segment": rec.get("segment")})
+    best = closest([(k, r) for (k, r) in pool if r.qtrs == 4])
+    if best:
+        return ("ytd-q4", best.as_pick(fp="FY"))
     
     # 모든 레코드 중 가장 가까운 것 선택
-    best = None
-    best_dist = None
-    for unit, rec in pool:
-        rec_end = parse_date(rec.get("end"))
-        if rec_end:
-            dist = abs((rec_end - prior_fye).days)
-            if best is None or dist < best_dist:
-                best = (unit, rec)
-                best_dist = dist
-    
+    best = closest(pool)
     if best:
-        unit, rec = best
-        return ("lenient", {"unit": unit, "end": rec.get("end"), "form": rec.get("form"),
-                            "fp": rec.get("fp") or "", "val": float(rec.get("val")),
-                            "accn": rec.get("accn"), "segment": rec.get("segment")})
+        return ("lenient", best.as_pick(fp=best.fp or ""))
     
     return None
 
+# 전년도 fallback에서 base_tol_days에 더해 가며 select_base_*를 부르는 tolerance 단계
+PRIOR_TOL_INCREMENTS = (180, 240, 300, 360, 420, 540)
+
+def prior_year_reach(facts, fy: int, submissions: dict, metric_name: str) -> Optional[int]:
+    """
+    select_base_*(fy-1)가 볼 후보(섹터 필터 적용)의 레코드 중 fy-1 앵커에 가장 가까운 것까지의 거리(일), 없으면 None.
+    tol + 최대 widen이 이 값보다 작으면 그 tolerance의 선택 결과는 none
+    """
+    index = as_fact_index(facts)
+    sector = infer_sector_industry(submissions)[0]
+    anchor_ords = [a.toordinal() for a in anchors_for_fy(fy - 1, submissions)]
+    cands, _ = candidate_bounds(metric_name, sector, 0.0)
+    return min((d for d in (index.nearest_end_distance(c.qname, anchor_ords) for c in cands) if d is not None), default=None)
+
 def _select_prior_year_with_fallback(facts, fy, submissions, dbg, metric_name, 
                                      prefer_unit="USD", base_tol_days=90, period_type="duration"):
     """
@@ -2153,6 +3514,7 @@ def _select_prior_year_with_fallback(facts, fy, submissions, dbg, metric_name,
     - 실패 시 select_base_duration/select_base_instant로 fallback
     - tol_days를 단계적으로 증가 (base_tol_days+180, +240, +300, +360, +420, +540)
     """
+    facts = as_fact_index(facts)
     # 먼저 relaxed 방식으로 시도
     candidates = CANDIDATES.get(metric_name, [])
     if candidates:
@@ -2186,8 +3548,15 @@ def _select_prior_year_with_fallback(facts, fy, submissions, dbg, metric_name,
     else:
         return {"source_type": "none", "reason": "invalid period_type"}
     
-    # tol_days를 단계적으로 증가시키며 시도 (범위 확장)
-    for tol_increment in (180, 240, 300, 360, 420, 540):
+    # tol_days를 단계적으로 증가시키며 시도 (범위 확장).
+    # 후보 레코드 중 fy-1 앵커에 가장 가까운 거리를 한 번 구해 두고, 가장 넓힌 창으로도 닿지 않는 단계는
+    # 결과가 none임이 확정이므로 선택기를 부르지 않음 (레코드가 아예 없으면 모든 단계를 건너뜀).
+    # lenient/instant pick은 unit·fp·form·segment와 상관없이 창 안의 숫자 레코드를 받으므로, 거리가 닿는 첫 단계에서
+    # 선택기가 반드시 값을 돌려줌 → 선택기 호출은 회사·메트릭당 최대 한 번이고 뒤 단계는 안전장치로만 남음
+    reach = prior_year_reach(facts, fy, submissions, metric_name)
+    tiers = [inc for inc in PRIOR_TOL_INCREMENTS
+             if reach is not None and base_tol_days + inc + SELECT_WIDENS[-1] >= reach]
+    for tol_increment in tiers:
         result = selector(facts, fy-1, submissions, dbg, metric_name, prefer_unit, base_tol_days + tol_increment)
         if result.get("source_type") != "none" and safe_float(result.get("value")) is not None:
             return result
@@ -2286,7 +3655,7 @@ def _compute_growth_from_base(cur_val: Optional[float], prev_val: Optional[float
     except Exception:
         return None
 
-def compute_growth_set(facts: dict, fy: int, submissions: dict, dbg: Debugger, prefer_unit="USD", tol_days=90):
+def compute_growth_set(facts, fy: int, submissions: dict, dbg: Debugger, prefer_unit="USD", tol_days=90):
     """
     Growth 4종만 계산하여 dict로 반환:
       {"RevenueGrowthYoY": {...}, "NetIncomeGrowthYoY": {...}, "CFOGrowthYoY": {...}, "AssetGrowthRate": {...}}
@@ -2501,160 +3870,340 @@ def compute_growth_set(facts: dict, fy: int, submissions: dict, dbg: Debugger, p
     return out
 
 # --------------------- 기타 파생 메트릭 -------------------
-def compute_other_derived(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=90):
-    rows = []
-    rev  = select_revenue(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    rev1 = select_revenue(facts, fy-1, submissions, dbg, prefer_unit, tol_days+90)
-    ni   = select_net_income(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    oi   = select_operating_income(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    gp   = select_gross_profit(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    cfo  = select_cfo(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    capex= select_capex(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    dpa  = select_dep_amort(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    iexp = select_interest_expense(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    eq   = select_equity(facts, fy, submissions, dbg, prefer_unit, 120)
-    eq1  = select_equity(facts, fy-1, submissions, dbg, prefer_unit, 120)
-    assets = select_assets(facts, fy, submissions, dbg, prefer_unit, 120)
-    assets1= select_assets(facts, fy-1, submissions, dbg, prefer_unit, 180)
-
-    # Margins
-    if gp.get("source_type") != "none" and rev.get("source_type") != "none" and safe_float(rev["value"]):
-        rows.append(("GrossMargin", float(gp["value"])/float(rev["value"]), "ratio", rev["end"], rev["form"], rev["accn"],
-                     "derived", "", "GrossProfit;Revenue", 0.90, ""))
-
-    if oi.get("source_type") != "none" and rev.get("source_type") != "none" and safe_float(rev["value"]):
-        rows.append(("OperatingMargin", float(oi["value"])/float(rev["value"]), "ratio", rev["end"], rev["form"], rev["accn"],
-                     "derived", "", "OperatingIncome;Revenue", 0.90, ""))
-
-    if ni.get("source_type") != "none" and rev.get("source_type") != "none" and safe_float(rev["value"]):
-        rows.append(("NetProfitMargin", float(ni["value"])/float(rev["value"]), "ratio", rev["end"], rev["form"], rev["accn"],
-                     "derived", "", "NetIncome;Revenue", 0.90, ""))
-
-    if ni.get("source_type") != "none" and eq.get("source_type") != "none" and eq1.get("source_type") != "none":
-        avg_eq = avg_two(eq["value"], eq1["value"])
-        if avg_eq and float(avg_eq) != 0:
-            rows.append(("ROE", float(ni["value"])/float(avg_eq), "ratio", eq["end"], eq["form"], eq["accn"],
-                         "derived", "", "NetIncome;Equity;Equity_Prior", 0.90, ""))
-
-    if cfo.get("source_type") != "none" and capex.get("source_type") != "none":
-        rows.append(("FreeCashFlow", float(cfo["value"]) - float(capex["value"]), cfo["unit"], cfo["end"], cfo["form"], cfo["accn"],
-                     "derived", "", "CFO;CapEx", 0.88, ""))
-
-    if oi.get("source_type") != "none" and dpa.get("source_type") != "none":
-        ebitda_val = float(oi["value"]) + float(dpa["value"])
-        rows.append(("EBITDA", ebitda_val, oi["unit"], oi["end"], oi["form"], oi["accn"],
-                     "derived", "", "OperatingIncome;DepAmort", 0.88, ""))
-        if rev.get("source_type") != "none" and safe_float(rev["value"]):
-            rows.append(("EBITDAMargin", ebitda_val/float(rev["value"]), "ratio", rev["end"], rev["form"], rev["accn"],
-                         "derived", "", "EBITDA;Revenue", 0.86, ""))
-
-    if (oi.get("source_type") != "none" or (ni.get("source_type") != "none" and dpa.get("source_type") != "none")) \
-        and iexp.get("source_type") != "none" and safe_float(iexp["value"]):
-        ebit_approx = float(oi["value"]) if oi.get("source_type") != "none" else (float(ni["value"]) + float(dpa["value"]))
-        rows.append(("InterestCoverage", ebit_approx/float(iexp["value"]), "x", iexp["end"], iexp["form"], iexp["accn"],
-                     "derived", "", "OperatingIncome_or_NIplusDA;InterestExpense", 0.86, ""))
-
-    td = derive_total_debt(facts, fy, submissions, dbg, prefer_unit, 120)
-    if (td.get("source_type") != "none") and eq.get("source_type") != "none" and safe_float(eq["value"]):
-        rows.append(("DebtToEquity", float(td["value"])/float(eq["value"]), "ratio", eq["end"], eq["form"], eq["accn"],
-                     "derived", "", "TotalDebt;Equity", 0.86, ""))
-
-    # Liquidity
-    ca  = select_current_assets(facts, fy, submissions, dbg, prefer_unit, 120)
-    cl  = select_current_liabilities(facts, fy, submissions, dbg, prefer_unit, 120)
-    inv = select_inventories(facts, fy, submissions, dbg, prefer_unit, 120)
-    if ca.get("source_type") != "none" and cl.get("source_type") != "none" and safe_float(cl["value"]):
-        rows.append(("CurrentRatio", float(ca["value"])/float(cl["value"]), "ratio",
-                     ca.get("end") or cl.get("end") or "", ca.get("form") or cl.get("form") or "", ca.get("accn") or cl.get("accn") or "",
-                     "derived", "", "CurrentAssets;CurrentLiabilities", 0.86, ""))
-    if ca.get("source_type") != "none" and inv.get("source_type") != "none" and cl.get("source_type") != "none" and safe_float(cl["value"]):
-        try:
-            quick = (float(ca["value"]) - float(inv["value"])) / float(cl["value"])
-            rows.append(("QuickRatio", quick, "ratio",
-                         ca.get("end") or cl.get("end") or "", ca.get("form") or cl.get("form") or "", ca.get("accn") or cl.get("accn") or "",
-                         "derived", "", "CurrentAssets;Inventories;CurrentLiabilities", 0.86, ""))
-        except Exception:
-            pass
-
-    # Turnover
-    inv1 = select_inventories(facts, fy-1, submissions, dbg, prefer_unit, 120)
-    ar   = select_accounts_receivable(facts, fy, submissions, dbg, prefer_unit, 120)
-    ar1  = select_accounts_receivable(facts, fy-1, submissions, dbg, prefer_unit, 120)
-    cogs = select_cogs(facts, fy, submissions, dbg, prefer_unit, 90)
-    def _avg(v0, v1):
-        try:
-            a = float(v0); b = float(v1); d = (a + b)/2.0
-            return d if d != 0 else None
-        except Exception:
-            return None
-    if cogs.get("source_type") != "none" and inv.get("source_type") != "none":
-        avg_inv = _avg(inv["value"], inv1.get("value", inv["value"]))
-        if avg_inv:
-            rows.append(("InventoryTurnover", float(cogs["value"])/avg_inv, "turns", cogs.get("end",""),
-                         cogs.get("form",""), cogs.get("accn",""),
-                         "derived", "", "CostOfGoodsSold;Inventories;Inventories_Prior", 0.84, ""))
-    if rev.get("source_type") != "none" and ar.get("source_type") != "none":
-        avg_ar = _avg(ar["value"], ar1.get("value", ar["value"]))
-        if avg_ar:
-            rows.append(("ReceivablesTurnover", float(rev["value"])/avg_ar, "turns", rev.get("end",""),
-                         rev.get("form",""), rev.get("accn",""),
-                         "derived", "", "Revenue;AccountsReceivable;AccountsReceivable_Prior", 0.84, ""))
-
-    # Cash flow coverage
-    if cfo.get("source_type") != "none" and cl.get("source_type") != "none" and safe_float(cl["value"]):
-        rows.append(("OperatingCashFlowRatio", float(cfo["value"])/float(cl["value"]), "ratio", cfo.get("end",""),
-                     cfo.get("form",""), cfo.get("accn",""),
-                     "derived", "", "CFO;CurrentLiabilities", 0.84, ""))
-
-    # Asset turnover, Equity ratio
-    assets1 = assets1
-    if assets.get("source_type") != "none" and assets1.get("source_type") != "none":
-        avg_assets = avg_two(assets["value"], assets1.get("value", assets["value"]))
-        if avg_assets:
-            rows.append(("AssetTurnover", float(rev["value"])/avg_assets if (rev.get("source_type")!="none" and safe_float(rev["value"])) else None,
-                        "ratio", rev.get("end",""), rev.get("form",""), rev.get("accn",""),
-                        "derived", "", "Revenue;Assets;Assets_Prior", 0.84, ""))
-    if select_equity and assets.get("source_type") != "none" and safe_float(assets["value"]):
-        rows.append(("EquityRatio", float(eq["value"]) / float(assets["value"]) if (eq.get("source_type")!="none" and safe_float(eq["value"])) else None,
-                    "ratio", assets.get("end",""),
-                    assets.get("form",""), assets.get("accn",""), "derived", "", "Equity;Assets", 0.84, ""))
-
-    # ROIC (NOPAT/InvestedCapital)
-    pre_tax = select_pretax_income(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    tax_exp = select_income_tax_expense(facts, fy, submissions, dbg, prefer_unit, tol_days)
-    lt_debt = select_longterm_debt(facts, fy, submissions, dbg, prefer_unit, 120)
-    st_debt = select_shortterm_debt(facts, fy, submissions, dbg, prefer_unit, 120)
-    cash    = select_base_instant(facts, fy, submissions, dbg, "CashAndCashEquivalents", prefer_unit, 120)
-
-    tot_debt_val = 0.0
-    for d in (lt_debt, st_debt):
-        if d.get("source_type") != "none" and safe_float(d.get("value")) is not None:
-            tot_debt_val += float(d["value"])
-
-    if pre_tax.get("source_type") != "none" and tax_exp.get("source_type") != "none" and oi.get("source_type") != "none":
-        try:
-            tr = float(tax_exp["value"]) / float(pre_tax["value"]) if safe_float(pre_tax["value"]) not in (None, 0.0) else None
-            if tr is not None and 0.0 <= tr <= 1.0 and safe_float(oi.get("value")) is not None:
-                nopat = float(oi["value"]) * (1.0 - tr)
-                invcap = tot_debt_val + (float(eq["value"]) if eq.get("source_type") != "none" and safe_float(eq.get("value")) is not None else 0.0) \
-                         - (float(cash["value"]) if cash and cash.get("source_type") != "none" and safe_float(cash.get("value")) is not None else 0.0)
-                if invcap and invcap != 0.0:
-                    rows.append(("ROIC", nopat / invcap, "ratio", oi.get("end",""),
-                                oi.get("form",""), oi.get("accn",""), "derived", "", "OperatingIncome;IncomeTaxExpense;PreTaxIncome;Debt;Equity;Cash", 0.84, ""))
-                rows.append(("NOPAT", nopat, "USD", oi.get("end",""),
-                             oi.get("form",""), oi.get("accn",""), "derived", "", "OperatingIncome;IncomeTaxExpense;PreTaxIncome", 0.82, ""))
-                rows.append(("InvestedCapital", invcap, "USD", oi.get("end",""),
-                             oi.get("form",""), oi.get("accn",""), "derived", "", "LongTermDebt;ShortTermDebt;Equity;Cash", 0.82, ""))
-        except Exception:
-            pass
+# 파생 메트릭은 기본 메트릭 입력 위의 공식 그래프로 선언하고, 평가기가 필요한 입력만 (이름, fy)당 한 번 선택한 뒤
+# 공식을 위상 순서로 계산한다. 새 비율을 추가해도 이미 있는 입력만 쓰면 선택기 호출은 늘지 않음.
+@dataclass(frozen=True)
+class DerivedInput:
+    """파생 공식의 입력 하나: 선택기(facts, fy, subs, dbg, prefer_unit, tol_days), 연도 오프셋, 고정 tol (None이면 호출자 tol_days)"""
+    selector: object
+    fy_offset: int = 0
+    tol_days: Optional[int] = None
 
-    # 결과 필터: 값 None인 파생은 버림
-    out_rows=[]
-    for (metric, val, unit, end, form, accn, src, tag, computed_from, conf, reason) in rows:
-        if safe_float(val) is None:
-            continue
-        out_rows.append((metric, float(val), unit, end or "", form or "", accn or "", src, tag, computed_from, conf, reason))
-    return out_rows
+@dataclass(frozen=True)
+class DerivedFormula:
+    """
+    파생 메트릭 하나. fn은 deps(입력 또는 다른 파생 메트릭)의 값을 받아 값 또는 None(행 없음)을 반환.
+    end/form/accn은 meta 입력들에서 필드별로 처음 비어 있지 않은 값, unit은 고정값이거나 unit_from 입력의 unit
+    """
+    metric: str
+    deps: Tuple[str, ...]
+    fn: object
+    unit: str
+    meta: Tuple[str, ...]
+    computed_from: str
+    confidence: float
+    unit_from: Optional[str] = None
+
+def _ratio(num: Optional[float], den: Optional[float]) -> Optional[float]:
+    # 분자가 없거나 분모가 없거나 0이면 None
+    return None if num is None or not den else num / den
+
+def _average(cur: Optional[float], prior: Optional[float]) -> Optional[float]:
+    # 평균이 0이면 None (분모로 쓰임)
+    if cur is None or prior is None:
+        return None
+    avg = (cur + prior) / 2.0
+    return avg if avg != 0 else None
+
+def _difference(a, b):
+    return None if a is None or b is None else a - b
+
+def _sum(a, b):
+    return None if a is None or b is None else a + b
+
+def _return_on_average(flow, cur, prior):
+    return _ratio(flow, _average(cur, prior))
+
+def _interest_coverage(oi, ni, dpa, iexp):
+    # EBIT는 영업이익, 없으면 순이익 + 감가상각으로 근사
+    ebit = oi if oi is not None else (ni + dpa if ni is not None and dpa is not None else None)
+    return _ratio(ebit, iexp)
+
+def _quick_ratio(ca, inv, cl):
+    return _ratio(ca - inv, cl) if ca is not None and inv is not None else None
+
+def _turnover(flow, cur, prior):
+    # 전년도 잔액이 없으면 당기 잔액만으로 평균
+    return _ratio(flow, _average(cur, cur if prior is None else prior)) if cur is not None else None
+
+def _nonzero_ratio(num: Optional[float], den: Optional[float]) -> Optional[float]:
+    # 분자가 0인 경우도 행을 만들지 않음 (AssetTurnover/EquityRatio 기존 동작)
+    return _ratio(num, den) if num else None
+
+def _asset_turnover(rev, assets, assets1):
+    return _nonzero_ratio(rev, _average(assets, assets1))
+
+def _nopat(oi, tax, pre_tax):
+    tr = _ratio(tax, pre_tax)
+    if tr is None or not (0.0 <= tr <= 1.0) or oi is None:
+        return None
+    return oi * (1.0 - tr)
+
+def _invested_capital(nopat, lt_debt, st_debt, eq, cash):
+    # NOPAT을 계산할 수 있는 기업에만 출력 (없는 구성요소는 0)
+    if nopat is None:
+        return None
+    return (lt_debt or 0.0) + (st_debt or 0.0) + (eq or 0.0) - (cash or 0.0)
+
+DERIVED_INPUTS: Dict[str, DerivedInput] = {
+    "Revenue": DerivedInput(select_revenue),
+    "NetIncome": DerivedInput(select_net_income),
+    "OperatingIncome": DerivedInput(select_operating_income),
+    "GrossProfit": DerivedInput(select_gross_profit),
+    "CFO": DerivedInput(select_cfo),
+    "CapEx": DerivedInput(select_capex),
+    "DepAmort": DerivedInput(select_dep_amort),
+    "InterestExpense": DerivedInput(select_interest_expense),
+    "PreTaxIncome": DerivedInput(select_pretax_income),
+    "IncomeTaxExpense": DerivedInput(select_income_tax_expense),
+    "CostOfGoodsSold": DerivedInput(select_cogs, tol_days=90),
+    "Equity": DerivedInput(select_equity, tol_days=120),
+    "Equity_Prior": DerivedInput(select_equity, fy_offset=-1, tol_days=120),
+    "Assets": DerivedInput(select_assets, tol_days=120),
+    "Assets_Prior": DerivedInput(select_assets, fy_offset=-1, tol_days=180),
+    "TotalDebt": DerivedInput(derive_total_debt, tol_days=120),
+    "LongTermDebt": DerivedInput(select_longterm_debt, tol_days=120),
+    "ShortTermDebt": DerivedInput(select_shortterm_debt, tol_days=120),
+    "Cash": DerivedInput(select_cash, tol_days=120),
+    "CurrentAssets": DerivedInput(select_current_assets, tol_days=120),
+    "CurrentLiabilities": DerivedInput(select_current_liabilities, tol_days=120),
+    "Inventories": DerivedInput(select_inventories, tol_days=120),
+    "Inventories_Prior": DerivedInput(select_inventories, fy_offset=-1, tol_days=120),
+    "AccountsReceivable": DerivedInput(select_accounts_receivable, tol_days=120),
+    "AccountsReceivable_Prior": DerivedInput(select_accounts_receivable, fy_offset=-1, tol_days=120),
+}
+
+# 선언 순서 = tags.csv 출력 순서 (계산 순서는 의존성으로 정해짐)
+DERIVED_FORMULAS: Tuple[DerivedFormula, ...] = (
+    DerivedFormula("GrossMargin", ("GrossProfit", "Revenue"), _ratio, "ratio", ("Revenue",), "GrossProfit;Revenue", 0.90),
+    DerivedFormula("OperatingMargin", ("OperatingIncome", "Revenue"), _ratio, "ratio", ("Revenue",), "OperatingIncome;Revenue", 0.90),
+    DerivedFormula("NetProfitMargin", ("NetIncome", "Revenue"), _ratio, "ratio", ("Revenue",), "NetIncome;Revenue", 0.90),
+    DerivedFormula("ROE", ("NetIncome", "Equity", "Equity_Prior"), _return_on_average,
+                   "ratio", ("Equity",), "NetIncome;Equity;Equity_Prior", 0.90),
+    DerivedFormula("FreeCashFlow", ("CFO", "CapEx"), _difference,
+                   "", ("CFO",), "CFO;CapEx", 0.88, unit_from="CFO"),
+    DerivedFormula("EBITDA", ("OperatingIncome", "DepAmort"), _sum,
+                   "", ("OperatingIncome",), "OperatingIncome;DepAmort", 0.88, unit_from="OperatingIncome"),
+    DerivedFormula("EBITDAMargin", ("EBITDA", "Revenue"), _ratio, "ratio", ("Revenue",), "EBITDA;Revenue", 0.86),
+    DerivedFormula("InterestCoverage", ("OperatingIncome", "NetIncome", "DepAmort", "InterestExpense"), _interest_coverage,
+                   "x", ("InterestExpense",), "OperatingIncome_or_NIplusDA;InterestExpense", 0.86),
+    DerivedFormula("DebtToEquity", ("TotalDebt", "Equity"), _ratio, "ratio", ("Equity",), "TotalDebt;Equity", 0.86),
+    DerivedFormula("CurrentRatio", ("CurrentAssets", "CurrentLiabilities"), _ratio, "ratio",
+                   ("CurrentAssets", "CurrentLiabilities"), "CurrentAssets;CurrentLiabilities", 0.86),
+    DerivedFormula("QuickRatio", ("CurrentAssets", "Inventories", "CurrentLiabilities"), _quick_ratio, "ratio",
+                   ("CurrentAssets", "CurrentLiabilities"), "CurrentAssets;Inventories;CurrentLiabilities", 0.86),
+    DerivedFormula("InventoryTurnover", ("CostOfGoodsSold", "Inventories", "Inventories_Prior"), _turnover, "turns",
+                   ("CostOfGoodsSold",), "CostOfGoodsSold;Inventories;Inventories_Prior", 0.84),
+    DerivedFormula("ReceivablesTurnover", ("Revenue", "AccountsReceivable", "AccountsReceivable_Prior"), _turnover, "turns",
+                   ("Revenue",), "Revenue;AccountsReceivable;AccountsReceivable_Prior", 0.84),
+    DerivedFormula("OperatingCashFlowRatio", ("CFO", "CurrentLiabilities"), _ratio, "ratio", ("CFO",),
+                   "CFO;CurrentLiabilities", 0.84),
+    DerivedFormula("AssetTurnover", ("Revenue", "Assets", "Assets_Prior"), _asset_turnover, "ratio", ("Revenue",),
+                   "Revenue;Assets;Assets_Prior", 0.84),
+    DerivedFormula("EquityRatio", ("Equity", "Assets"), _nonzero_ratio, "ratio",
+                   ("Assets",), "Equity;Assets", 0.84),
+    DerivedFormula("ROIC", ("NOPAT", "InvestedCapital"), _ratio, "ratio", ("OperatingIncome",),
+                   "OperatingIncome;IncomeTaxExpense;PreTaxIncome;Debt;Equity;Cash", 0.84),
+    DerivedFormula("NOPAT", ("OperatingIncome", "IncomeTaxExpense", "PreTaxIncome"), _nopat, "USD", ("OperatingIncome",),
+                   "OperatingIncome;IncomeTaxExpense;PreTaxIncome", 0.82),
+    DerivedFormula("InvestedCapital", ("NOPAT", "LongTermDebt", "ShortTermDebt", "Equity", "Cash"), _invested_capital, "USD",
+                   ("OperatingIncome",), "LongTermDebt;ShortTermDebt;Equity;Cash", 0.82),
+)
+
+# tags.csv period_type이 instant인 파생 메트릭 (나머지는 duration)
+INSTANT_DERIVED_METRICS = frozenset({"AssetTurnover", "EquityRatio"})
+
+# --- 배치(열) 평가: 같은 공식을 NumPy 배열 식으로. 결측은 NaN (스칼라 공식의 None) ---
+def _nan_where(mask, values):
+    return np.where(mask, np.nan, values)
+
+def _ratio_np(num, den):
+    bad = np.isnan(num) | np.isnan(den) | (den == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _nan_where(bad, num / np.where(bad, 1.0, den))
+
+def _average_np(cur, prior):
+    avg = (cur + prior) / 2.0
+    return _nan_where(avg == 0, avg)
+
+def _nonzero_ratio_np(num, den):
+    return _nan_where(num == 0, _ratio_np(num, den))
+
+def _interest_coverage_np(oi, ni, dpa, iexp):
+    return _ratio_np(np.where(np.isnan(oi), ni + dpa, oi), iexp)
+
+def _turnover_np(flow, cur, prior):
+    return _ratio_np(flow, _average_np(cur, np.where(np.isnan(prior), cur, prior)))
+
+def _nopat_np(oi, tax, pre_tax):
+    tr = _ratio_np(tax, pre_tax)
+    with np.errstate(invalid="ignore"):
+        ok = (tr >= 0.0) & (tr <= 1.0) & ~np.isnan(oi)
+    return _nan_where(~ok, oi * (1.0 - tr))
+
+def _invested_capital_np(nopat, lt_debt, st_debt, eq, cash):
+    total = np.nan_to_num(lt_debt, nan=0.0) + np.nan_to_num(st_debt, nan=0.0) + np.nan_to_num(eq, nan=0.0) \
+            - np.nan_to_num(cash, nan=0.0)
+    return _nan_where(np.isnan(nopat), total)
+
+# 스칼라 공식 → 배열 공식. 여기 없는 공식은 배치 모드에서도 원소별로 스칼라 공식을 적용
+_DERIVED_VECTOR_FNS = {
+    _ratio: _ratio_np,
+    _difference: lambda a, b: a - b,
+    _sum: lambda a, b: a + b,
+    _return_on_average: lambda flow, cur, prior: _ratio_np(flow, _average_np(cur, prior)),
+    _interest_coverage: _interest_coverage_np,
+    _quick_ratio: lambda ca, inv, cl: _ratio_np(ca - inv, cl),
+    _turnover: _turnover_np,
+    _asset_turnover: lambda rev, assets, assets1: _nonzero_ratio_np(rev, _average_np(assets, assets1)),
+    _nonzero_ratio: _nonzero_ratio_np,
+    _nopat: _nopat_np,
+    _invested_capital: _invested_capital_np,
+}
+
+def derived_eval_order(formulas=DERIVED_FORMULAS, inputs=DERIVED_INPUTS) -> List[DerivedFormula]:
+    """
+    공식을 의존성 위상 순서로 정렬 (준비된 공식끼리는 선언 순서 유지).
+    모르는 이름이나 순환이 있으면 ValueError
+    """
+    by_name = {f.metric: f for f in formulas}
+    for f in formulas:
+        for d in f.deps + f.meta + ((f.unit_from,) if f.unit_from else ()):
+            if d not in inputs and d not in by_name:
+                raise ValueError(f"derived metric {f.metric} depends on unknown {d}")
+    done: Set[str] = set()
+    order: List[DerivedFormula] = []
+    pending = list(formulas)
+    while pending:
+        ready = [f for f in pending if all(d in inputs or d in done for d in f.deps)]
+        if not ready:
+            raise ValueError(f"derived metric cycle among {', '.join(f.metric for f in pending)}")
+        for f in ready:
+            order.append(f)
+            done.add(f.metric)
+        pending = [f for f in pending if f.metric not in done]
+    return order
+
+_DERIVED_ORDER = derived_eval_order()
+
+def derived_plan(metrics=None) -> Tuple[List[DerivedFormula], List[str]]:
+    """
+    요청한 파생 메트릭(None이면 전부)을 계산하는 데 필요한 (공식들 (계산 순서), 입력 이름들)
+    """
+    by_name = {f.metric: f for f in DERIVED_FORMULAS}
+    need: Set[str] = set(by_name) if metrics is None else {m for m in metrics if m in by_name}
+    stack = list(need)
+    while stack:
+        for d in by_name[stack.pop()].deps:
+            if d in by_name and d not in need:
+                need.add(d)
+                stack.append(d)
+    formulas = [f for f in _DERIVED_ORDER if f.metric in need]
+    names = {d for f in formulas for d in f.deps + f.meta + ((f.unit_from,) if f.unit_from else ()) if d in DERIVED_INPUTS}
+    return formulas, [n for n in DERIVED_INPUTS if n in names]
+
+def select_derived_inputs(facts, fy, submissions, dbg, names, prefer_unit="USD", tol_days=90) -> Dict[str, dict]:
+    # 입력마다 선택기 한 번 (같은 메트릭/연도/tol은 인덱스의 선택 캐시가 다시 공유)
+    out = {}
+    for name in names:
+        spec = DERIVED_INPUTS[name]
+        out[name] = spec.selector(facts, fy + spec.fy_offset, submissions, dbg, prefer_unit,
+                                  tol_days if spec.tol_days is None else spec.tol_days)
+    return out
+
+def selection_value(sel: dict) -> Optional[float]:
+    return None if sel.get("source_type") == "none" else safe_float(sel.get("value"))
+
+def evaluate_derived(columns: Dict[str, list], formulas) -> Dict[str, list]:
+    """
+    입력 열(이름 → 기업별 값 리스트, 없으면 None)에서 파생 열을 계산.
+    공식 하나씩 모든 기업 열을 한 번에 채우므로 여러 기업을 모아 한꺼번에 평가할 수 있음
+    """
+    cols = dict(columns)
+    for f in formulas:
+        cols[f.metric] = [f.fn(*vals) for vals in zip(*(cols[d] for d in f.deps))]
+    return cols
+
+def evaluate_derived_batch(columns: Dict[str, "np.ndarray"], formulas) -> Dict[str, "np.ndarray"]:
+    """
+    evaluate_derived의 NumPy 버전: 입력은 기업(×연도)별 float 배열(결측 NaN), 결과도 NaN 마스크 배열.
+    0 분모·결측 입력은 배열 마스크로 처리하고, 배열 공식이 없는 공식만 원소별로 계산
+    """
+    _require_numpy()
+    cols = dict(columns)
+    for f in formulas:
+        args = [cols[d] for d in f.deps]
+        vec = _DERIVED_VECTOR_FNS.get(f.fn)
+        if vec is not None:
+            cols[f.metric] = vec(*args)
+        else:
+            vals = [f.fn(*(None if math.isnan(v) else float(v) for v in row)) for row in zip(*args)]
+            cols[f.metric] = np.array([np.nan if v is None else v for v in vals], dtype=float)
+    return cols
+
+def derived_row(f: DerivedFormula, value: float, sels: Dict[str, dict]) -> tuple:
+    # add_other_derived_rows 입력 튜플. sels는 선택 결과 또는 PendingDerived.inputs (unit/end/form/accn 키만 읽음)
+    meta = [sels[m] for m in f.meta]
+    end, form, accn = (next((m.get(k) for m in meta if m.get(k)), "") for k in ("end", "form", "accn"))
+    unit = sels[f.unit_from]["unit"] if f.unit_from else f.unit
+    return (f.metric, float(value), unit, end or "", form or "", accn or "", "derived", "", f.computed_from, f.confidence, "")
+
+def compute_other_derived(facts, fy, submissions, dbg, prefer_unit="USD", tol_days=90, metrics=None):
+    """
+    성장률 외 파생 메트릭 (metrics가 주어지면 그것만). 행은 DERIVED_FORMULAS 선언 순서이고 값이 없는 메트릭은 빠짐
+    """
+    formulas, names = derived_plan(metrics)
+    sels = select_derived_inputs(facts, fy, submissions, dbg, names, prefer_unit, tol_days)
+    cols = evaluate_derived({name: [selection_value(sel)] for name, sel in sels.items()}, formulas)
+    wanted = {f.metric for f in formulas} if metrics is None else set(metrics)
+    rows = []
+    for f in DERIVED_FORMULAS:
+        if f.metric in wanted and f.metric in cols and safe_float(cols[f.metric][0]) is not None:
+            rows.append(derived_row(f, cols[f.metric][0], sels))
+    return rows
+
+@dataclass
+class PendingDerived:
+    """
+    --derived-batch: 기업·연도 하나의 파생 입력. 행은 나중에 전체 기업을 한 번에 평가해 rows[pos]에 끼워 넣음
+    (inputs: 입력 이름 → {"value": 값 또는 None, "unit", "end", "form", "accn"}, derived_row가 선택 결과 대신 그대로 읽음)
+    """
+    meta: dict
+    fy: int
+    rows: List["TagRow"]
+    pos: int
+    inputs: Dict[str, dict]
+
+def pending_derived(meta: dict, fy: int, rows: list, sels: Dict[str, dict]) -> PendingDerived:
+    inputs = {n: {"value": selection_value(sel), "unit": sel.get("unit"), "end": sel.get("end"),
+                  "form": sel.get("form"), "accn": sel.get("accn")} for n, sel in sels.items()}
+    return PendingDerived(meta, fy, rows, len(rows), inputs)
+
+def evaluate_pending_derived(pending: List[PendingDerived], metrics=None):
+    """
+    모아 둔 기업·연도들의 파생 메트릭을 열 단위로 한 번에 평가하고, 각 기업의 행 목록에 원래 위치대로 끼워 넣음.
+    numpy가 있으면 배열 식, 없으면 같은 공식을 리스트 열로 계산 (결과 행은 기업별 계산과 동일)
+    """
+    if not pending:
+        return
+    formulas, names = derived_plan(metrics)
+    wanted = {f.metric for f in formulas} if metrics is None else set(metrics)
+    emit = [f for f in DERIVED_FORMULAS if f.metric in wanted]
+    inputs = {n: [p.inputs[n]["value"] for p in pending] for n in names}
+    if np is not None:
+        cols = evaluate_derived_batch({n: np.array([np.nan if v is None else v for v in vals], dtype=float)
+                                       for n, vals in inputs.items()}, formulas)
+        values = {f.metric: [None if math.isnan(v) else v for v in cols[f.metric].tolist()] for f in emit}
+    else:
+        cols = evaluate_derived(inputs, formulas)
+        values = {f.metric: [None if safe_float(v) is None else v for v in cols[f.metric]] for f in emit}
+    # 같은 행 목록 안에서는 뒤쪽 위치부터 끼워 넣어야 앞쪽 pos가 밀리지 않음
+    for i in sorted(range(len(pending)), key=lambda i: -pending[i].pos):
+        p = pending[i]
+        others = [derived_row(f, values[f.metric][i], p.inputs) for f in emit if values[f.metric][i] is not None]
+        new_rows: List[TagRow] = []
+        add_other_derived_rows(new_rows, p.meta, p.fy, others)
+        p.rows[p.pos:p.pos] = new_rows
 
 # ----------------------- S&P500 유틸리티 --------------------------
 def fetch_sp500_constituents(ua: Optional[str], dbg: Optional[Debugger] = None) -> List[dict]:
@@ -2689,14 +4238,30 @@ def fetch_sp500_constituents(ua: Optional[str], dbg: Optional[Debugger] = None)
 def normalize_ticker_key(t: str) -> str:
     return re.sub(r"[.\\-\\s]", "", t.upper().strip())
 
-def fetch_sec_ticker_cik_map(ua: Optional[str], dbg: Optional[Debugger] = None) -> Dict[str, dict]:
+def ticker_map_from_json(j: dict) -> Dict[str, dict]:
+    # company_tickers.json → {정규화 티커: {ticker, cik, title}}
+    out = {}
+    for _, rec in j.items():
+        t = (rec.get("ticker") or "").upper()
+        cik = str(rec.get("cik_str") or "").zfill(10)
+        out[normalize_ticker_key(t)] = {"ticker": t, "cik": cik, "title": rec.get("title") or ""}
+    return out
+
+def fetch_sec_ticker_cik_map(ua: Optional[str], dbg: Optional[Debugger] = None, cache_dir: Optional[str] = None) -> Dict[str, dict]:
+    # cache_dir를 주면 company_tickers.json을 캐시하고, TTL이 지나면 조건부 요청으로 재검증 (변경 없으면 304)
     out = {}
     try:
-        j = http_get("https://www.sec.gov/files/company_tickers.json", ua=ua, dbg=dbg).json()
-        for _, rec in j.items():
-            t = (rec.get("ticker") or "").upper()
-            cik = str(rec.get("cik_str") or "").zfill(10)
-            out[normalize_ticker_key(t)] = {"ticker": t, "cik": cik, "title": rec.get("title") or ""}
+        url = "https://www.sec.gov/files/company_tickers.json"
+        if cache_dir:
+            store = get_cache_store(cache_dir)
+            j = None
+            if not store.lookup("company_tickers"):
+                j = refresh_cached_json(store, "company_tickers", url, ua, dbg)
+            if j is None:
+                j = store.read("company_tickers")
+        else:
+            j = decode_json(http_get(url, ua=ua, dbg=dbg).content)
+        out = ticker_map_from_json(j)
     except Exception:
         pass
     if not out:
@@ -2709,357 +4274,921 @@ def fetch_sec_ticker_cik_map(ua: Optional[str], dbg: Optional[Debugger] = None)
         raise RuntimeError("SEC ticker→CIK mapping failed")
     return out
 
-# --------------------------- CLI (명령줄 인터페이스) -------------------------------
-def main():
-    ap = argparse.ArgumentParser(description="EDGAR XBRL selector (Full) with growth normalization & CSV schema restored")
-    ap.add_argument("--fy", type=int, default=2024, help="Fiscal year (default: 2024)")
-    ap.add_argument("--metrics", nargs="+", choices=BASE_METRICS+DERIVED_METRICS+["base","derived","all"], default=["all"])
-    ap.add_argument("--include-derived", action="store_true", help="Include derived metrics")
-    ap.add_argument("--skip-derived", action="store_true", help="Skip derived metrics entirely")
-    ap.add_argument("--use-api", action="store_true", help="Use SEC API (requires user-agent)")
-    ap.add_argument("--ciks", help="Comma separated CIKs (with --use-api)")
-    ap.add_argument("--tickers", nargs="+", help="Filter S&P500 by tickers (with --use-api, no --ciks)")
-    ap.add_argument("--limit", type=int, help="Limit number of companies (with --use-api)")
-    ap.add_argument("--facts", nargs="+", help="Local Company Facts JSON paths")
-    ap.add_argument("--facts-dir", help="Directory containing Company Facts JSON files")
-    ap.add_argument("--user-agent", help="SEC user-agent or env SEC_USER_AGENT")
-    ap.add_argument("--prefer-unit", default="USD")
-    ap.add_argument("--fy-tol-days", type=int, default=90)
-    ap.add_argument("--debug", action="store_true")
-    ap.add_argument("--debug-file", help="Path to debug log file")
-    ap.add_argument("--cache-dir", default=_COMPANYFACTS_CACHE_DIR, help="Company Facts cache dir")
-    ap.add_argument("--subs-cache-dir", default=_SUBMISSIONS_CACHE_DIR, help="Submissions cache dir")
-    ap.add_argument("--force", action="store_true", help="Force API fetch even if cache exists")
-    ap.add_argument("--suggestions", help="JSONL file to load curated suggestions")
-    ap.add_argument("--dump-suggestions", help="Path to dump mined/hinted/used qnames as JSONL")
-    ap.add_argument("--dump-suggestions-append", action="store_true")
-    ap.add_argument("--dump-ext-only", action="store_true")
-    ap.add_argument("--out-tags", help="Output tags CSV path (default: data/tags_{fy}.csv)")
-    ap.add_argument("--out-companies", help="Companies CSV path (default: data/companies_{fy}.csv)")
-    ap.add_argument("--out-benchmarks", help="Output benchmarks CSV path (default: data/benchmarks_{fy}.csv)")
-    ap.add_argument("--out-rankings", help="Output rankings CSV path (default: data/rankings_{fy}.csv)")
-    ap.add_argument("--out-wide", help="Output wide format CSV path (default: data/companies_wide_{fy}.csv)")
-    ap.add_argument("--emit-ttl", help="Write RDF Turtle aligned to EFIN ontology (instances only).")
-    ap.add_argument(
-        "--include-industry-scope",
-        action="store_true",
-        help="Include industry-scope Benchmark and TopRanking instances in TTL output.",
-    )
-    ap.add_argument(
-        "--include-sector-scope",
-        action="store_true",
-        help="Include sector-scope Benchmark and TopRanking instances in TTL output.",
-    )
-    args = ap.parse_args()
+# ----------------------- SEC bulk 아카이브 (companyfacts.zip / submissions.zip) --------------------------
+_BULK_MEMBER_RE = re.compile(r"CIK(\d{10})\.json")
 
-    dbg = Debugger(enabled=args.debug, path=args.debug_file)
-    ua = get_user_agent(args)
+@dataclass(frozen=True)
+class ArchiveMember:
+    """
+    bulk zip 안의 JSON 멤버 하나. 파일 경로 자리에 그대로 넘길 수 있고(피클 가능) 읽을 때 디스크에 풀지 않음.
+    crc/size는 zip 중앙 디렉터리 값이라 내용을 읽지 않고도 변경 감지에 쓸 수 있음
+    """
+    archive: str
+    name: str
+    crc: int = 0
+    size: int = 0
 
-    # 회사 목록
-    pairs = []
-
-    def load_pair_from_facts_json(j: dict, subs_cache_dir: str) -> Tuple[dict, dict, dict]:
-        cik=str(j.get("cik") or "").zfill(10)
-        # submissions (cache)
-        subs_path = subs_find_existing(args.subs_cache_dir, cik)
-        if not subs_path:
-            subs = fetch_sec_submissions(cik, ua, dbg) if args.use_api else {}
-            if args.use_api and subs:
-                subs_save(args.subs_cache_dir, cik, subs); subs_cleanup(args.subs_cache_dir, cik)
-        else:
-            subs = json.load(open(subs_path, "r", encoding="utf-8"))
-        symbol = j.get("entityTicker") or ""
-        if not symbol and subs:
-            tickers = subs.get("tickers", [])
-            symbol = tickers[0] if tickers else ""
-        meta={"cik":cik,"symbol":symbol,"name":j.get("entityName") or ""}
-        return (meta, j, subs)
-
-    if args.facts:
-        for f in args.facts:
-            j=json.load(open(f,"r",encoding="utf-8"))
-            pairs.append(load_pair_from_facts_json(j, args.subs_cache_dir))
-    elif args.facts_dir:
-        for fp in pathlib.Path(args.facts_dir).glob("*.json"):
-            j=json.load(open(fp,"r",encoding="utf-8"))
-            pairs.append(load_pair_from_facts_json(j, args.subs_cache_dir))
-    elif args.use_api:
-        if args.ciks:
-            cik_list = [c.strip() for c in args.ciks.split(",") if c.strip()]
-            total = len(cik_list)
-            max_workers = min(10, total)
-            print(f"[INFO] Processing {total} CIKs with {max_workers} workers...", file=sys.stderr)
-            def fetch_one(cik_padded, idx):
-                try:
-                    cf_cached = cf_find_existing(args.cache_dir, cik_padded)
-                    if not args.force and cf_cached:
-                        facts = json.load(open(cf_cached, "r", encoding="utf-8"))
-                    else:
-                        facts = fetch_company_facts(cik_padded, ua, dbg)
-                        cf_save(args.cache_dir, cik_padded, facts); cf_cleanup(args.cache_dir, cik_padded)
-                    # submissions
-                    subs_cached = subs_find_existing(args.subs_cache_dir, cik_padded)
-                    if not args.force and subs_cached:
-                        subs = json.load(open(subs_cached, "r", encoding="utf-8"))
-                    else:
-                        subs = fetch_sec_submissions(cik_padded, ua, dbg)
-                        subs_save(args.subs_cache_dir, cik_padded, subs); subs_cleanup(args.subs_cache_dir, cik_padded)
-                    symbol = facts.get("entityTicker") or (subs.get("tickers",[None])[0] if subs else "") or ""
-                    name = facts.get("entityName") or ""
-                    meta = {"cik":cik_padded, "symbol":symbol, "name":name}
-                    return (meta, facts, subs)
-                except Exception as e:
-                    print(f"[ERROR] CIK{cik_padded} fetch failed: {e}", file=sys.stderr)
-                    return None
-            pairs=[]
-            with ThreadPoolExecutor(max_workers=max_workers) as ex:
-                futs = [ex.submit(fetch_one, str(c).zfill(10), i+1) for i,c in enumerate(cik_list)]
-                for fut in as_completed(futs):
-                    r=fut.result()
-                    if r: pairs.append(r)
-        else:
-            comps = fetch_sp500_constituents(ua, dbg)
-            if args.tickers:
-                want=set([t.upper() for t in args.tickers])
-                comps=[c for c in comps if c["symbol"].upper() in want]
-            if args.limit:
-                comps = comps[:int(args.limit)]
-            sec_map = fetch_sec_ticker_cik_map(ua, dbg)
-            todo=[]
-            for co in comps:
-                rec = sec_map.get(normalize_ticker_key(co["symbol"]))
-                if rec:
-                    todo.append({"symbol": co["symbol"], "cik": rec["cik"], "name": co["name"] or rec.get("title","")})
-            total=len(todo)
-            max_workers=min(10,total)
-            print(f"[INFO] Fetching {total} companies...", file=sys.stderr)
-            def fetch_one(co, idx):
-                cik=co["cik"]; symbol=co["symbol"]; name=co["name"]
-                try:
-                    cf_cached = cf_find_existing(args.cache_dir, cik)
-                    if not args.force and cf_cached:
-                        facts = json.load(open(cf_cached, "r", encoding="utf-8"))
-                    else:
-                        facts = fetch_company_facts(cik, ua, dbg)
-                        cf_save(args.cache_dir, cik, facts); cf_cleanup(args.cache_dir, cik)
-                    subs_cached = subs_find_existing(args.subs_cache_dir, cik)
-                    if not args.force and subs_cached:
-                        subs = json.load(open(subs_cached, "r", encoding="utf-8"))
-                    else:
-                        subs = fetch_sec_submissions(cik, ua, dbg)
-                        subs_save(args.subs_cache_dir, cik, subs); subs_cleanup(args.subs_cache_dir, cik)
-                    meta = {"cik":cik,"symbol":symbol,"name":name}
-                    return (meta, facts, subs)
-                except Exception as e:
-                    print(f"[ERROR] {symbol} ({cik}) failed: {e}", file=sys.stderr)
-                    return None
-            pairs=[]
-            with ThreadPoolExecutor(max_workers=max_workers) as ex:
-                futs=[ex.submit(fetch_one, co, i+1) for i,co in enumerate(todo)]
-                for fut in as_completed(futs):
-                    r=fut.result()
-                    if r: pairs.append(r)
-    else:
-        raise SystemExit("Provide --facts/--facts-dir or --use-api")
+    def __str__(self) -> str:
+        return f"{self.archive}!{self.name}"
 
-    # 파일 경로 준비 (fy 포함)
-    fy = args.fy
-    if args.out_tags:
-        out_tags = pathlib.Path(args.out_tags)
-    else:
-        out_tags = pathlib.Path(f"data/tags_{fy}.csv")
-    out_tags.parent.mkdir(parents=True, exist_ok=True)
-    
-    if args.out_companies:
-        out_comp = pathlib.Path(args.out_companies)
-    else:
-        out_comp = pathlib.Path(f"data/companies_{fy}.csv")
-    out_comp.parent.mkdir(parents=True, exist_ok=True)
-    
-    if args.out_benchmarks:
-        out_benchmarks = pathlib.Path(args.out_benchmarks)
-    else:
-        out_benchmarks = pathlib.Path(f"data/benchmarks_{fy}.csv")
-    out_benchmarks.parent.mkdir(parents=True, exist_ok=True)
-    
-    if args.out_rankings:
-        out_rankings = pathlib.Path(args.out_rankings)
+    def signature(self) -> str:
+        return f"zip-{self.crc:08x}-{self.size}"
+
+_open_archives: Dict[Tuple[int, str], zipfile.ZipFile] = {}
+_open_archives_lock = threading.Lock()
+
+def open_archive(path) -> zipfile.ZipFile:
+    # 중앙 디렉터리는 프로세스마다 한 번만 파싱 (fork된 워커가 부모의 파일 오프셋을 공유하지 않도록 pid별로 엶)
+    key = (os.getpid(), os.path.abspath(str(path)))
+    with _open_archives_lock:
+        zf = _open_archives.get(key)
+        if zf is None:
+            zf = _open_archives[key] = zipfile.ZipFile(key[1])
+        return zf
+
+def read_archive_member(member: ArchiveMember) -> bytes:
+    return open_archive(member.archive).read(member.name)
+
+class BulkArchive:
+    """
+    SEC 야간 bulk 파일을 회사 소스로 사용 (HTTP 요청 없음).
+    PATH는 companyfacts.zip 또는 그 zip과 submissions.zip이 있는 디렉터리.
+    시작할 때 멤버 목록(CIK##########.json)만 읽고, 내용은 회사별로 필요할 때 zip에서 스트리밍
+    """
+    FACTS = "companyfacts.zip"
+    SUBMISSIONS = "submissions.zip"
+
+    def __init__(self, path):
+        p = pathlib.Path(path)
+        facts_zip = p / self.FACTS if p.is_dir() else p
+        if not facts_zip.is_file():
+            raise FileNotFoundError(f"companyfacts archive not found: {facts_zip}")
+        subs_zip = facts_zip.with_name(self.SUBMISSIONS)
+        self.facts = self._members(facts_zip)
+        # submissions.zip이 없으면 --subs-cache-dir 캐시로 대체
+        self.subs = self._members(subs_zip) if subs_zip.is_file() else {}
+
+    @staticmethod
+    def _members(path) -> Dict[str, ArchiveMember]:
+        # submissions.zip의 추가 페이지(CIK..-submissions-001.json)는 이름이 맞지 않아 제외됨
+        out = {}
+        for info in open_archive(path).infolist():
+            m = _BULK_MEMBER_RE.fullmatch(info.filename.rsplit("/", 1)[-1])
+            if m:
+                out[m.group(1)] = ArchiveMember(str(path), info.filename, info.CRC, info.file_size)
+        return out
+
+    def ciks(self) -> List[str]:
+        return sorted(self.facts)
+
+    def find_tickers(self, wanted: Set[str]) -> Dict[str, str]:
+        """
+        정규화 티커 → CIK. submissions 멤버의 tickers를 CIK 순으로 훑고, 원하는 티커를 모두 찾으면 멈춤
+        """
+        out: Dict[str, str] = {}
+        for cik in self.ciks():
+            if len(out) == len(wanted):
+                break
+            member = self.subs.get(cik)
+            if member is None:
+                continue
+            try:
+                tickers = decode_json(read_archive_member(member)).get("tickers") or []
+            except Exception:
+                continue
+            for t in tickers:
+                key = normalize_ticker_key(t or "")
+                if key in wanted and key not in out:
+                    out[key] = cik
+        return out
+
+def bulk_company_todo(bulk: BulkArchive, args) -> List[dict]:
+    """
+    --ciks/--tickers/--limit으로 bulk 아카이브의 대상 기업을 고름 (아무 필터도 없으면 전체).
+    티커는 캐시된 company_tickers.json(기한 무관)으로 먼저 찾고, 없는 것만 submissions.zip에서 찾음
+    """
+    ciks = bulk.ciks()
+    if args.ciks:
+        want = {c.strip().zfill(10) for c in args.ciks.split(",") if c.strip()}
+        todo = [{"cik": c, "symbol": "", "name": ""} for c in ciks if c in want]
+    elif args.tickers:
+        want = {normalize_ticker_key(t): t.upper() for t in args.tickers}
+        found: Dict[str, str] = {}
+        cached = get_cache_store(_TICKERS_CACHE_DIR).read("company_tickers")
+        if cached:
+            found = {k: rec["cik"] for k, rec in ticker_map_from_json(cached).items() if k in want and rec["cik"] in bulk.facts}
+        rest = set(want) - set(found)
+        if rest:
+            found.update(bulk.find_tickers(rest))
+        for key in sorted(set(want) - set(found)):
+            print(f"[WARN] ticker {want[key]} not found in bulk archive", file=sys.stderr)
+        todo = [{"cik": found[k], "symbol": want[k], "name": ""} for k in want if k in found]
     else:
-        out_rankings = pathlib.Path(f"data/rankings_{fy}.csv")
-    out_rankings.parent.mkdir(parents=True, exist_ok=True)
+        todo = [{"cik": c, "symbol": "", "name": ""} for c in ciks]
+    if args.limit:
+        todo = todo[:int(args.limit)]
+    return todo
 
-    # 결과 누적
-    tag_rows: List[dict] = []
-    company_rows: List[dict] = []
+# ----------------------- 회사 소스 로딩 --------------------------
+def zip_bounded(executor, fn, items, depth: int):
+    """
+    items를 executor에 제출하되 동시에 최대 depth개만 in-flight로 유지.
+    완료되는 순서대로 (item, 결과)를 내보내고, 소비자가 하나를 가져갈 때마다 다음 item을 제출.
+    items가 제너레이터면 소비도 필요한 만큼만 진행되므로 메모리 상한 = depth
+    """
+    it = iter(items)
+    pending = {}
+    for item in itertools.islice(it, depth):
+        pending[executor.submit(fn, item)] = item
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            item = pending.pop(fut)
+            yield item, fut.result()
+            for nxt in itertools.islice(it, 1):
+                pending[executor.submit(fn, nxt)] = nxt
+
+def iter_bounded(executor, fn, items, depth: int):
+    for _, result in zip_bounded(executor, fn, items, depth):
+        yield result
+
+def ensure_company_cached(cik: str, args, ua: Optional[str], dbg: Debugger, load: bool = True):
+    """
+    companyfacts/submissions를 캐시에서 찾고, 없거나 --force면 API로 받아 캐시에 저장.
+    load=True면 (facts, subs) dict, False면 (facts_path, subs_path) 반환
+    """
+    cik = str(cik).zfill(10)
+    got = {kind: refresh_cached_json(store, key, url, ua, dbg, revalidate=not args.force)
+           for kind, store, key, url in _company_fetch_plan(cik, args)}
+    return _load_company_cache(cik, args, got.get("facts"), got.get("subs"), load)
+
+async def ensure_company_cached_async(fetcher: AsyncSecFetcher, cik: str, args, load: bool = True):
+    # ensure_company_cached의 비동기 버전 (facts/subs를 동시에 요청)
+    cik = str(cik).zfill(10)
+    plan = _company_fetch_plan(cik, args)
+    async def refresh(store, key, url):
+        headers = {} if args.force else store.conditional_headers(key)
+        status, data, resp_headers = await fetcher.fetch(url, headers)
+        return await asyncio.to_thread(_commit_cached_json, store, key, url, status, data, resp_headers)
+    got = await asyncio.gather(*(refresh(store, key, url) for _, store, key, url in plan))
+    got = {kind: data for (kind, _, _, _), data in zip(plan, got)}
+    return await asyncio.to_thread(_load_company_cache, cik, args, got.get("facts"), got.get("subs"), load)
+
+def _company_fetch_plan(cik: str, args) -> List[Tuple[str, CacheStore, str, str]]:
+    """
+    받아야 할 (kind, store, key, url) 목록.
+    TTL 안의 캐시가 있으면 요청하지 않음 (--force면 무조건 새로 받음)
+    """
+    plan = []
+    if args.force or not cf_find_existing(args.cache_dir, cik):
+        plan.append(("facts", cf_store(args.cache_dir), _cik_key(cik), companyfacts_url(cik)))
+    if args.force or not subs_find_existing(args.subs_cache_dir, cik):
+        plan.append(("subs", subs_store(args.subs_cache_dir), _cik_key(cik), submissions_url(cik)))
+    return plan
+
+def _load_company_cache(cik: str, args, facts: Optional[dict], subs: Optional[dict], load: bool):
+    # 이번에 새로 받은 dict는 그대로 쓰고, 나머지(캐시 적중/304)는 캐시에서 로드
+    cf_cached = cf_cache_path(args.cache_dir, cik)
+    subs_cached = subs_cache_path(args.subs_cache_dir, cik)
+    if not load:
+        return cf_cached, subs_cached
+    facts = open_company_facts(cf_cached, _cik_key(cik), facts)
+    if subs is None:
+        subs = load_json_file(subs_cached)
+    return facts, subs
+
+def company_label(co: dict) -> str:
+    return f"{co['symbol']} ({co['cik']})" if co.get("symbol") else f"CIK{co['cik']}"
+
+def iter_companies_async(todo: List[dict], args, ua: Optional[str], dbg: Debugger, load: bool,
+                         concurrency: int, depth: int):
+    """
+    todo를 AsyncSecFetcher로 받아 (meta, facts, subs)를 내보내는 제너레이터.
+    이벤트 루프는 별도 스레드에서 돌고 결과는 크기 depth의 큐로 넘어오므로,
+    소비(추출)가 밀리면 fetch도 함께 멈춰 메모리 상한이 유지됨
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=depth)
+    done = object()
+    pending = list(reversed(todo))
 
-    include_derived = (args.include_derived and not args.skip_derived) or (not args.skip_derived and ("all" in args.metrics or "derived" in args.metrics))
-    base_wanted = (("all" in args.metrics) or ("base" in args.metrics)) or any(m in BASE_METRICS for m in args.metrics)
-    derived_wanted = include_derived or any(m in DERIVED_METRICS for m in args.metrics)
+    async def worker(fetcher):
+        while pending:
+            co = pending.pop()
+            try:
+                facts, subs = await ensure_company_cached_async(fetcher, co["cik"], args, load=load)
+                item = (fill_company_meta(co, facts, subs) if load else co, facts, subs)
+            except Exception as e:
+                print(f"[ERROR] {company_label(co)} fetch failed: {e}", file=sys.stderr)
+                continue
+            await asyncio.to_thread(q.put, item)
 
-    for (meta_base, facts, subs) in pairs:
+    async def run():
+        async with AsyncSecFetcher(ua, dbg, concurrency=concurrency) as fetcher:
+            await asyncio.gather(*(worker(fetcher) for _ in range(max(1, min(concurrency, len(todo))))))
+
+    def runner():
         try:
-            cik=meta_base.get("cik",""); symbol=meta_base.get("symbol",""); name=meta_base.get("name","")
-            sector, industry, sic, sic_desc = infer_sector_industry(subs)
-            fye = str(subs.get("fiscalYearEnd") or "")
-            meta = {
-                "cik": cik, "symbol": symbol, "name": name,
-                "sector": sector, "industry": industry,
-                "sic": sic, "sic_description": sic_desc, "fye": fye
-            }
-            company_rows.append({
-                "symbol": symbol, "cik": cik, "name": name,
-                "sector": sector, "industry": industry,
-                "sic": sic, "sic_description": sic_desc, "fye": fye
-            })
+            asyncio.run(run())
+        except Exception as e:
+            print(f"[ERROR] async fetch failed: {e}", file=sys.stderr)
+        finally:
+            q.put(done)
+
+    t = threading.Thread(target=runner, daemon=True)
+    t.start()
+    while True:
+        item = q.get()
+        if item is done:
+            break
+        yield item
+    t.join()
+
+def ensure_local_subs(cik: str, args, ua: Optional[str], dbg: Debugger, load: bool = True):
+    """
+    로컬 companyfacts 파일용 submissions: 캐시 → (--use-api면) API 호출 후 저장.
+    load=True면 dict(없으면 {}), False면 경로(없으면 None) 반환
+    """
+    if args.use_api and not subs_find_existing(args.subs_cache_dir, cik):
+        subs = refresh_cached_json(subs_store(args.subs_cache_dir), _cik_key(cik), submissions_url(cik), ua, dbg)
+        if load and subs is not None:
+            return subs
+    # API를 쓰지 않으면 TTL이 지난 캐시라도 그대로 사용
+    subs_path = subs_cache_path(args.subs_cache_dir, cik)
+    if not load:
+        return subs_path
+    return load_json_file(subs_path) if subs_path else {}
+
+def cik_from_facts_path(path) -> str:
+    # 파일명(CIK0000320193*.json)에서 CIK를 읽고, 없으면 JSON의 cik 필드 사용
+    name = path.name if isinstance(path, ArchiveMember) else pathlib.Path(path).name
+    m = re.search(r"CIK(\d{1,10})", name)
+    if m:
+        return m.group(1).zfill(10)
+    return str(load_json_file(path).get("cik") or "").zfill(10)
+
+def fill_company_meta(meta_base: dict, facts: dict, subs: dict) -> dict:
+    if isinstance(facts, CompanyFactIndex):
+        facts = facts.raw
+    symbol = meta_base.get("symbol") or facts.get("entityTicker") or ""
+    if not symbol and subs:
+        tickers = subs.get("tickers") or []
+        symbol = tickers[0] if tickers else ""
+    name = meta_base.get("name") or facts.get("entityName") or ""
+    return {"cik": str(meta_base.get("cik") or facts.get("cik") or "").zfill(10), "symbol": symbol, "name": name}
+
+# ----------------------- 회사별 추출 --------------------------
+@dataclass(frozen=True)
+class ExtractOptions:
+    fy: int
+    metrics: Tuple[str, ...] = ("all",)
+    prefer_unit: str = "USD"
+    fy_tol_days: int = 90
+    base_wanted: bool = True
+    derived_wanted: bool = True
+    debug: bool = False
+    debug_file: Optional[str] = None
+    json_decoder: str = "auto"
+    facts_taxonomies: Optional[Tuple[str, ...]] = None
+    fact_store: Optional[str] = None
+    # --fy-range: 회사당 인덱스 하나로 이 연도들을 모두 추출 (비어 있으면 fy 하나)
+    years: Tuple[int, ...] = ()
+    # --derived-batch: 성장률 외 파생 메트릭을 추출이 끝난 뒤 전체 기업 열로 한 번에 평가 (결과는 같음)
+    derived_batch: bool = False
+
+    def fiscal_years(self) -> Tuple[int, ...]:
+        return self.years or (self.fy,)
+
+    def wants(self, metric: str, group: str) -> bool:
+        return ("all" in self.metrics) or (group in self.metrics) or (metric in self.metrics)
+
+    def output_params(self) -> dict:
+        # 선택 결과에 영향을 주는 옵션만 (디버그/디코더/컬럼 저장소는 결과가 같음)
+        return {"fy": self.fy, "years": list(self.years), "metrics": list(self.metrics), "prefer_unit": self.prefer_unit,
+                "fy_tol_days": self.fy_tol_days, "base_wanted": self.base_wanted,
+                "derived_wanted": self.derived_wanted,
+                "facts_taxonomies": list(self.facts_taxonomies) if self.facts_taxonomies else None}
+
+_DURATION_SELECTORS = {
+    "Revenue": select_revenue,
+    "OperatingIncome": select_operating_income,
+    "NetIncome": select_net_income,
+    "CFO": select_cfo,
+    "GrossProfit": select_gross_profit,
+    "EPSDiluted": select_eps_diluted,
+    "CapEx": select_capex,
+    "InterestExpense": select_interest_expense,
+    "DepAmort": select_dep_amort,
+    "CostOfGoodsSold": select_cogs,
+    "IncomeTaxExpense": select_income_tax_expense,
+    "PreTaxIncome": select_pretax_income,
+    "DilutedShares": lambda f, fy, s, d, **kw: select_base_duration(f, fy, s, d, "DilutedShares", **kw),
+}
 
+_INSTANT_SELECTORS = {
+    "Assets": select_assets,
+    "Liabilities": select_liabilities,
+    "Equity": select_equity,
+    "LongTermDebt": select_longterm_debt,
+    "ShortTermDebt": select_shortterm_debt,
+    "DebtCurrent": lambda f, fy, s, d, **kw: select_base_instant(f, fy, s, d, "DebtCurrent", **kw),
+    "CurrentAssets": select_current_assets,
+    "CurrentLiabilities": select_current_liabilities,
+    "Inventories": select_inventories,
+    "AccountsReceivable": select_accounts_receivable,
+}
+
+def add_other_derived_rows(tag_rows: List[TagRow], meta: dict, fy: int, others):
+    for (metric, val, unit, end, form, accn, src, tag, computed_from, conf, reason) in others:
+        add_row(tag_rows, meta, fy, metric, True, val, unit,
+                "instant" if metric in INSTANT_DERIVED_METRICS else "duration",
+                end, form, accn, src, tag, "", computed_from, conf, reason, None)
+
+def extract_company(meta_base: dict, facts: dict, subs: dict, opts: ExtractOptions, dbg: Debugger,
+                    pending: Optional[List[PendingDerived]] = None) -> Tuple[Optional[dict], List[TagRow]]:
+    """
+    회사 1곳의 기본/파생 메트릭을 선택하여 (companies.csv 행, tags.csv 행 리스트) 반환.
+    opts.years가 있으면 같은 팩트 인덱스로 연도를 오름차순으로 모두 추출 (행의 fy 컬럼으로 구분).
+    인덱스의 선택 캐시는 연도를 키에 포함하므로, 앞 연도에서 고른 결과를 뒤 연도의 전년도 조회가 그대로 재사용함.
+    pending 리스트를 주면 성장률 외 파생 메트릭은 계산하지 않고 입력만 PendingDerived로 넘김 (evaluate_pending_derived).
+    처리 중 예외가 나면 경고만 출력하고 그때까지 만든 행을 반환 (기존 동작 유지)
+    """
+    tag_rows: List[TagRow] = []
+    company_row = None
+    cik=meta_base.get("cik",""); symbol=meta_base.get("symbol",""); name=meta_base.get("name","")
+    try:
+        # 회사당 한 번 팩트 인덱스를 만들어 모든 선택기가 공유 (컬럼 저장소면 이미 인덱스)
+        index = as_fact_index(facts)
+        sector, industry, sic, sic_desc = infer_sector_industry(subs)
+        fye = str(subs.get("fiscalYearEnd") or "")
+        meta = {
+            "cik": cik, "symbol": symbol, "name": name,
+            "sector": sector, "industry": industry,
+            "sic": sic, "sic_description": sic_desc, "fye": fye
+        }
+        company_row = {
+            "symbol": symbol, "cik": cik, "name": name,
+            "sector": sector, "industry": industry,
+            "sic": sic, "sic_description": sic_desc, "fye": fye
+        }
+
+        for fy in sorted(opts.fiscal_years()):
             # BASE
-            if base_wanted:
+            if opts.base_wanted:
                 # duration-type
-                for bm in ["Revenue","OperatingIncome","NetIncome","CFO","GrossProfit","EPSDiluted",
-                           "CapEx","InterestExpense","DepAmort","CostOfGoodsSold","IncomeTaxExpense","PreTaxIncome","DilutedShares"]:
-                    if ("all" in args.metrics) or ("base" in args.metrics) or (bm in args.metrics):
-                        sel = {
-                            "Revenue": select_revenue,
-                            "OperatingIncome": select_operating_income,
-                            "NetIncome": select_net_income,
-                            "CFO": select_cfo,
-                            "GrossProfit": select_gross_profit,
-                            "EPSDiluted": select_eps_diluted,
-                            "CapEx": select_capex,
-                            "InterestExpense": select_interest_expense,
-                            "DepAmort": select_dep_amort,
-                            "CostOfGoodsSold": select_cogs,
-                            "IncomeTaxExpense": select_income_tax_expense,
-                            "PreTaxIncome": select_pretax_income,
-                            "DilutedShares": lambda f, fy, s, d, **kw: select_base_duration(f, fy, s, d, "DilutedShares", **kw),
-                        }[bm](facts, args.fy, subs, dbg, prefer_unit=args.prefer_unit, tol_days=args.fy_tol_days)
+                for bm, selector in _DURATION_SELECTORS.items():
+                    if opts.wants(bm, "base"):
+                        sel = selector(index, fy, subs, dbg, prefer_unit=opts.prefer_unit, tol_days=opts.fy_tol_days)
                         if sel.get("source_type") != "none" and safe_float(sel.get("value")) is not None:
-                            add_row(tag_rows, meta, args.fy, bm, False, sel["value"], sel.get("unit",""),
+                            add_row(tag_rows, meta, fy, bm, False, sel["value"], sel.get("unit",""),
                                     "duration", sel.get("end",""), sel.get("form",""), sel.get("accn",""),
                                     sel.get("source_type",""), sel.get("qname",""), sel.get("name",""),
                                     "", sel.get("confidence"), sel.get("reason",""), None)
 
                 # instant-type
-                for bm in ["Assets","Liabilities","Equity","LongTermDebt","ShortTermDebt","DebtCurrent",
-                           "CurrentAssets","CurrentLiabilities","Inventories","AccountsReceivable"]:
-                    if ("all" in args.metrics) or ("base" in args.metrics) or (bm in args.metrics):
-                        sel = {
-                            "Assets": select_assets,
-                            "Liabilities": select_liabilities,
-                            "Equity": select_equity,
-                            "LongTermDebt": select_longterm_debt,
-                            "ShortTermDebt": select_shortterm_debt,
-                            "DebtCurrent": lambda f, fy, s, d, **kw: select_base_instant(f, fy, s, d, "DebtCurrent", **kw),
-                            "CurrentAssets": select_current_assets,
-                            "CurrentLiabilities": select_current_liabilities,
-                            "Inventories": select_inventories,
-                            "AccountsReceivable": select_accounts_receivable,
-                        }[bm](facts, args.fy, subs, dbg, prefer_unit=args.prefer_unit, tol_days=120)
+                for bm, selector in _INSTANT_SELECTORS.items():
+                    if opts.wants(bm, "base"):
+                        sel = selector(index, fy, subs, dbg, prefer_unit=opts.prefer_unit, tol_days=120)
                         if sel.get("source_type") != "none" and safe_float(sel.get("value")) is not None:
-                            add_row(tag_rows, meta, args.fy, bm, False, sel["value"], sel.get("unit",""),
+                            add_row(tag_rows, meta, fy, bm, False, sel["value"], sel.get("unit",""),
                                     "instant", sel.get("end",""), sel.get("form",""), sel.get("accn",""),
                                     sel.get("source_type",""), sel.get("qname",""), sel.get("name",""),
                                     "", sel.get("confidence"), sel.get("reason",""), None)
 
             # DERIVED
-            if derived_wanted:
+            if opts.derived_wanted:
                 # (A) Growth 4종 – 이번 빌드에서만 로직 보강
-                growth = compute_growth_set(facts, args.fy, subs, dbg, prefer_unit=args.prefer_unit, tol_days=args.fy_tol_days)
+                growth = compute_growth_set(index, fy, subs, dbg, prefer_unit=opts.prefer_unit, tol_days=opts.fy_tol_days)
                 for gname in ["RevenueGrowthYoY","NetIncomeGrowthYoY","CFOGrowthYoY","AssetGrowthRate"]:
-                    if growth.get(gname) and (("all" in args.metrics) or ("derived" in args.metrics) or (gname in args.metrics)):
+                    if growth.get(gname) and opts.wants(gname, "derived"):
                         g = growth[gname]
                         if safe_float(g.get("value")) is not None:
-                            add_row(tag_rows, meta, args.fy, gname, True, g["value"], g.get("unit",""),
+                            add_row(tag_rows, meta, fy, gname, True, g["value"], g.get("unit",""),
                                     "duration" if gname!="AssetGrowthRate" else "instant",
                                     g.get("end",""), g.get("form",""), g.get("accn",""),
                                     g.get("source_type",""), g.get("selected_tag",""), "",
                                     g.get("computed_from",""), g.get("confidence",0.0), g.get("reason",""), None)
 
-                # (B) 그 외 파생 – 기존 로직 유지
-                others = compute_other_derived(facts, args.fy, subs, dbg, prefer_unit=args.prefer_unit, tol_days=args.fy_tol_days)
-                for (metric, val, unit, end, form, accn, src, tag, computed_from, conf, reason) in others:
-                    if ("all" in args.metrics) or ("derived" in args.metrics) or (metric in args.metrics):
-                        add_row(tag_rows, meta, args.fy, metric, True, val, unit, 
-                                "duration" if metric not in ("AssetTurnover","EquityRatio") else "instant", 
-                                end, form, accn, src, tag, "", computed_from, conf, reason, None)
+                # (B) 그 외 파생 – 기존 로직 유지 (--derived-batch면 입력만 모아 두고 나중에 전체 기업을 한 번에 평가)
+                wanted = [f.metric for f in DERIVED_FORMULAS if opts.wants(f.metric, "derived")]
+                if pending is not None:
+                    names = derived_plan(wanted)[1]
+                    sels = select_derived_inputs(index, fy, subs, dbg, names, opts.prefer_unit, opts.fy_tol_days)
+                    pending.append(pending_derived(meta, fy, tag_rows, sels))
+                else:
+                    others = compute_other_derived(index, fy, subs, dbg, prefer_unit=opts.prefer_unit,
+                                                   tol_days=opts.fy_tol_days, metrics=wanted)
+                    add_other_derived_rows(tag_rows, meta, fy, others)
 
-        except Exception as e:
-            print(f"[WARN] {symbol or cik} processing failed: {e}", file=sys.stderr)
-            continue
+        dbg.log(f"[selection-cache] {symbol or cik} hits={index.selection_hits} misses={index.selection_misses}")
+    except Exception as e:
+        print(f"[WARN] {symbol or cik} processing failed: {e}", file=sys.stderr)
+    return company_row, tag_rows
+
+# 프로세스 풀 워커 상태 (--workers N)
+_WORKER_OPTS: Optional[ExtractOptions] = None
+_WORKER_DBG: Optional[Debugger] = None
+
+def _init_extract_worker(opts: ExtractOptions):
+    global _WORKER_OPTS, _WORKER_DBG
+    _WORKER_OPTS = opts
+    configure_json(opts.json_decoder, opts.facts_taxonomies)
+    configure_fact_store(opts.fact_store)
+    # 워커마다 별도 디버그 파일 (같은 파일을 "w"로 열면 서로 덮어씀)
+    path = f"{opts.debug_file}.{os.getpid()}" if opts.debug_file else None
+    _WORKER_DBG = Debugger(enabled=opts.debug, path=path)
+
+def load_company_task(task) -> Optional[Tuple[dict, dict, dict]]:
+    # (meta, facts_path, subs_path) → (meta, facts, subs). 읽기에 실패하면 에러를 출력하고 None
+    meta_base, facts_path, subs_path = task
+    try:
+        facts = open_company_facts(facts_path, _cik_key(meta_base["cik"]) if meta_base.get("cik") else None)
+        subs = load_json_file(subs_path) if subs_path else {}
+    except Exception as e:
+        print(f"[ERROR] {meta_base.get('symbol') or meta_base.get('cik')} load failed: {e}", file=sys.stderr)
+        return None
+    return fill_company_meta(meta_base, facts, subs), facts, subs
+
+def _extract_company_task(task) -> Optional[Tuple[Optional[dict], List[TagRow]]]:
+    """
+    워커 진입점: 캐시 경로에서 직접 facts/submissions를 읽어 추출.
+    수 MB짜리 companyfacts dict를 프로세스 간에 피클링하지 않기 위함
+    """
+    loaded = load_company_task(task)
+    if loaded is None:
+        return None
+    if _WORKER_OPTS.derived_batch:
+        # 모아 둔 파생 입력도 함께 돌려보냄 (행 목록과 같이 피클되므로 PendingDerived.rows는 돌려받은 행 목록을 가리킴)
+        pending: List[PendingDerived] = []
+        return extract_company(*loaded, _WORKER_OPTS, _WORKER_DBG, pending) + (pending,)
+    return extract_company(*loaded, _WORKER_OPTS, _WORKER_DBG)
+
+# ----------------------- 실행 manifest (증분 재추출) --------------------------
+def content_digest(path) -> str:
+    # 파일 내용의 sha256. 캐시 객체는 파일명이 곧 내용 해시라 다시 읽지 않음 (경로가 없으면 "")
+    if not path:
+        return ""
+    if isinstance(path, ArchiveMember):
+        return path.signature()
+    p = pathlib.Path(path)
+    m = re.fullmatch(r"([0-9a-f]{64})\.json\.gz", p.name)
+    if m:
+        return m.group(1)
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def company_source_digest(facts_path, subs_path) -> str:
+    return f"{content_digest(facts_path)}:{content_digest(subs_path)}"
+
+def selector_code_version() -> str:
+    # 선택 로직이 바뀌면 이전 행을 재사용하지 않도록 이 스크립트 자체의 해시를 기록
+    return content_digest(__file__)
+
+class RunManifest:
+    """
+    증분 실행 manifest (--run-manifest).
+      {"version", "code_version", "params", "tags_sha256", "companies_sha256", "companies": {cik: 원본 해시}}
+    코드 버전·파라미터가 같고 이전 tags/companies CSV가 manifest에 기록된 내용 그대로일 때만,
+    companyfacts/submissions 해시가 같은 회사의 이전 행을 다시 추출하지 않고 가져다 씀
+    """
+    VERSION = 1
+
+    def __init__(self, path, code_version: str, params: dict):
+        self.path = pathlib.Path(path)
+        self.code_version = code_version
+        self.params = params
+        self.sources: Dict[str, str] = {}  # 이번 실행: cik -> 원본 해시
+        self.reused = 0
+        self._prior_sources: Dict[str, str] = {}
+        self._prior_tags: Dict[str, List[TagRow]] = {}
+        self._prior_companies: Dict[str, dict] = {}
+
+    def load_prior(self, tags_path, companies_path) -> bool:
+        """이전 실행 결과를 재사용할 수 있으면 읽어 두고 True"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                prior = json.load(f)
+            if (prior.get("version") != self.VERSION or prior.get("code_version") != self.code_version
+                    or prior.get("params") != self.params
+                    or content_digest(tags_path) != prior.get("tags_sha256")
+                    or content_digest(companies_path) != prior.get("companies_sha256")):
+                return False
+        except (OSError, ValueError):
+            return False
+        for row in read_csv_rows(tags_path):
+            self._prior_tags.setdefault(row.get("cik", ""), []).append(TagRow.from_mapping(row))
+        for row in read_csv_rows(companies_path):
+            self._prior_companies[row.get("cik", "")] = {k: row.get(k, "") for k in COMPANIES_FIELDS}
+        self._prior_sources = prior.get("companies", {})
+        return True
+
+    def carry(self, cik: str, digest: str) -> Optional[Tuple[Optional[dict], List[TagRow]]]:
+        # 원본이 이전 실행과 같으면 이전 (companies 행, tags 행)을 돌려주고 기록
+        if not digest or self._prior_sources.get(cik) != digest:
+            return None
+        self.record(cik, digest)
+        self.reused += 1
+        return self._prior_companies.get(cik), self._prior_tags.get(cik, [])
+
+    def record(self, cik: str, digest: str):
+        self.sources[cik] = digest
+
+    def save(self, tags_path, companies_path):
+        payload = {
+            "version": self.VERSION, "code_version": self.code_version, "params": self.params,
+            "tags_sha256": content_digest(tags_path), "companies_sha256": content_digest(companies_path),
+            "companies": self.sources,
+        }
+        _atomic_write_bytes(self.path, json.dumps(payload, indent=1, sort_keys=True).encode("utf-8"))
+
+# ----------------------- 출력 단계 --------------------------
+_OUTPUT_DEFAULTS = {
+    "tags": "data/tags_{fy}.csv",
+    "companies": "data/companies_{fy}.csv",
+    "benchmarks": "data/benchmarks_{fy}.csv",
+    "rankings": "data/rankings_{fy}.csv",
+    "wide": "data/companies_wide_{fy}.csv",
+}
 
-    # companies.csv 쓰기
-    with open(out_comp, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["symbol","cik","name","sector","industry","sic","sic_description","fye"])
-        w.writeheader()
-        for r in company_rows:
-            w.writerow(r)
+def parse_fy_range(spec: str) -> Tuple[int, ...]:
+    # "2015-2024" → (2015, ..., 2024), "2024" → (2024,)
+    m = re.fullmatch(r"\s*(\d{4})\s*(?:-\s*(\d{4})\s*)?", spec or "")
+    if not m or int(m.group(2) or m.group(1)) < int(m.group(1)):
+        raise ValueError(f"invalid fiscal year range: {spec!r} (expected e.g. 2015-2024)")
+    return tuple(range(int(m.group(1)), int(m.group(2) or m.group(1)) + 1))
 
+def output_path(given: Optional[str], default: Optional[str], label, split: bool) -> Optional[pathlib.Path]:
+    """
+    출력 경로: 지정이 없으면 default, 경로 안의 {fy}는 label(연도 또는 "2015-2024")로 채움.
+    split(--fy-range 연도별 출력)인데 {fy}가 없으면 확장자 앞에 _{label}을 붙여 연도별 파일이 겹치지 않게 함
+    """
+    path = given or default
+    if not path:
+        return None
+    if "{fy}" in path:
+        return pathlib.Path(path.replace("{fy}", str(label)))
+    if split:
+        p = pathlib.Path(path)
+        return p.with_name(f"{p.stem}_{label}{p.suffix}")
+    return pathlib.Path(path)
+
+def output_paths(args, label, split: bool) -> Dict[str, Optional[pathlib.Path]]:
+    paths = {name: output_path(getattr(args, f"out_{name}", None), default, label, split)
+             for name, default in _OUTPUT_DEFAULTS.items()}
+    paths["ttl"] = output_path(getattr(args, "emit_ttl", None), None, label, split)
+    return paths
+
+def write_result_outputs(result_set: ResultSet, years: Tuple[int, ...], paths: Dict[str, pathlib.Path], label, args):
+    """
+    추출이 끝난 result_set으로 tags/companies CSV, 벤치마크, 랭킹, wide CSV, TTL(옵션)을 씀.
+    years가 여럿이면(--fy-output combined) 벤치마크·랭킹은 연도별로 계산해 이어 붙이고,
+    회사당 한 행인 wide CSV는 연도별 파일(_{fy})로 씀
+    """
+    out_tags, out_comp = paths["tags"], paths["companies"]
+    out_benchmarks, out_rankings = paths["benchmarks"], paths["rankings"]
+
+    # 이후 단계는 result_set을 메모리에서 넘겨받고, CSV는 출력으로만 씀
+    write_csv_rows(out_comp, COMPANIES_FIELDS, result_set.companies)
     # tags_{fy}.csv 쓰기 (원복 스키마)
-    with open(out_tags, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "cik","symbol","name","sector","industry","sic","sic_description","fye","fy",
-            "metric","is_derived","value","unit","period_type","end","form","accn",
-            "source_type","selected_tag","composite_name","computed_from","confidence","reason","components"
-        ])
-        w.writeheader()
-        for row in tag_rows:
-            w.writerow(row)
+    write_csv_rows(out_tags, TAGS_FIELDS, result_set.tags)
 
     print(f"[OK] wrote tags CSV: {out_tags}")
     print(f"[OK] wrote companies CSV: {out_comp}")
 
+    if len(years) == 1:
+        tags_by_year = {years[0]: result_set.tags}
+    else:
+        tags_by_year = {y: [] for y in years}
+        for row in result_set.tags:
+            tags_by_year.setdefault(int(row.fy), []).append(row)
+
     # 벤치마크 계산 및 저장
     try:
-        benchmarks = compute_benchmarks(str(out_tags), fy)
-        with open(out_benchmarks, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=[
-                "industry", "sector", "metric", "fy", "average_value", "median_value",
-                "max_value", "min_value", "percentile25", "percentile75", "sample_size"
-            ])
-            w.writeheader()
-            for b in benchmarks:
-                w.writerow(b)
+        # CSV에는 요청한 백분위수만 쓰고, TTL용 p25/p75는 요청에 없어도 행에 함께 계산해 둠
+        percentiles = tuple(dict.fromkeys(args.benchmark_percentiles + TTL_BENCHMARK_PERCENTILES))
+        result_set.benchmarks = [b for y in years for b in compute_benchmarks(
+            tags_by_year[y], y, percentiles=percentiles, method=args.benchmark_interpolation)]
+        write_csv_rows(out_benchmarks, benchmark_fieldnames(args.benchmark_percentiles), result_set.benchmarks)
         print(f"[OK] wrote benchmarks CSV: {out_benchmarks}")
     except Exception as e:
         print(f"[WARN] benchmarks calculation failed: {e}", file=sys.stderr)
 
     # 랭킹 계산 및 저장
     try:
-        rankings = compute_rankings(str(out_tags), str(out_benchmarks), fy)
-        with open(out_rankings, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=[
-                "cik", "symbol", "industry", "sector", "metric", "ranking_type",
-                "rank", "value", "composite_score", "fy"
-            ])
-            w.writeheader()
-            for r in rankings:
-                r_with_fy = r.copy()
-                r_with_fy["fy"] = fy
-                w.writerow(r_with_fy)
+        result_set.rankings = [r for y in years for r in compute_rankings(tags_by_year[y], result_set.benchmarks, y)]
+        write_csv_rows(out_rankings, RANKINGS_FIELDS, result_set.rankings)
         print(f"[OK] wrote rankings CSV: {out_rankings}")
     except Exception as e:
         print(f"[WARN] rankings calculation failed: {e}", file=sys.stderr)
 
     # Wide format CSV 생성
     try:
-        if args.out_wide:
-            out_wide = pathlib.Path(args.out_wide)
-        else:
-            out_wide = pathlib.Path(f"data/companies_wide_{fy}.csv")
-        out_wide.parent.mkdir(parents=True, exist_ok=True)
-        create_wide_format_csv(str(out_tags), str(out_rankings), str(out_comp), fy, str(out_wide))
+        for y in years:
+            out_wide = paths["wide"] if len(years) == 1 else output_path(getattr(args, "out_wide", None), _OUTPUT_DEFAULTS["wide"], y, True)
+            out_wide.parent.mkdir(parents=True, exist_ok=True)
+            if result_set.rankings is None:
+                rankings_src = str(out_rankings)
+            elif len(years) == 1:
+                rankings_src = result_set.rankings
+            else:
+                rankings_src = [r for r in result_set.rankings if r.get("fy") == y]
+            create_wide_format_csv(tags_by_year[y], rankings_src, str(out_comp), y, str(out_wide))
     except Exception as e:
         print(f"[WARN] wide format CSV generation failed: {e}", file=sys.stderr)
 
     # TTL (옵션)
     try:
-        if args.emit_ttl:
-            # args에 파일 경로 추가
-            args.out_benchmarks = str(out_benchmarks)
-            args.out_rankings = str(out_rankings)
-            emit_after_csv(args, company_rows, tag_rows)
+        if paths["ttl"]:
+            # 계산에 실패한 단계만 이 경로의 CSV로 대체
+            ttl_args = argparse.Namespace(**vars(args))
+            ttl_args.fy = label
+            ttl_args.fy_years = tuple(years)
+            ttl_args.emit_ttl = str(paths["ttl"])
+            ttl_args.out_companies, ttl_args.out_tags = str(out_comp), str(out_tags)
+            ttl_args.out_benchmarks, ttl_args.out_rankings = str(out_benchmarks), str(out_rankings)
+            emit_after_csv(ttl_args, result_set.companies, result_set.tags, result_set.benchmarks, result_set.rankings)
     except Exception as e:
         print(f"[WARN] TTL generation failed: {e}", file=sys.stderr)
 
+# --------------------------- CLI (명령줄 인터페이스) -------------------------------
+def main():
+    ap = argparse.ArgumentParser(description="EDGAR XBRL selector (Full) with growth normalization & CSV schema restored")
+    ap.add_argument("--fy", type=int, default=2024, help="Fiscal year (default: 2024)")
+    ap.add_argument("--fy-range", type=parse_fy_range,
+                    help="Extract several fiscal years in one pass over each company's facts, e.g. 2015-2024 (overrides --fy)")
+    ap.add_argument("--fy-output", choices=["per-year", "combined"], default="per-year",
+                    help="With --fy-range: one set of outputs per year (paths get _{fy} unless they contain {fy}) "
+                         "or one combined set (wide CSV stays per year)")
+    ap.add_argument("--metrics", nargs="+", choices=BASE_METRICS+DERIVED_METRICS+["base","derived","all"], default=["all"])
+    ap.add_argument("--include-derived", action="store_true", help="Include derived metrics")
+    ap.add_argument("--skip-derived", action="store_true", help="Skip derived metrics entirely")
+    ap.add_argument("--use-api", action="store_true", help="Use SEC API (requires user-agent)")
+    ap.add_argument("--ciks", help="Comma separated CIKs (with --use-api or --bulk-archive)")
+    ap.add_argument("--tickers", nargs="+", help="Filter S&P500 (or the --bulk-archive universe) by tickers (no --ciks)")
+    ap.add_argument("--limit", type=int, help="Limit number of companies (with --use-api or --bulk-archive)")
+    ap.add_argument("--facts", nargs="+", help="Local Company Facts JSON paths")
+    ap.add_argument("--facts-dir", help="Directory containing Company Facts JSON files")
+    ap.add_argument("--bulk-archive", help="SEC bulk companyfacts.zip (or a directory with companyfacts.zip/submissions.zip); "
+                    "members are streamed from the zip, filtered by --ciks/--tickers/--limit, with no HTTP requests")
+    ap.add_argument("--user-agent", help="SEC user-agent or env SEC_USER_AGENT")
+    ap.add_argument("--prefer-unit", default="USD")
+    ap.add_argument("--fy-tol-days", type=int, default=90)
+    ap.add_argument("--debug", action="store_true")
+    ap.add_argument("--debug-file", help="Path to debug log file")
+    ap.add_argument("--cache-dir", default=_COMPANYFACTS_CACHE_DIR, help="Company Facts cache dir")
+    ap.add_argument("--subs-cache-dir", default=_SUBMISSIONS_CACHE_DIR, help="Submissions cache dir")
+    ap.add_argument("--json-decoder", choices=["auto", "orjson", "msgspec", "stdlib"], default="auto",
+                    help="JSON decoder for cache reads and API responses (default: auto = orjson > msgspec > stdlib)")
+    ap.add_argument("--facts-taxonomies",
+                    help="Keep only these companyfacts taxonomies, comma-separated; 'std' = us-gaap/ifrs-full/dei/srt "
+                         "plus filer extension taxonomies (default: all)")
+    ap.add_argument("--fact-store", help="Columnar fact store dir (numpy .npy, memory-mapped); companyfacts are ingested once and reused")
+    ap.add_argument("--derived-batch", action="store_true",
+                    help="Evaluate non-growth derived ratios once over all companies (NumPy arrays when available) instead of per company")
+    ap.add_argument("--benchmark-percentiles", type=parse_percentiles, default=BENCHMARK_PERCENTILES,
+                    help="Comma-separated percentiles for the benchmarks CSV (default: 25,75; the TTL always gets 25/75)")
+    ap.add_argument("--benchmark-interpolation", choices=BENCHMARK_INTERPOLATIONS, default="linear",
+                    help="Percentile interpolation method, as in numpy.percentile (default: linear)")
+    ap.add_argument("--cache-ttl-hours", type=float, default=_DEFAULT_CACHE_TTL_HOURS,
+                    help="Reuse cached SEC responses for this many hours before revalidating (default: 24)")
+    ap.add_argument("--force", action="store_true", help="Force API fetch even if cache exists")
+    ap.add_argument("--workers", type=int, default=1, help="Process pool size for per-company extraction (default: 1 = in-process)")
+    ap.add_argument("--fetch-backend", choices=["thread", "async"], default="thread",
+                    help="SEC fetch backend: thread pool over requests, or asyncio/aiohttp (default: thread)")
+    ap.add_argument("--fetch-concurrency", type=int, default=10, help="Concurrent SEC downloads (rate is still capped at 10 req/s, default: 10)")
+    ap.add_argument("--pipeline-depth", type=int, default=10, help="Max companies fetched but not yet extracted (bounds peak memory, default: 10)")
+    ap.add_argument("--suggestions", help="JSONL file to load curated suggestions")
+    ap.add_argument("--dump-suggestions", help="Path to dump mined/hinted/used qnames as JSONL")
+    ap.add_argument("--dump-suggestions-append", action="store_true")
+    ap.add_argument("--dump-ext-only", action="store_true")
+    ap.add_argument("--run-manifest", help="Run manifest JSON for incremental runs: companies whose companyfacts/submissions, "
+                                           "selector code and parameters are unchanged reuse their rows from the previous tags/companies CSV")
+    ap.add_argument("--out-tags", help="Output tags CSV path (default: data/tags_{fy}.csv)")
+    ap.add_argument("--out-companies", help="Companies CSV path (default: data/companies_{fy}.csv)")
+    ap.add_argument("--out-benchmarks", help="Output benchmarks CSV path (default: data/benchmarks_{fy}.csv)")
+    ap.add_argument("--out-rankings", help="Output rankings CSV path (default: data/rankings_{fy}.csv)")
+    ap.add_argument("--out-wide", help="Output wide format CSV path (default: data/companies_wide_{fy}.csv)")
+    ap.add_argument("--emit-ttl", help="Write RDF Turtle aligned to EFIN ontology (instances only).")
+    ap.add_argument("--emit-format", choices=EMIT_FORMATS, default="ttl",
+                    help="Instance output format for --emit-ttl: ttl, nt (N-Triples, one triple per line) or nq (N-Quads)")
+    ap.add_argument("--emit-compress", choices=["none", "gzip"], default="none",
+                    help="Compress the --emit-ttl output (gzip appends .gz)")
+    ap.add_argument("--emit-shards", type=int, default=1,
+                    help="Split --emit-ttl output by company into N files written in parallel, "
+                         "plus a .header file with shared instances (default: 1 = single file)")
+    ap.add_argument("--emit-graph", help="Named graph IRI for --emit-format nq, e.g. '<https://example.org/g>' "
+                                         "(default: one graph per fiscal year, also with --fy-output combined)")
+    ap.add_argument(
+        "--include-industry-scope",
+        action="store_true",
+        help="Include industry-scope Benchmark and TopRanking instances in TTL output.",
+    )
+    ap.add_argument(
+        "--include-sector-scope",
+        action="store_true",
+        help="Include sector-scope Benchmark and TopRanking instances in TTL output.",
+    )
+    args = ap.parse_args()
+
+    dbg = Debugger(enabled=args.debug, path=args.debug_file)
+    ua = get_user_agent(args)
+    configure_cache(args.cache_ttl_hours)
+
+    if args.fy_range and args.run_manifest and args.fy_output != "combined":
+        raise SystemExit("--run-manifest with --fy-range needs --fy-output combined (one tags CSV to carry rows from)")
+    facts_taxonomies = None
+    if args.facts_taxonomies:
+        facts_taxonomies = tuple(args.facts_taxonomies.split(","))
+        if args.suggestions:
+            facts_taxonomies += tuple(suggestion_taxonomies(args.suggestions))
+    opts = ExtractOptions(
+        fy=args.fy_range[-1] if args.fy_range else args.fy,
+        metrics=tuple(args.metrics),
+        prefer_unit=args.prefer_unit,
+        fy_tol_days=args.fy_tol_days,
+        base_wanted=(("all" in args.metrics) or ("base" in args.metrics)) or any(m in BASE_METRICS for m in args.metrics),
+        derived_wanted=((args.include_derived and not args.skip_derived)
+                        or (not args.skip_derived and ("all" in args.metrics or "derived" in args.metrics))
+                        or any(m in DERIVED_METRICS for m in args.metrics)),
+        debug=args.debug,
+        debug_file=args.debug_file,
+        json_decoder=args.json_decoder,
+        facts_taxonomies=facts_taxonomies,
+        fact_store=args.fact_store,
+        years=args.fy_range or (),
+        derived_batch=args.derived_batch,
+    )
+    configure_json(opts.json_decoder, opts.facts_taxonomies)
+    configure_fact_store(opts.fact_store)
+    workers = max(1, args.workers or 1)
+    # 단일 프로세스면 (meta, facts, subs) dict를 바로 쓰고,
+    # --workers N이면 (meta, facts_path, subs_path)만 넘겨 워커가 직접 읽도록 함.
+    # --run-manifest면 읽기 전에 원본 해시를 비교해야 하므로 항상 경로로 받음
+    load = workers == 1 and not args.run_manifest
+
+    depth = max(1, args.pipeline_depth or 1)
+
+    # 회사 소스 스트림: 가져오기(fetch)와 추출을 겹쳐 실행하고,
+    # 메모리에는 최대 depth개 회사의 facts만 머무르게 함
+    if args.facts or args.facts_dir:
+        paths = args.facts if args.facts else list(pathlib.Path(args.facts_dir).glob("*.json"))
+        def iter_sources():
+            for fp in paths:
+                if load:
+                    j = open_company_facts(fp)
+                    cik = str((j.raw if isinstance(j, CompanyFactIndex) else j).get("cik") or "").zfill(10)
+                    subs = ensure_local_subs(cik, args, ua, dbg, load=True)
+                    yield (fill_company_meta({"cik": cik}, j, subs), j, subs)
+                else:
+                    cik = cik_from_facts_path(fp)
+                    yield ({"cik": cik}, fp, ensure_local_subs(cik, args, ua, dbg, load=False))
+        sources = iter_sources()
+    elif args.bulk_archive:
+        bulk = BulkArchive(args.bulk_archive)
+        todo = bulk_company_todo(bulk, args)
+        print(f"[INFO] Reading {len(todo)} companies from bulk archive {args.bulk_archive}...", file=sys.stderr)
+        def iter_sources():
+            for co in todo:
+                subs = bulk.subs.get(co["cik"]) or subs_cache_path(args.subs_cache_dir, co["cik"])
+                task = (co, bulk.facts[co["cik"]], subs)
+                if not load:
+                    yield task
+                    continue
+                loaded = load_company_task(task)
+                if loaded is not None:
+                    yield loaded
+        sources = iter_sources()
+    elif args.use_api:
+        fetch_conc = max(1, args.fetch_concurrency or 1)
+        if args.ciks:
+            todo = [{"cik": c.strip().zfill(10), "symbol": "", "name": ""} for c in args.ciks.split(",") if c.strip()]
+            print(f"[INFO] Processing {len(todo)} CIKs with {min(fetch_conc, depth, len(todo))} workers...", file=sys.stderr)
+        else:
+            comps = fetch_sp500_constituents(ua, dbg)
+            if args.tickers:
+                want=set([t.upper() for t in args.tickers])
+                comps=[c for c in comps if c["symbol"].upper() in want]
+            if args.limit:
+                comps = comps[:int(args.limit)]
+            sec_map = fetch_sec_ticker_cik_map(ua, dbg, cache_dir=_TICKERS_CACHE_DIR)
+            todo=[]
+            for co in comps:
+                rec = sec_map.get(normalize_ticker_key(co["symbol"]))
+                if rec:
+                    todo.append({"symbol": co["symbol"], "cik": rec["cik"], "name": co["name"] or rec.get("title","")})
+            print(f"[INFO] Fetching {len(todo)} companies...", file=sys.stderr)
+        def fetch_one(co):
+            try:
+                facts, subs = ensure_company_cached(co["cik"], args, ua, dbg, load=load)
+                meta = fill_company_meta(co, facts, subs) if load else co
+                return (meta, facts, subs)
+            except Exception as e:
+                print(f"[ERROR] {company_label(co)} fetch failed: {e}", file=sys.stderr)
+                return None
+        def iter_sources():
+            with ThreadPoolExecutor(max_workers=max(1, min(fetch_conc, depth, len(todo)))) as ex:
+                for r in iter_bounded(ex, fetch_one, todo, depth):
+                    if r: yield r
+        if args.fetch_backend == "async":
+            sources = iter_companies_async(todo, args, ua, dbg, load, fetch_conc, depth)
+        else:
+            sources = iter_sources()
+    else:
+        raise SystemExit("Provide --facts/--facts-dir, --bulk-archive or --use-api")
+
+    # 파일 경로 준비 (fy 포함). --fy-range면 연도별(per-year) 또는 한 벌(combined)
+    years = opts.fiscal_years()
+    split = len(years) > 1 and args.fy_output == "per-year"
+    if split:
+        runs = [((y,), y) for y in years]
+    else:
+        runs = [(years, f"{years[0]}-{years[-1]}" if len(years) > 1 else years[0])]
+    run_paths = [output_paths(args, label, split) for _, label in runs]
+    for out in run_paths:
+        for name in ("tags", "companies", "benchmarks", "rankings"):
+            out[name].parent.mkdir(parents=True, exist_ok=True)
+    out_tags, out_comp = run_paths[0]["tags"], run_paths[0]["companies"]
+
+    # 결과 누적 (회사별로 모았다가 마지막에 CIK 순으로 정렬해 출력 순서를 고정)
+    results: List[Tuple[str, Optional[dict], List[TagRow]]] = []
+
+    # 증분 실행: 원본 해시가 이전 실행과 같은 회사는 이전 행을 그대로 쓰고 바뀐 회사만 추출
+    manifest = None
+    digests: Dict[str, str] = {}
+    if args.run_manifest:
+        manifest = RunManifest(args.run_manifest, selector_code_version(), opts.output_params())
+        if not manifest.load_prior(out_tags, out_comp):
+            print(f"[manifest] no reusable previous run in {args.run_manifest}; extracting all companies", file=sys.stderr)
+        def changed_only(items):
+            for src in items:
+                cik = str(src[0].get("cik", "")).zfill(10)
+                digest = company_source_digest(src[1], src[2])
+                prior = manifest.carry(cik, digest)
+                if prior is not None:
+                    results.append((cik,) + prior)
+                else:
+                    digests[cik] = digest
+                    yield src
+        sources = changed_only(sources)
+
+    def record(cik: str):
+        if manifest is not None and cik in digests:
+            manifest.record(cik, digests[cik])
+
+    # --derived-batch: 기업·연도별 파생 입력을 모아 두었다가 추출이 끝나면 한 번에 평가
+    pending: Optional[List[PendingDerived]] = [] if opts.derived_batch else None
+
+    if workers > 1:
+        print(f"[INFO] Extracting companies with {workers} processes...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker, initargs=(opts,)) as ex:
+            for src, result in zip_bounded(ex, _extract_company_task, sources, max(depth, workers)):
+                if result:
+                    results.append((src[0].get("cik", ""),) + tuple(result[:2]))
+                    if pending is not None:
+                        pending.extend(result[2])
+                    record(str(src[0].get("cik", "")).zfill(10))
+    else:
+        for (meta_base, facts, subs) in sources:
+            if not load:
+                loaded = load_company_task((meta_base, facts, subs))
+                if loaded is None:
+                    continue
+                meta_base, facts, subs = loaded
+            results.append((meta_base.get("cik", ""),) + extract_company(meta_base, facts, subs, opts, dbg, pending))
+            record(str(meta_base.get("cik", "")).zfill(10))
+            # 행을 만든 뒤에는 해당 회사의 facts를 붙잡고 있지 않음
+            del facts, subs
+
+    if pending:
+        t0 = time.perf_counter()
+        evaluate_pending_derived(pending, [f.metric for f in DERIVED_FORMULAS if opts.wants(f.metric, "derived")])
+        print(f"[INFO] Evaluated derived metrics for {len(pending)} company-years in {(time.perf_counter() - t0) * 1000:.1f} ms",
+              file=sys.stderr)
+        del pending
+
+    results.sort(key=lambda r: r[0])
+    if _FETCH_STATS.samples:
+        print(f"[fetch-stats] {_FETCH_STATS.format()}", file=sys.stderr)
+    result_set = ResultSet(runs[0][1] if len(runs) == 1 else years[0])
+    for _, company_row, rows in results:
+        if company_row is not None:
+            result_set.companies.append(company_row)
+        result_set.tags.extend(rows)
+    del results
+
+    if not split:
+        write_result_outputs(result_set, years, run_paths[0], runs[0][1], args)
+    else:
+        by_year: Dict[str, List[TagRow]] = {}
+        for row in result_set.tags:
+            by_year.setdefault(row.fy, []).append(row)
+        for ((y,), label), out in zip(runs, run_paths):
+            write_result_outputs(ResultSet(y, result_set.companies, by_year.get(str(y), [])), (y,), out, label, args)
+    if manifest is not None:
+        manifest.save(out_tags, out_comp)
+        print(f"[OK] wrote run manifest: {args.run_manifest} (reused {manifest.reused}, extracted {len(digests)} companies)")
+
 if __name__ == "__main__":
     main()
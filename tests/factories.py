@@ -0,0 +1,22 @@
+"""테스트 공용 companyfacts 픽스처: 레코드 한 개와 회사 하나의 companyfacts dict"""
+
+
+def fact_record(end, val, fp="FY", form="10-K", accn="a", **fields):
+    """
+    companyfacts units 배열의 레코드 하나. fields(start, fy, qtrs, segment, filed ...)는 None이 아닌 것만 넣음
+    """
+    r = {"end": end, "val": val, "fp": fp, "form": form, "accn": accn}
+    r.update((k, v) for k, v in fields.items() if v is not None)
+    return r
+
+
+def company_facts(cik, values, years=(2024,), growth=0.1, taxonomy="us-gaap"):
+    """
+    회사 하나의 companyfacts. values: 개념 이름 → 첫 해 값 (USD, 역년 회계연도 10-K).
+    연도 y의 값은 첫 해 값 * (1 + growth * (y - years[0])), accn은 "{cik}-{y}"
+    """
+    def series(base):
+        return [fact_record(f"{y}-12-31", base * (1 + growth * (y - years[0])), accn=f"{cik}-{y}",
+                            start=f"{y}-01-01", fy=y) for y in years]
+    return {"cik": cik, "entityName": f"Company {cik}",
+            "facts": {taxonomy: {concept: {"units": {"USD": series(base)}} for concept, base in values.items()}}}
@@ -0,0 +1,146 @@
+import unittest
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """SEC 대역 서버: /throttled*는 첫 요청에, /always-throttled는 매번 429 + Retry-After를 돌려줌"""
+    protocol_version = "HTTP/1.1"
+    RETRY_AFTER = {"/throttled": "0.2", "/throttled-long": "1.0", "/always-throttled": "0.5"}
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.hits.append(self.path)
+            srv.peers.add(self.client_address)
+            throttled = self.path in self.RETRY_AFTER and (self.path == "/always-throttled" or srv.hits.count(self.path) == 1)
+        if throttled:
+            # 긴 본문: 소켓 버퍼에 다 들어오지 않으므로 읽지 않으면 응답이 커넥션을 잡고 있음
+            body = b"slow down" * (200000 if self.path == "/throttled-long" else 1)
+            self.send_response(429)
+            self.send_header("Retry-After", self.RETRY_AFTER[self.path])
+        else:
+            body = json.dumps({"path": self.path, "ua": self.headers.get("User-Agent")}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reservations_are_spaced_by_rate(self):
+        bucket = select_xbrl_tags.TokenBucket(rate=10.0)
+        delays = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(delays[0], 0.0)
+        for prev, cur in zip(delays, delays[1:]):
+            self.assertAlmostEqual(cur - prev, 0.1, delta=0.01)
+
+    def test_retry_after_parsing(self):
+        self.assertEqual(select_xbrl_tags.retry_after_seconds("3", 9.0), 3.0)
+        self.assertEqual(select_xbrl_tags.retry_after_seconds(None, 9.0), 9.0)
+        self.assertEqual(select_xbrl_tags.retry_after_seconds("garbage", 9.0), 9.0)
+        self.assertEqual(select_xbrl_tags.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", 9.0), 0.0)
+
+
+@unittest.skipIf(select_xbrl_tags.aiohttp is None, "aiohttp not installed")
+class TestAsyncSecFetcher(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = []
+        self.server.peers = set()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _run(self, paths, rate=20.0, concurrency=4):
+        stats = select_xbrl_tags.FetchStats()
+        bucket = select_xbrl_tags.TokenBucket(rate=rate)
+
+        async def go():
+            async with select_xbrl_tags.AsyncSecFetcher("Test/1.0 test@example.com", bucket=bucket, stats=stats,
+                                                        concurrency=concurrency) as fetcher:
+                return await asyncio.gather(*(fetcher.get_json(self.base + p) for p in paths))
+
+        t0 = time.monotonic()
+        out = asyncio.run(go())
+        return out, stats, time.monotonic() - t0
+
+    def test_rate_limit_and_keepalive_pool(self):
+        paths = [f"/c/{i}" for i in range(8)]
+        out, stats, elapsed = self._run(paths, rate=20.0, concurrency=2)
+        self.assertEqual([o["path"] for o in out], paths)
+        self.assertEqual(out[0]["ua"], "Test/1.0 test@example.com")
+        # 8개 요청, 20 req/s, 버스트 없음 → 첫 요청 이후 최소 7 * 50ms
+        self.assertGreaterEqual(elapsed, 0.34)
+        # 커넥션은 풀 크기(2)를 넘지 않고 재사용됨
+        self.assertLessEqual(len(self.server.peers), 2)
+        summary = stats.summary()
+        self.assertEqual(summary["requests"], 8)
+        self.assertEqual(summary["errors"], 0)
+        self.assertIn("p95_ms", summary)
+
+    def test_honors_retry_after(self):
+        out, stats, elapsed = self._run(["/throttled"])
+        self.assertEqual(out[0]["path"], "/throttled")
+        self.assertEqual(self.server.hits, ["/throttled", "/throttled"])
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 2.0)  # 기본 백오프(2s)가 아니라 Retry-After를 따름
+        self.assertEqual(stats.retries, 1)
+        self.assertEqual([st for _, st, _ in stats.samples], [429, 200])
+
+    def test_retry_wait_releases_pooled_connection(self):
+        # 풀 크기 1: 429 뒤 Retry-After(1s)를 기다리는 동안 다른 요청이 커넥션을 쓸 수 있어야 함
+        done = {}
+
+        async def go():
+            async with select_xbrl_tags.AsyncSecFetcher("Test/1.0 test@example.com", bucket=select_xbrl_tags.TokenBucket(rate=50.0),
+                                                        stats=select_xbrl_tags.FetchStats(), concurrency=1) as fetcher:
+                t0 = time.monotonic()
+
+                async def timed(path):
+                    await fetcher.get_json(self.base + path)
+                    done[path] = time.monotonic() - t0
+                await asyncio.gather(timed("/throttled-long"), timed("/c/1"))
+
+        asyncio.run(go())
+        self.assertLess(done["/c/1"], 0.8)
+        self.assertGreaterEqual(done["/throttled-long"], 1.0)
+
+    def test_last_attempt_fails_without_waiting(self):
+        stats = select_xbrl_tags.FetchStats()
+
+        async def go():
+            async with select_xbrl_tags.AsyncSecFetcher("Test/1.0 test@example.com", bucket=select_xbrl_tags.TokenBucket(rate=50.0),
+                                                        stats=stats, max_retries=2) as fetcher:
+                return await fetcher.get_json(self.base + "/always-throttled")
+
+        t0 = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(go())
+        # 두 번 시도하고 기다림은 한 번(0.5s)만
+        self.assertLess(time.monotonic() - t0, 0.9)
+        self.assertEqual(self.server.hits, ["/always-throttled"] * 2)
+        self.assertEqual(stats.retries, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
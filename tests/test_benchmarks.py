@@ -0,0 +1,136 @@
+import unittest
+import sys
+import os
+import csv
+import json
+import tempfile
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+def _row(cik, industry, sector, metric, value):
+    return {"cik": cik, "industry": industry, "sector": sector, "metric": metric, "value": value}
+
+
+ROWS = [
+    _row("1", "Banks", "Financials", "ROE", "0.10"),
+    _row("2", "Banks", "Financials", "ROE", "0.40"),
+    _row("3", "Banks", "Financials", "ROE", "0.20"),
+    _row("4", "Banks", "Financials", "ROE", "0.30"),
+    _row("5", "Insurance", "Financials", "ROE", 0.50),
+    _row("6", "Software", "", "ROE", "0.90"),
+    _row("6", "Software", "", "Revenue", "100"),
+    _row("7", "Banks", "Financials", "ROE", "nan"),
+    _row("8", "", "Financials", "ROE", "0.70"),
+]
+
+
+class TestComputeBenchmarks(unittest.TestCase):
+    def _by_scope(self, benchmarks):
+        return {(b["industry"], b["sector"], b["metric"]): b for b in benchmarks}
+
+    def test_scopes_and_statistics(self):
+        got = self._by_scope(select_xbrl_tags.compute_benchmarks(ROWS, 2024))
+        # Insurance/Software는 표본 1개라 제외, 산업 없는 행은 전체에서 제외
+        self.assertEqual(list(got), [("Banks", "Financials", "ROE"), ("", "Financials", "ROE"), ("", "", "ROE")])
+        banks = got[("Banks", "Financials", "ROE")]
+        self.assertEqual(banks["sample_size"], 4)
+        self.assertAlmostEqual(banks["average_value"], 0.25)
+        self.assertAlmostEqual(banks["median_value"], 0.25)
+        self.assertEqual((banks["min_value"], banks["max_value"]), (0.10, 0.40))
+        self.assertAlmostEqual(banks["percentile25"], 0.175)
+        self.assertAlmostEqual(banks["percentile75"], 0.325)
+        self.assertEqual(got[("", "Financials", "ROE")]["sample_size"], 5)
+        self.assertEqual(got[("", "", "ROE")]["sample_size"], 6)
+
+    def test_percentile_sets_and_interpolation(self):
+        expected = {"linear": 0.175, "lower": 0.10, "higher": 0.20, "nearest": 0.20, "midpoint": 0.15}
+        for method, p25 in expected.items():
+            rows = select_xbrl_tags.compute_benchmarks(ROWS, 2024, percentiles=(25, 90), method=method)
+            banks = rows[0]
+            self.assertAlmostEqual(banks["percentile25"], p25, msg=method)
+            self.assertIn("percentile90", banks)
+            self.assertEqual(list(banks), select_xbrl_tags.benchmark_fieldnames((25, 90)))
+        with self.assertRaises(ValueError):
+            select_xbrl_tags.compute_benchmarks(ROWS, 2024, method="cubic")
+
+    def test_csv_path_matches_in_memory_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tags.csv")
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=list(ROWS[0]))
+                w.writeheader()
+                w.writerows(ROWS)
+            self.assertEqual(select_xbrl_tags.compute_benchmarks(path, 2024),
+                             select_xbrl_tags.compute_benchmarks(ROWS, 2024))
+
+    def test_pure_python_fallback_matches_numpy(self):
+        if select_xbrl_tags.np is None:
+            self.skipTest("numpy not installed")
+        for method in select_xbrl_tags.BENCHMARK_INTERPOLATIONS:
+            vectorized = select_xbrl_tags.compute_benchmarks(ROWS, 2024, percentiles=(10, 50, 95), method=method)
+            with mock.patch.object(select_xbrl_tags, "np", None):
+                fallback = select_xbrl_tags.compute_benchmarks(ROWS, 2024, percentiles=(10, 50, 95), method=method)
+            self.assertEqual(len(vectorized), len(fallback))
+            for a, b in zip(vectorized, fallback):
+                self.assertEqual(a.keys(), b.keys())
+                for key in a:
+                    if isinstance(a[key], float):
+                        self.assertAlmostEqual(a[key], b[key], msg=(method, key))
+                    else:
+                        self.assertEqual(a[key], b[key])
+
+    def test_parse_percentiles(self):
+        self.assertEqual(select_xbrl_tags.parse_percentiles("10, 50,90"), (10.0, 50.0, 90.0))
+        for bad in ("", "abc", "101"):
+            with self.assertRaises(ValueError):
+                select_xbrl_tags.parse_percentiles(bad)
+
+
+class TestBenchmarkPercentilesCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.facts_dir = os.path.join(self.tmp.name, "facts")
+        os.makedirs(self.facts_dir)
+        for cik in (1, 2, 3):
+            rec = {"end": "2024-12-31", "start": "2024-01-01", "val": 100.0 * cik, "fy": 2024, "fp": "FY", "form": "10-K",
+                   "accn": f"{cik}-24"}
+            facts = {"cik": cik, "facts": {"us-gaap": {"Revenues": {"units": {"USD": [rec]}},
+                                                      "NetIncomeLoss": {"units": {"USD": [dict(rec, val=10.0 * cik)]}}}}}
+            with open(os.path.join(self.facts_dir, f"CIK{cik:010d}.json"), "w", encoding="utf-8") as f:
+                json.dump(facts, f)
+            select_xbrl_tags.subs_save(os.path.join(self.tmp.name, "subs"), str(cik).zfill(10),
+                                       {"fiscalYearEnd": "1231", "sic": "7372", "sicDescription": "Software"})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, name, *extra):
+        out = os.path.join(self.tmp.name, name)
+        argv = ["select_xbrl_tags.py", "--fy", "2024", "--facts-dir", self.facts_dir,
+                "--subs-cache-dir", os.path.join(self.tmp.name, "subs"), "--include-industry-scope",
+                "--out-tags", os.path.join(out, "tags.csv"), "--out-companies", os.path.join(out, "companies.csv"),
+                "--out-benchmarks", os.path.join(out, "benchmarks.csv"), "--out-rankings", os.path.join(out, "rankings.csv"),
+                "--out-wide", os.path.join(out, "wide.csv"), "--emit-ttl", os.path.join(out, "inst.ttl")] + list(extra)
+        with mock.patch.object(sys, "argv", argv), mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            select_xbrl_tags.main()
+        with open(os.path.join(out, "benchmarks.csv"), encoding="utf-8") as f:
+            header = next(csv.reader(f))
+        with open(os.path.join(out, "inst.ttl"), encoding="utf-8") as f:
+            return header, f.read()
+
+    def test_ttl_keeps_schema_percentiles_for_custom_set(self):
+        default_header, default_ttl = self._run("default")
+        header, ttl = self._run("custom", "--benchmark-percentiles", "10,50,90")
+        self.assertIn("percentile10", header)
+        self.assertNotIn("percentile25", header)
+        self.assertGreater(default_ttl.count("efin:hasPercentile25"), 0)
+        self.assertEqual(ttl, default_ttl)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import sys
+import os
+import json
+import pickle
+import zipfile
+import tempfile
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import company_facts
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+TICKERS = {1: "AAA", 2: "BBB", 3: "CCC"}
+
+
+def _facts(cik):
+    return company_facts(cik, {"Revenues": 1000.0 * cik, "NetIncomeLoss": 100.0 * cik, "StockholdersEquity": 500.0 * cik})
+
+
+def _subs(cik):
+    return {"cik": str(cik), "tickers": [TICKERS[cik]], "fiscalYearEnd": "1231", "sic": "3571"}
+
+
+class TestBulkArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.facts_dir = os.path.join(self.dir, "facts")
+        self.bulk_dir = os.path.join(self.dir, "bulk")
+        os.makedirs(self.facts_dir)
+        os.makedirs(self.bulk_dir)
+        with zipfile.ZipFile(os.path.join(self.bulk_dir, "companyfacts.zip"), "w", zipfile.ZIP_DEFLATED) as cf, \
+                zipfile.ZipFile(os.path.join(self.bulk_dir, "submissions.zip"), "w", zipfile.ZIP_DEFLATED) as sub:
+            for cik in TICKERS:
+                name = f"CIK{cik:010d}.json"
+                cf.writestr(name, json.dumps(_facts(cik)))
+                sub.writestr(name, json.dumps(_subs(cik)))
+                sub.writestr(f"CIK{cik:010d}-submissions-001.json", json.dumps({"accessionNumber": []}))
+                with open(os.path.join(self.facts_dir, name), "w", encoding="utf-8") as f:
+                    json.dump(_facts(cik), f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, out, *source):
+        argv = ["select_xbrl_tags.py", "--fy", "2024", "--subs-cache-dir", os.path.join(self.dir, "subs"),
+                "--out-tags", os.path.join(out, "tags.csv"), "--out-companies", os.path.join(out, "companies.csv"),
+                "--out-benchmarks", os.path.join(out, "benchmarks.csv"), "--out-rankings", os.path.join(out, "rankings.csv"),
+                "--out-wide", os.path.join(out, "wide.csv")] + list(source)
+        with mock.patch.object(sys, "argv", argv), \
+                mock.patch.object(select_xbrl_tags, "_TICKERS_CACHE_DIR", os.path.join(self.dir, "tickers")), \
+                mock.patch.object(select_xbrl_tags, "http_get", side_effect=AssertionError("no HTTP in bulk mode")), \
+                mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            select_xbrl_tags.main()
+        with open(os.path.join(out, "tags.csv"), encoding="utf-8") as f:
+            tags = f.read()
+        with open(os.path.join(out, "companies.csv"), encoding="utf-8") as f:
+            return tags, f.read()
+
+    def test_members_and_signatures(self):
+        bulk = select_xbrl_tags.BulkArchive(self.bulk_dir)
+        self.assertEqual(bulk.ciks(), ["0000000001", "0000000002", "0000000003"])
+        self.assertEqual(sorted(bulk.subs), bulk.ciks())
+        member = pickle.loads(pickle.dumps(bulk.facts["0000000002"]))
+        self.assertEqual(select_xbrl_tags.load_facts_file(member), _facts(2))
+        self.assertEqual(select_xbrl_tags.cik_from_facts_path(member), "0000000002")
+        self.assertEqual(select_xbrl_tags.content_digest(member), member.signature())
+        self.assertEqual(bulk.find_tickers({"BBB", "ZZZ"}), {"BBB": "0000000002"})
+
+    def test_bulk_matches_facts_dir(self):
+        tags, companies = self._run(os.path.join(self.dir, "bulk_out"), "--bulk-archive", self.bulk_dir)
+        # 같은 facts를 디렉터리로 읽되 submissions는 bulk 실행에서 쓰인 값과 같도록 캐시에 저장
+        for cik in TICKERS:
+            select_xbrl_tags.subs_save(os.path.join(self.dir, "subs"), str(cik).zfill(10), _subs(cik))
+        expected = self._run(os.path.join(self.dir, "dir_out"), "--facts-dir", self.facts_dir)
+        self.assertEqual((tags, companies), expected)
+        self.assertIn("BBB", companies)
+
+    def test_filters(self):
+        zip_path = os.path.join(self.bulk_dir, "companyfacts.zip")
+        _, companies = self._run(os.path.join(self.dir, "ciks"), "--bulk-archive", zip_path, "--ciks", "3")
+        self.assertEqual(len(companies.splitlines()), 2)
+        self.assertIn("0000000003", companies)
+        _, companies = self._run(os.path.join(self.dir, "tickers"), "--bulk-archive", zip_path, "--tickers", "aaa", "CCC",
+                                 "--workers", "2")
+        self.assertEqual([line.split(",")[0] for line in companies.splitlines()[1:]], ["AAA", "CCC"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import sys
+import os
+import glob
+import math
+import random
+from datetime import date
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.cache/companyfacts'))
+SECTORS = (None, "Utilities", "Financials", "Energy")
+
+
+def _exhaustive(facts, fy, subs, dbg, metric_name, prefer_unit, tol_days, sector, instant):
+    # 상한 가지치기 이전의 선택 규칙: 모든 너비에서 모든 후보를 평가
+    index = select_xbrl_tags.CompanyFactIndex(facts)
+    if sector is None:
+        sector = select_xbrl_tags.infer_sector_industry(subs)[0]
+    best = None
+    for widen in (0, 60, 120, 180):
+        for cand in select_xbrl_tags.CANDIDATES.get(metric_name, []):
+            if cand.industry_only is not None and sector not in cand.industry_only:
+                continue
+            if instant:
+                p = select_xbrl_tags.pick_best_instant(index, cand.qname, fy, subs, dbg, prefer_unit, tol_days + widen)
+                typ, bonus = "instant", 0.0
+            else:
+                res = select_xbrl_tags.pick_best_annual(index, cand.qname, fy, subs, dbg, prefer_unit, tol_days + widen)
+                typ, p = res if res else (None, None)
+                bonus = 0.012 if typ == "annual" else (-0.004 if typ == "ytd-q4" else -0.01)
+            if not p:
+                continue
+            score = cand.base_score + bonus + select_xbrl_tags.score_adj(p.get("form"), p.get("unit"), p.get("fp"),
+                                                                         bool(p.get("segment")), True) - (0.02 if widen else 0.0)
+            out = {"source_type": typ, "qname": cand.qname, "normalized_as": metric_name, "value": p["val"], "unit": p["unit"],
+                   "end": p["end"], "form": p["form"], "accn": p["accn"], "confidence": max(0, min(1, score))}
+            if best is None or score > best[0] or (math.isclose(score, best[0]) and out["end"] > (best[1]["end"] or "")):
+                best = (score, out)
+        if best:
+            break
+    return best[1] if best else {"source_type": "none", "reason": "no candidate matched"}
+
+
+def _random_facts(rng):
+    # 실제 후보 태그에 form/unit/fp/end가 섞인 레코드 (동점·넓힌 창에서만 잡히는 값 포함)
+    qnames = sorted({c.qname for lst in select_xbrl_tags.CANDIDATES.values() for c in lst})
+    taxonomies = {}
+    for qname in rng.sample(qnames, k=len(qnames) // 3):
+        prefix, local = qname.split(":", 1)
+        recs = []
+        for i in range(rng.randint(1, 4)):
+            y = rng.choice([2022, 2023, 2024])
+            end = f"{y}-{rng.choice(['12-31', '12-28', '09-30', '03-31'])}"
+            r = {"end": end, "start": f"{y - 1}-{end[5:]}", "val": rng.choice([1.0, 250.0, -3.5]),
+                 "fp": rng.choice(["FY", "Q4", "Q2", None]), "form": rng.choice(["10-K", "10-Q", "8-K", None]),
+                 "accn": f"{local}-{i}"}
+            if rng.random() < 0.3:
+                r["qtrs"] = 4
+            recs.append(r)
+        taxonomies.setdefault(prefix, {})[local] = {"units": {rng.choice(["USD", "USD", "EUR"]): recs}}
+    return {"facts": taxonomies}
+
+
+class TestCandidateSearch(unittest.TestCase):
+    def setUp(self):
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+
+    def _check(self, facts, subs, fys):
+        index = select_xbrl_tags.CompanyFactIndex(facts)
+        for metric in select_xbrl_tags.CANDIDATES:
+            for fy in fys:
+                for tol in (0, 90, 400):
+                    for sector in SECTORS:
+                        for instant, selector in ((False, select_xbrl_tags.select_base_duration),
+                                                  (True, select_xbrl_tags.select_base_instant)):
+                            with self.subTest(metric=metric, fy=fy, tol=tol, sector=sector, instant=instant):
+                                self.assertEqual(selector(index, fy, subs, self.dbg, metric, "USD", tol, sector),
+                                                 _exhaustive(facts, fy, subs, self.dbg, metric, "USD", tol, sector, instant))
+
+    def test_random_facts_match_exhaustive_search(self):
+        rng = random.Random(23)
+        for _ in range(4):
+            self._check(_random_facts(rng), {"fiscalYearEnd": rng.choice(["1231", "0930"]), "sic": "4911"}, (2023, 2024))
+
+    def test_exact_top_candidate_stops_search(self):
+        rec = {"end": "2024-12-31", "start": "2024-01-01", "val": 10.0, "fp": "FY", "form": "10-K", "accn": "a"}
+        facts = {"facts": {"us-gaap": {"RevenueFromContractWithCustomerExcludingAssessedTax": {"units": {"USD": [rec]}},
+                                       "Revenues": {"units": {"USD": [dict(rec, val=9.0)]}}}}}
+        with mock.patch.object(select_xbrl_tags, "pick_best_annual", wraps=select_xbrl_tags.pick_best_annual) as pick:
+            res = select_xbrl_tags.select_revenue(facts, 2024, {"fiscalYearEnd": "1231"}, self.dbg)
+        self.assertEqual((res["value"], pick.call_count), (10.0, 1))
+
+    def test_bounds(self):
+        cands, bounds = select_xbrl_tags.candidate_bounds("Revenue", "Other", 0.1)
+        self.assertTrue(all(c.industry_only is None for c in cands))
+        self.assertEqual(bounds[0], (cands[0].base_score + 0.1, max(c.base_score for c in cands) + 0.1))
+        self.assertEqual([b[1] for b in bounds], sorted((b[1] for b in bounds), reverse=True))
+
+    @unittest.skipUnless(glob.glob(os.path.join(CACHE_DIR, "**", "*.json*"), recursive=True), "no cached companyfacts")
+    def test_cached_companyfacts_match_exhaustive_search(self):
+        paths = sorted(glob.glob(os.path.join(CACHE_DIR, "**", "*.json*"), recursive=True))[:3]
+        for path in paths:
+            facts = select_xbrl_tags.prune_facts(select_xbrl_tags.load_json_file(path),
+                                                 select_xbrl_tags.resolve_facts_taxonomies("std"))
+            self._check(facts, {"fiscalYearEnd": "1231"}, (2023,))
+
+
+class TestPriorYearFallback(unittest.TestCase):
+    def setUp(self):
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+
+    def _all_tiers(self, index, fy, subs, metric, tol, period_type):
+        # 거리 가지치기 없이 모든 tolerance 단계를 차례로 시도하던 fallback
+        relaxed = select_xbrl_tags._pick_prior_year_relaxed
+        for cand in select_xbrl_tags.CANDIDATES[metric]:
+            if relaxed(index, cand.qname, fy, subs, self.dbg, "USD", period_type):
+                return None
+        selector = select_xbrl_tags.select_base_duration if period_type == "duration" else select_xbrl_tags.select_base_instant
+        for inc in select_xbrl_tags.PRIOR_TOL_INCREMENTS:
+            res = selector(index, fy - 1, subs, self.dbg, metric, "USD", tol + inc)
+            if res.get("source_type") != "none" and select_xbrl_tags.safe_float(res.get("value")) is not None:
+                return res
+        return {"source_type": "none", "reason": "no prior year data found"}
+
+    def test_matches_trying_every_tier(self):
+        rng = random.Random(24)
+        for _ in range(60):
+            facts = _random_facts(rng)
+            for recs in (u for tags in facts["facts"].values() for body in tags.values() for u in body["units"].values()):
+                for r in recs:
+                    r["end"] = f"{rng.randint(2016, 2027)}{r['end'][4:]}"
+            subs = {"fiscalYearEnd": rng.choice(["1231", "0630"]), "sic": rng.choice(["4911", "6022", ""])}
+            for fy in (2015, 2020, 2024, 2030):
+                for metric, tol, period_type in (("Revenue", 90, "duration"), ("CFO", 0, "duration"), ("Assets", 120, "instant")):
+                    expected = self._all_tiers(select_xbrl_tags.CompanyFactIndex(facts), fy, subs, metric, tol, period_type)
+                    if expected is None:
+                        continue
+                    got = select_xbrl_tags._select_prior_year_with_fallback(select_xbrl_tags.CompanyFactIndex(facts), fy, subs,
+                                                                            self.dbg, metric, "USD", tol, period_type)
+                    with self.subTest(fy=fy, metric=metric):
+                        self.assertEqual(got, expected)
+
+    def test_no_records_skips_selectors(self):
+        facts = {"facts": {"us-gaap": {"Revenues": {"units": {"USD": [
+            {"end": "2010-12-31", "val": 1.0, "fp": "FY", "form": "10-K", "accn": "old"}]}}}}}
+        index = select_xbrl_tags.CompanyFactIndex(facts)
+        subs = {"fiscalYearEnd": "1231"}
+        self.assertEqual(index.nearest_end_distance("us-gaap:Revenues", [date(2023, 12, 31).toordinal()]),
+                         date(2023, 12, 31).toordinal() - date(2010, 12, 31).toordinal())
+        self.assertIsNone(select_xbrl_tags.prior_year_reach(index, 2024, subs, "NetIncome"))
+        with mock.patch.object(select_xbrl_tags, "select_base_duration") as selector:
+            res = select_xbrl_tags._select_prior_year_with_fallback(index, 2024, subs, self.dbg, "Revenue")
+        self.assertEqual(res["source_type"], "none")
+        selector.assert_not_called()
+
+    def test_reachable_records_in_other_unit_fp_segment_need_one_selector_call(self):
+        # 선호 unit이 아니고 fp/form이 없고 segment가 붙은 레코드도 가장 넓은 단계에서만 닿으면 그 단계 한 번으로 끝남
+        rec = {"end": "2021-12-31", "start": "2021-01-01", "val": 7.0, "accn": "far", "segment": {"axis": "x"}}
+        facts = {"facts": {"us-gaap": {"Revenues": {"units": {"EUR": [rec]}},
+                                       "Assets": {"units": {"EUR": [dict(rec, start=None)]}}}}}
+        index = select_xbrl_tags.CompanyFactIndex(facts)
+        subs = {"fiscalYearEnd": "1231"}
+        for metric, period_type, name in (("Revenue", "duration", "select_base_duration"),
+                                          ("Assets", "instant", "select_base_instant")):
+            with self.subTest(metric=metric), \
+                    mock.patch.object(select_xbrl_tags, name, wraps=getattr(select_xbrl_tags, name)) as selector:
+                res = select_xbrl_tags._select_prior_year_with_fallback(index, 2024, subs, self.dbg, metric,
+                                                                        "USD", 90, period_type)
+                self.assertEqual((res["value"], res["unit"]), (7.0, "EUR"))
+                self.assertEqual(selector.call_count, 1)
+                self.assertEqual(selector.call_args[0][6], 90 + select_xbrl_tags.PRIOR_TOL_INCREMENTS[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
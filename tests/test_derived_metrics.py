@@ -0,0 +1,142 @@
+import unittest
+import sys
+import os
+import random
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import fact_record
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+def _facts():
+    def dur(v24, v23):
+        return {"units": {"USD": [fact_record(f"{y}-12-31", v, accn=f"acc-{y}-12-31", fy=y, start=f"{y}-01-01")
+                                  for y, v in ((2024, v24), (2023, v23))]}}
+
+    def inst(v24, v23):
+        return {"units": {"USD": [fact_record(f"{y}-12-31", v, accn=f"acc-{y}-12-31", fy=y)
+                                  for y, v in ((2024, v24), (2023, v23))]}}
+    return {"cik": 7, "facts": {"us-gaap": {
+        "Revenues": dur(1000.0, 800.0),
+        "GrossProfit": dur(400.0, 300.0),
+        "OperatingIncomeLoss": dur(200.0, 150.0),
+        "NetIncomeLoss": dur(120.0, 90.0),
+        "IncomeTaxExpenseBenefit": dur(40.0, 30.0),
+        "IncomeLossFromContinuingOperationsBeforeIncomeTaxesExtraordinaryItemsNoncontrollingInterest": dur(160.0, 120.0),
+        "StockholdersEquity": inst(600.0, 400.0),
+        "Assets": inst(2000.0, 1800.0),
+        "LongTermDebt": inst(300.0, 300.0),
+        "CashAndCashEquivalentsAtCarryingValue": inst(100.0, 80.0),
+    }}}
+
+
+class TestDerivedMetricGraph(unittest.TestCase):
+    def setUp(self):
+        self.subs = {"fiscalYearEnd": "1231", "sic": "3571"}
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+
+    def test_eval_order_respects_dependencies(self):
+        order = [f.metric for f in select_xbrl_tags.derived_eval_order()]
+        self.assertEqual(sorted(order), sorted(f.metric for f in select_xbrl_tags.DERIVED_FORMULAS))
+        self.assertLess(order.index("EBITDA"), order.index("EBITDAMargin"))
+        self.assertLess(order.index("NOPAT"), order.index("InvestedCapital"))
+        self.assertLess(order.index("InvestedCapital"), order.index("ROIC"))
+
+    def test_eval_order_rejects_cycles_and_unknown_inputs(self):
+        F = select_xbrl_tags.DerivedFormula
+        cyclic = (F("A", ("B",), abs, "x", ("Revenue",), "", 0.5), F("B", ("A",), abs, "x", ("Revenue",), "", 0.5))
+        with self.assertRaises(ValueError):
+            select_xbrl_tags.derived_eval_order(cyclic)
+        with self.assertRaises(ValueError):
+            select_xbrl_tags.derived_eval_order((F("A", ("Nope",), abs, "x", ("Revenue",), "", 0.5),))
+
+    def test_plan_selects_only_needed_inputs(self):
+        formulas, inputs = select_xbrl_tags.derived_plan(["GrossMargin"])
+        self.assertEqual([f.metric for f in formulas], ["GrossMargin"])
+        self.assertEqual(sorted(inputs), ["GrossProfit", "Revenue"])
+        formulas, inputs = select_xbrl_tags.derived_plan(["ROIC"])
+        self.assertEqual([f.metric for f in formulas], ["NOPAT", "InvestedCapital", "ROIC"])
+        self.assertEqual(sorted(inputs), ["Cash", "Equity", "IncomeTaxExpense", "LongTermDebt", "OperatingIncome",
+                                          "PreTaxIncome", "ShortTermDebt"])
+
+    def test_evaluate_columns_of_companies(self):
+        formulas, _ = select_xbrl_tags.derived_plan(["EBITDAMargin", "InterestCoverage"])
+        cols = select_xbrl_tags.evaluate_derived({
+            "OperatingIncome": [10.0, None, None], "DepAmort": [5.0, 2.0, None], "Revenue": [100.0, 50.0, 0.0],
+            "NetIncome": [8.0, 6.0, 1.0], "InterestExpense": [2.0, 4.0, 0.0]}, formulas)
+        self.assertEqual(cols["EBITDA"], [15.0, None, None])
+        self.assertEqual(cols["EBITDAMargin"], [0.15, None, None])
+        self.assertEqual(cols["InterestCoverage"], [5.0, 2.0, None])
+
+    def test_compute_other_derived_rows(self):
+        index = select_xbrl_tags.CompanyFactIndex(_facts())
+        rows = {r[0]: r for r in select_xbrl_tags.compute_other_derived(index, 2024, self.subs, self.dbg)}
+        # 전년도 잔액은 선택기가 고른 값 그대로 (fy-1 앵커 창은 fy 말일도 포함)
+        eq1 = select_xbrl_tags.select_equity(index, 2023, self.subs, self.dbg, "USD", 120)["value"]
+        assets1 = select_xbrl_tags.select_assets(index, 2023, self.subs, self.dbg, "USD", 180)["value"]
+        self.assertAlmostEqual(rows["GrossMargin"][1], 0.4)
+        self.assertAlmostEqual(rows["ROE"][1], 120.0 / ((600.0 + eq1) / 2))
+        self.assertAlmostEqual(rows["AssetTurnover"][1], 1000.0 / ((2000.0 + assets1) / 2))
+        self.assertAlmostEqual(rows["NOPAT"][1], 200.0 * (1 - 0.25))
+        self.assertAlmostEqual(rows["InvestedCapital"][1], 300.0 + 600.0 - 100.0)
+        self.assertAlmostEqual(rows["ROIC"][1], 150.0 / 800.0)
+        self.assertEqual(rows["ROE"][2:6], ("ratio", "2024-12-31", "10-K", "acc-2024-12-31"))
+        self.assertNotIn("CurrentRatio", rows)
+        # 일부만 요청하면 그 메트릭만 (의존하는 NOPAT/InvestedCapital은 계산만 하고 출력하지 않음)
+        only = select_xbrl_tags.compute_other_derived(index, 2024, self.subs, self.dbg, metrics=["ROIC"])
+        self.assertEqual(only, [rows["ROIC"]])
+
+
+class TestDerivedBatch(unittest.TestCase):
+    def setUp(self):
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+        self.subs = {"fiscalYearEnd": "1231", "sic": "3571"}
+        self.opts = select_xbrl_tags.ExtractOptions(fy=2024, years=(2023, 2024))
+
+    def _companies(self):
+        # 입력 일부가 빠지거나 0인 기업들
+        out = []
+        for i, drop in enumerate((None, "Revenues", "StockholdersEquity", "IncomeTaxExpenseBenefit", "Assets")):
+            facts = _facts()
+            if drop:
+                del facts["facts"]["us-gaap"][drop]
+            if i == 4:
+                facts["facts"]["us-gaap"]["OperatingIncomeLoss"]["units"]["USD"][0]["val"] = 0.0
+            out.append(({"cik": f"{i:010d}", "symbol": f"C{i}", "name": f"Company {i}"}, facts))
+        return out
+
+    def _batch_rows(self):
+        pending, rows = [], []
+        for meta, facts in self._companies():
+            rows.append(select_xbrl_tags.extract_company(meta, facts, self.subs, self.opts, self.dbg, pending)[1])
+        self.assertEqual(len(pending), 10)
+        select_xbrl_tags.evaluate_pending_derived(pending)
+        return rows
+
+    def test_batch_rows_match_per_company_rows(self):
+        expected = [select_xbrl_tags.extract_company(meta, facts, self.subs, self.opts, self.dbg)[1]
+                    for meta, facts in self._companies()]
+        self.assertTrue(any(r.metric == "ROIC" for r in expected[0]))
+        self.assertEqual(self._batch_rows(), expected)
+        with mock.patch.object(select_xbrl_tags, "np", None):
+            self.assertEqual(self._batch_rows(), expected)
+
+    @unittest.skipIf(select_xbrl_tags.np is None, "numpy not installed")
+    def test_array_formulas_match_scalar_formulas(self):
+        np = select_xbrl_tags.np
+        rng = random.Random(3)
+        formulas, names = select_xbrl_tags.derived_plan()
+        columns = {n: [rng.choice([None, 0.0, -5.0, 2.5, rng.uniform(-100, 100)]) for _ in range(500)] for n in names}
+        scalar = select_xbrl_tags.evaluate_derived(columns, formulas)
+        arrays = select_xbrl_tags.evaluate_derived_batch(
+            {n: np.array([np.nan if v is None else v for v in col]) for n, col in columns.items()}, formulas)
+        for f in formulas:
+            got = [None if np.isnan(v) else v for v in arrays[f.metric].tolist()]
+            self.assertEqual(got, scalar[f.metric], msg=f.metric)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import sys
+import os
+import re
+from datetime import date, datetime
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import fact_record as _rec
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+class TestCompanyFactIndex(unittest.TestCase):
+    def setUp(self):
+        self.facts = {
+            "cik": 320193,
+            "facts": {
+                "us-gaap": {
+                    "Revenues": {"units": {
+                        "EUR": [_rec("2024-09-28", 9.0, accn="eur")],
+                        "USD": [
+                            _rec("2024-06-29", 1.0, fp="Q3", form="10-Q", accn="q3"),
+                            _rec("2024-09-28", 2.0, accn="fy24"),
+                            _rec("2024-09-28", 3.0, accn="fy24-dup"),
+                            _rec("09/30/2023", 4.0, accn="fy23"),
+                            _rec("2022-09-24", "n/a", accn="bad"),
+                            {"val": 5.0, "fp": "FY", "form": "10-K", "accn": "no-end"},
+                        ],
+                    }},
+                    "Assets": {"units": {"USD": [
+                        _rec("2023-09-30", 10.0, fp="Q4", accn="a23", qtrs=4),
+                        _rec("2024-09-28", 11.0, fp="Q4", accn="a24", qtrs=4),
+                    ]}},
+                }
+            },
+        }
+        self.subs = {"fiscalYearEnd": "0928"}
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+
+    def test_index_drops_unusable_records_and_sorts_by_end(self):
+        index = select_xbrl_tags.CompanyFactIndex(self.facts)
+        ords, recs = index.concept("us-gaap:Revenues")["USD"]
+        self.assertEqual(ords, sorted(ords))
+        self.assertEqual([r.accn for r in recs], ["fy23", "q3", "fy24", "fy24-dup"])
+
+    def test_smart_pick_indexed_matches_smart_pick(self):
+        index = select_xbrl_tags.CompanyFactIndex(self.facts)
+        for qname in ("us-gaap:Revenues", "us-gaap:Assets"):
+            unit_map = select_xbrl_tags.get_unit_records(self.facts, qname)
+            order = ["USD"] + [u for u in unit_map if u != "USD"]
+            pool = [r for u in order for r in unit_map[u] if isinstance(r.get("val"), (int, float))]
+            for fy in (2023, 2024):
+                anchors = select_xbrl_tags.anchors_for_fy(fy, self.subs)
+                for tol in (0, 30, 90, 400):
+                    expected = select_xbrl_tags.smart_pick(pool, anchors, tol, self.dbg)
+                    got = select_xbrl_tags.smart_pick_indexed(index, qname, anchors, tol, "USD")
+                    if expected is None:
+                        self.assertIsNone(got)
+                    else:
+                        self.assertEqual((got.accn, got.val), (expected["accn"], expected["val"]))
+
+    def test_pick_best_annual_keeps_first_record_on_tie(self):
+        res = select_xbrl_tags.pick_best_annual(self.facts, "us-gaap:Revenues", 2024, self.subs, self.dbg, "USD", 90)
+        self.assertEqual(res[0], "annual")
+        self.assertEqual(res[1]["accn"], "fy24")
+        self.assertEqual(res[1]["unit"], "USD")
+
+    def test_selection_cache_shared_across_selectors(self):
+        index = select_xbrl_tags.CompanyFactIndex(self.facts)
+        first = select_xbrl_tags.select_revenue(index, 2024, self.subs, self.dbg)
+        again = select_xbrl_tags.select_base_duration(index, 2024, self.subs, self.dbg, "Revenue", "USD", 90)
+        self.assertIs(first, again)
+        self.assertEqual((index.selection_hits, index.selection_misses), (1, 1))
+        select_xbrl_tags.select_revenue(index, 2024, self.subs, self.dbg, tol_days=120)
+        self.assertEqual(index.selection_misses, 2)
+
+    def test_pick_best_annual_falls_back_to_qtrs4(self):
+        res = select_xbrl_tags.pick_best_annual(self.facts, "us-gaap:Assets", 2024, self.subs, self.dbg, "USD", 90)
+        self.assertEqual(res[0], "ytd-q4")
+        self.assertEqual(res[1]["fp"], "FY")
+        self.assertEqual(res[1]["accn"], "a24")
+
+    def test_direct_growth_candidates_match_per_pattern_search(self):
+        tags = ["RevenueGrowthPercent", "YoYRevenueRate", "ChangeInRevenue", "RevenueTaxChangeRate",
+                "ChangeInNetIncomeLoss", "NetIncomeLossIncreasePercentage", "IncomeTaxRateChangePercent",
+                "CashFlowFromOperatingActivitiesGrowthRate", "AssetsIncreaseYearOverYear", "ChangeInAssets",
+                "Revenues", "EffectiveIncomeTaxRateReconciliationChange", "revenuegrowthrate"]
+        facts = {"facts": {"us-gaap": {t: {"units": {}} for t in tags}, "abc": {"ChangeInAssets": {"units": {}}}}}
+        index = select_xbrl_tags.CompanyFactIndex(facts)
+        qnames = list(index.qnames())
+        for metric, pats in select_xbrl_tags._DIRECT_GROWTH_PATS.items():
+            expected = [qn for qn in qnames
+                        if any(re.search(rx, qn, re.IGNORECASE) for rx in pats)
+                        and not any(b.upper() in qn.upper() for b in select_xbrl_tags._DIRECT_GROWTH_BLACKLIST)]
+            self.assertEqual(select_xbrl_tags._mine_direct_growth_candidates(index, metric), expected, msg=metric)
+        self.assertIn("abc:ChangeInAssets", index.direct_growth_candidates()["AssetGrowthRate"])
+        self.assertIs(index.direct_growth_candidates(), index.direct_growth_candidates())
+
+
+class TestDateParsing(unittest.TestCase):
+    def test_parse_date_matches_strptime_formats(self):
+        def reference(s):
+            for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y"):
+                try:
+                    return datetime.strptime(s, fmt).date()
+                except Exception:
+                    pass
+            return None
+        for s in ("2024-09-28", "2024-9-28", "20240928", "2024-W39-6", "2024-02-30", "2024-09-28T00:00:00",
+                  "09/28/2024", "2024/09/28", " 2024-09-28", "\uff12\uff10\uff12\uff14-\uff10\uff19-\uff12\uff18", "0000-01-01"):
+            self.assertEqual(select_xbrl_tags.parse_date(s), reference(s), msg=s)
+            self.assertEqual(select_xbrl_tags.parse_date(s), reference(s), msg=s)
+        for s in ("", None, 20240928):
+            self.assertIsNone(select_xbrl_tags.parse_date(s))
+
+    def test_same_string_shares_date(self):
+        a = select_xbrl_tags.parse_date("".join(["2023-", "06-30"]))
+        self.assertIs(select_xbrl_tags.parse_date("2023-06-30"), a)
+
+    def test_anchors_cached_per_fiscal_year_end(self):
+        subs = {"fiscalYearEnd": "0928"}
+        anchors = select_xbrl_tags.anchors_for_fy(2024, subs)
+        self.assertEqual(anchors, [date(2024, 9, 28), date(2025, 9, 28)])
+        anchors.append(None)
+        self.assertEqual(select_xbrl_tags.anchors_for_fy(2024, subs), [date(2024, 9, 28), date(2025, 9, 28)])
+        self.assertEqual(select_xbrl_tags.anchors_for_fy(2024, {"fiscalYearEnd": "bad"}), [date(2024, 12, 31), date(2025, 12, 31)])
+
+
+if __name__ == '__main__':
+    unittest.main()
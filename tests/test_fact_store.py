@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import fact_record
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+def _rec(end, val, **fields):
+    return fact_record(end, val, start="2023-10-01", filed="2024-11-01", fy=2024, **fields)
+
+
+FACTS = {
+    "cik": 320193,
+    "entityName": "Apple Inc.",
+    "facts": {
+        "us-gaap": {
+            "Revenues": {"units": {
+                "EUR": [_rec("2024-09-28", 9.0, accn="eur")],
+                "USD": [
+                    _rec("2024-06-29", 1.0, fp="Q3", form="10-Q", accn="q3"),
+                    _rec("2024-09-28", 2, accn="fy24"),
+                    _rec("2024-09-28", 3.0, accn="fy24-dup", segment={"axis": "x"}),
+                    _rec("09/30/2023", 4.0, accn="fy23"),
+                    _rec("2022-09-24", "n/a", accn="bad"),
+                ],
+            }},
+            "Assets": {"units": {"USD": [
+                _rec("2023-09-30", 10.0, fp="Q4", accn="a23", qtrs=4),
+                _rec("2024-09-28", 11.0, fp=None, accn="a24", qtrs=4),
+            ]}},
+            "Empty": {"units": {"USD": []}},
+        },
+        "dei": {},
+    },
+}
+
+FIELDS = ("unit", "pos", "end", "end_ord", "val", "fp", "is_annual", "qtrs", "form", "accn", "segment")
+
+
+@unittest.skipIf(select_xbrl_tags.np is None, "numpy not installed")
+class TestColumnarFactStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = select_xbrl_tags.FactColumnStore(self.tmp.name)
+        self.columnar = self.store.ingest("CIK0000320193", FACTS, "sig-1")
+        self.dict_index = select_xbrl_tags.CompanyFactIndex(FACTS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _fields(self, pairs):
+        return [(rank, tuple(getattr(r, f) for f in FIELDS)) for rank, r in pairs]
+
+    def test_matches_dict_index(self):
+        self.assertEqual(list(self.columnar.qnames()), list(self.dict_index.qnames()))
+        for qname in ("us-gaap:Revenues", "us-gaap:Assets", "us-gaap:Empty", "us-gaap:Missing"):
+            self.assertEqual(self.columnar.has_concept(qname), self.dict_index.has_concept(qname), qname)
+            for unit in ("USD", "EUR"):
+                for lo, hi in ((0, 10 ** 6), (738700, 739200), (739000, 739000)):
+                    self.assertEqual(self._fields(self.columnar.window(qname, unit, lo, hi)),
+                                     self._fields(self.dict_index.window(qname, unit, lo, hi)))
+        self.assertEqual(self.columnar.raw, {"cik": 320193, "entityName": "Apple Inc."})
+
+    def test_selectors_agree(self):
+        subs = {"fiscalYearEnd": "0928"}
+        dbg = select_xbrl_tags.Debugger(enabled=False)
+        for fy in (2023, 2024):
+            for qname in ("us-gaap:Revenues", "us-gaap:Assets"):
+                self.assertEqual(select_xbrl_tags.pick_best_annual(self.columnar, qname, fy, subs, dbg),
+                                 select_xbrl_tags.pick_best_annual(self.dict_index, qname, fy, subs, dbg))
+
+    def test_open_requires_matching_source(self):
+        self.assertIsNotNone(self.store.open("CIK0000320193", "sig-1"))
+        self.assertIsNone(self.store.open("CIK0000320193", "sig-2"))
+        self.assertIsNone(self.store.open("CIK0000000001", "sig-1"))
+        # 다시 적재하면 디렉터리가 통째로 교체됨
+        self.store.ingest("CIK0000320193", {"cik": 320193, "facts": {}}, "sig-2")
+        self.assertEqual(list(self.store.open("CIK0000320193", "sig-2").qnames()), [])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["CIK0000320193"])
+
+
+if __name__ == '__main__':
+    unittest.main()
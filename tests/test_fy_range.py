@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import csv
+import json
+import pathlib
+import tempfile
+from dataclasses import replace
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import company_facts
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+def _facts(cik):
+    return company_facts(cik, {"Revenues": 1000.0 * cik, "NetIncomeLoss": 100.0 * cik, "Assets": 5000.0 * cik,
+                               "StockholdersEquity": 2000.0 * cik,
+                               "NetCashProvidedByUsedInOperatingActivities": 150.0 * cik}, years=range(2018, 2025))
+
+
+class TestMultiYearExtraction(unittest.TestCase):
+    def test_one_pass_matches_separate_years(self):
+        dbg = select_xbrl_tags.Debugger(enabled=False)
+        meta = {"cik": "0000000007", "symbol": "SEVN", "name": "Company 7"}
+        subs = {"fiscalYearEnd": "1231", "sic": "3571"}
+        opts = select_xbrl_tags.ExtractOptions(fy=2024)
+        company, rows = select_xbrl_tags.extract_company(meta, _facts(7), subs, replace(opts, years=(2024, 2022, 2023)), dbg)
+        expected = []
+        for fy in (2022, 2023, 2024):
+            expected_company, year_rows = select_xbrl_tags.extract_company(meta, _facts(7), subs, replace(opts, fy=fy), dbg)
+            self.assertEqual(company, expected_company)
+            expected.extend(year_rows)
+        self.assertEqual(rows, expected)
+        self.assertIn("RevenueGrowthYoY", {r.metric for r in rows if r.fy == "2022"})
+
+    def test_parse_fy_range(self):
+        self.assertEqual(select_xbrl_tags.parse_fy_range("2015-2018"), (2015, 2016, 2017, 2018))
+        self.assertEqual(select_xbrl_tags.parse_fy_range("2024"), (2024,))
+        for bad in ("2024-2020", "15-18", ""):
+            with self.assertRaises(ValueError):
+                select_xbrl_tags.parse_fy_range(bad)
+
+    def test_output_path(self):
+        out = select_xbrl_tags.output_path
+        self.assertEqual(out(None, "data/tags_{fy}.csv", 2023, True), pathlib.Path("data/tags_2023.csv"))
+        self.assertEqual(out("out/t_{fy}.csv", None, "2015-2024", False), pathlib.Path("out/t_2015-2024.csv"))
+        self.assertEqual(out("out/tags.csv", None, 2023, True), pathlib.Path("out/tags_2023.csv"))
+        self.assertEqual(out("out/tags.csv", None, 2023, False), pathlib.Path("out/tags.csv"))
+        self.assertIsNone(out(None, None, 2023, True))
+
+
+class TestFyRangeCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.facts_dir = os.path.join(self.tmp.name, "facts")
+        os.makedirs(self.facts_dir)
+        for cik in (1, 2, 3):
+            with open(os.path.join(self.facts_dir, f"CIK{cik:010d}.json"), "w", encoding="utf-8") as f:
+                json.dump(_facts(cik), f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, out, *extra):
+        argv = ["select_xbrl_tags.py", "--facts-dir", self.facts_dir, "--subs-cache-dir", os.path.join(self.tmp.name, "subs"),
+                "--out-tags", os.path.join(out, "tags.csv"), "--out-companies", os.path.join(out, "companies.csv"),
+                "--out-benchmarks", os.path.join(out, "benchmarks.csv"), "--out-rankings", os.path.join(out, "rankings.csv"),
+                "--out-wide", os.path.join(out, "wide.csv"), "--emit-ttl", os.path.join(out, "inst.ttl")] + list(extra)
+        with mock.patch.object(sys, "argv", argv), mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            select_xbrl_tags.main()
+
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_per_year_outputs_match_single_year_runs(self):
+        per_year = os.path.join(self.tmp.name, "range")
+        self._run(per_year, "--fy-range", "2022-2023")
+        for fy in (2022, 2023):
+            single = os.path.join(self.tmp.name, str(fy))
+            self._run(single, "--fy", str(fy))
+            for name in ("tags", "companies", "benchmarks", "rankings", "wide"):
+                self.assertEqual(self._read(os.path.join(per_year, f"{name}_{fy}.csv")),
+                                 self._read(os.path.join(single, f"{name}.csv")), msg=(fy, name))
+            self.assertEqual(self._read(os.path.join(per_year, f"inst_{fy}.ttl")), self._read(os.path.join(single, "inst.ttl")))
+
+    def test_combined_outputs(self):
+        out = os.path.join(self.tmp.name, "combined")
+        self._run(out, "--fy-range", "2022-2023", "--fy-output", "combined")
+        with open(os.path.join(out, "tags.csv"), encoding="utf-8") as f:
+            self.assertEqual({row["fy"] for row in csv.DictReader(f)}, {"2022", "2023"})
+        with open(os.path.join(out, "rankings.csv"), encoding="utf-8") as f:
+            self.assertEqual({row["fy"] for row in csv.DictReader(f)}, {"2022", "2023"})
+        self.assertTrue(os.path.exists(os.path.join(out, "wide_2022.csv")))
+        ttl = self._read(os.path.join(out, "inst.ttl"))
+        self.assertIn("efin:forFiscalYear 2022", ttl)
+        self.assertIn("efin:forFiscalYear 2023", ttl)
+
+    def test_combined_nquads_use_one_graph_per_year(self):
+        per_year = os.path.join(self.tmp.name, "range_nq")
+        combined = os.path.join(self.tmp.name, "combined_nq")
+        self._run(per_year, "--fy-range", "2022-2023", "--emit-format", "nq")
+        self._run(combined, "--fy-range", "2022-2023", "--fy-output", "combined", "--emit-format", "nq")
+        quads = self._read(os.path.join(combined, "inst.ttl")).splitlines()
+        self.assertEqual({q.rsplit(" ", 2)[1] for q in quads},
+                         {select_xbrl_tags.default_emit_graph(2022), select_xbrl_tags.default_emit_graph(2023)})
+        expected = set()
+        for fy in (2022, 2023):
+            expected |= set(self._read(os.path.join(per_year, f"inst_{fy}.ttl")).splitlines())
+        self.assertEqual(set(quads), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
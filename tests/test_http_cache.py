@@ -0,0 +1,198 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import pathlib
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+class _ETagHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        srv = self.server
+        srv.requests.append(dict(self.headers))
+        if self.path.endswith("/always-throttled"):
+            self.send_response(429)
+            self.send_header("Retry-After", "0.5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == srv.etag:
+            self.send_response(304)
+            self.send_header("ETag", srv.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(srv.payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", srv.etag)
+        self.send_header("Last-Modified", "Wed, 21 Oct 2015 07:28:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        select_xbrl_tags.configure_cache(None)
+
+    def test_put_is_content_addressed_and_compressed(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        p1 = store.put("CIK0000000001", {"a": 1})
+        p2 = store.put("CIK0000000002", {"a": 1})
+        self.assertEqual(p1, p2)
+        self.assertTrue(p1.name.endswith(".json.gz"))
+        self.assertEqual(select_xbrl_tags.load_json_file(p1), {"a": 1})
+        # 내용이 바뀌면 새 객체를 쓰고, 아무도 참조하지 않는 이전 객체는 지움
+        store.put("CIK0000000001", {"a": 2})
+        store.put("CIK0000000002", {"a": 3})
+        self.assertFalse(p1.exists())
+        self.assertEqual(sorted(f.name for f in self.dir.rglob("*.tmp")), [])
+        # manifest는 새 인스턴스에서도 그대로 읽힘
+        again = select_xbrl_tags.CacheStore(self.dir)
+        self.assertEqual(again.read("CIK0000000002"), {"a": 3})
+
+    def test_writes_are_journaled_and_compacted(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        store.COMPACT_MIN_LINES = 8
+        for i in range(20):
+            store.put(f"k{i}", {"i": i})
+        # 줄 수가 항목 수를 넘기 전까지는 journal에만 덧붙이고 manifest.json은 쓰지 않음
+        self.assertFalse((self.dir / store.MANIFEST).exists())
+        again = select_xbrl_tags.CacheStore(self.dir)
+        self.assertEqual([again.read(f"k{i}") for i in range(20)], [{"i": i} for i in range(20)])
+        # 21번째 줄(touch)에서 합침
+        store.touch("k3")
+        self.assertFalse((self.dir / store.JOURNAL).exists())
+        with open(self.dir / store.MANIFEST, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["entries"]), 20)
+        store.touch("k4")
+        store.flush()
+        self.assertFalse((self.dir / store.JOURNAL).exists())
+        again = select_xbrl_tags.CacheStore(self.dir)
+        self.assertEqual(again.entry("k4")["checked_at"], store.entry("k4")["checked_at"])
+
+    def test_torn_journal_line_is_ignored(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        store.put("a", {"a": 1})
+        with open(self.dir / store.JOURNAL, "a", encoding="utf-8") as f:
+            f.write('["b", {"obj')
+        again = select_xbrl_tags.CacheStore(self.dir)
+        again.put("c", {"c": 1})
+        fresh = select_xbrl_tags.CacheStore(self.dir)
+        self.assertEqual((fresh.read("a"), fresh.entry("b"), fresh.read("c")), ({"a": 1}, None, {"c": 1}))
+
+    def test_concurrent_puts_keep_shared_objects(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+
+        def worker(n):
+            for i in range(50):
+                store.put(f"k{n}", {"v": (i + n) % 3})
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for n in range(6):
+            self.assertTrue(store.path(f"k{n}").exists(), msg=n)
+
+    def test_freshness_follows_ttl_not_calendar_date(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        store.put("k", {"a": 1})
+        self.assertIsNotNone(store.lookup("k"))
+        store.entry("k")["checked_at"] -= 2 * 3600
+        select_xbrl_tags.configure_cache(1)
+        self.assertIsNone(store.lookup("k"))
+        self.assertIsNotNone(store.path("k"))
+        self.assertTrue(store.touch("k"))
+        self.assertIsNotNone(store.lookup("k"))
+
+    def test_imports_legacy_date_stamped_files(self):
+        legacy = self.dir / "submissions_CIK0000000001_20240101.json"
+        legacy.write_text(json.dumps({"sic": "1234"}))
+        (self.dir / "submissions_CIK0000000001_20240101.json.validators").write_text(json.dumps({"etag": '"x"'}))
+        store = select_xbrl_tags.CacheStore(self.dir, legacy_prefix="submissions_")
+        self.assertEqual(store.read("CIK0000000001"), {"sic": "1234"})
+        self.assertEqual(store.conditional_headers("CIK0000000001"), {"If-None-Match": '"x"'})
+        self.assertFalse(legacy.exists())
+
+
+@unittest.skipIf(select_xbrl_tags.requests is None, "requests not installed")
+class TestConditionalCache(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ETagHandler)
+        self.server.requests = []
+        self.server.etag = '"v1"'
+        self.server.payload = {"cik": 1, "facts": {}}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/CIK0000000001.json"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_unchanged_file_is_revalidated_with_304(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        data = select_xbrl_tags.refresh_cached_json(store, "CIK0000000001", self.url, None, None)
+        self.assertEqual(data, self.server.payload)
+        self.assertEqual(store.entry("CIK0000000001")["etag"], '"v1"')
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+
+        checked = store.entry("CIK0000000001")["checked_at"]
+        self.assertIsNone(select_xbrl_tags.refresh_cached_json(store, "CIK0000000001", self.url, None, None))
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+        self.assertEqual(self.server.requests[1]["If-Modified-Since"], "Wed, 21 Oct 2015 07:28:00 GMT")
+        # 304면 내용은 그대로, checked_at만 갱신
+        self.assertGreaterEqual(store.entry("CIK0000000001")["checked_at"], checked)
+        self.assertEqual(store.read("CIK0000000001"), self.server.payload)
+
+    def test_changed_file_is_downloaded_again(self):
+        store = select_xbrl_tags.CacheStore(self.dir)
+        select_xbrl_tags.refresh_cached_json(store, "CIK0000000001", self.url, None, None)
+        self.server.etag = '"v2"'
+        self.server.payload = {"cik": 1, "facts": {"us-gaap": {}}}
+        data = select_xbrl_tags.refresh_cached_json(store, "CIK0000000001", self.url, None, None)
+        self.assertEqual(data, self.server.payload)
+        self.assertEqual(store.entry("CIK0000000001")["etag"], '"v2"')
+        self.assertEqual(store.read("CIK0000000001"), self.server.payload)
+
+
+    def test_last_attempt_fails_without_waiting(self):
+        # 경로에 sec.gov가 있으면 SEC 요청으로 취급: 시도마다 토큰을 받고, 마지막 429 뒤에는 기다리지 않음
+        url = self.url.rsplit("/", 1)[0] + "/sec.gov/always-throttled"
+        with mock.patch.object(select_xbrl_tags, "wait_for_rate_limit") as bucket, mock.patch("sys.stderr"):
+            t0 = time.monotonic()
+            with self.assertRaises(RuntimeError):
+                select_xbrl_tags.http_get(url, ua="Test/1.0 test@example.com", max_retries=2)
+            elapsed = time.monotonic() - t0
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(bucket.call_count, 2)
+        # 두 번 시도하고 기다림은 한 번(0.5s)만
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os
+import gzip
+import json
+import tempfile
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+FACTS = {
+    "cik": 320193,
+    "entityName": "Apple Inc.",
+    "facts": {
+        "dei": {"EntityCommonStockSharesOutstanding": {"units": {"shares": [{"end": "2024-10-18", "val": 15115823000}]}}},
+        "us-gaap": {"Revenues": {"label": "Revenues", "units": {"USD": [
+            {"end": "2024-09-28", "val": 391035000000, "fp": "FY", "form": "10-K"},
+            {"end": "2024-06-29", "val": 85777000000.5, "fp": "Q3", "form": "10-Q"},
+        ]}}},
+        "invest": {"InvestmentOwnedBalanceShares": {"units": {"shares": [{"end": "2024-09-28", "val": 1}]}}},
+    },
+}
+
+
+class TestJsonDecoders(unittest.TestCase):
+    def setUp(self):
+        self.raw = json.dumps(FACTS).encode("utf-8")
+
+    def test_all_available_decoders_agree(self):
+        for name in select_xbrl_tags.available_json_decoders():
+            with self.subTest(decoder=name):
+                self.assertEqual(select_xbrl_tags.decode_json(self.raw, decoder=name), FACTS)
+
+    def test_taxonomy_filter_keeps_only_requested_subtrees(self):
+        keep = select_xbrl_tags.resolve_facts_taxonomies("std")
+        self.assertIn("us-gaap", keep)
+        self.assertNotIn("invest", keep)
+        for name in select_xbrl_tags.available_json_decoders():
+            with self.subTest(decoder=name):
+                out = select_xbrl_tags.decode_facts_json(self.raw, keep, decoder=name)
+                self.assertEqual(sorted(out["facts"]), ["dei", "us-gaap"])
+                self.assertEqual(out["facts"]["us-gaap"], FACTS["facts"]["us-gaap"])
+                self.assertEqual(out["entityName"], "Apple Inc.")
+
+    def test_std_keeps_filer_extension_taxonomy(self):
+        facts = json.loads(self.raw)
+        facts["facts"]["aapl"] = {"RevenueGrowthYearOverYearPercent": {"units": {"pure": [
+            {"end": "2024-09-28", "start": "2023-10-01", "val": 5.0, "fp": "FY", "form": "10-K"}]}}}
+        raw = json.dumps(facts).encode("utf-8")
+        keep = select_xbrl_tags.resolve_facts_taxonomies("std")
+        for name in select_xbrl_tags.available_json_decoders():
+            with self.subTest(decoder=name):
+                out = select_xbrl_tags.decode_facts_json(raw, keep, decoder=name)
+                self.assertEqual(sorted(out["facts"]), ["aapl", "dei", "us-gaap"])
+                self.assertEqual(select_xbrl_tags.as_fact_index(out).direct_growth_candidates()["RevenueGrowthYoY"],
+                                 ["aapl:RevenueGrowthYearOverYearPercent"])
+        self.assertEqual(sorted(select_xbrl_tags.decode_facts_json(raw, frozenset({"us-gaap"}))["facts"]), ["us-gaap"])
+
+    def test_suggestion_taxonomies(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "sugg.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"cik": "1", "metric": "Revenue", "qname": "invest:Foo"}) + "\n\nnot json\n")
+                f.write(json.dumps({"cik": "1", "metric": "CFO", "qname": "us-gaap:Bar"}) + "\n")
+            self.assertEqual(select_xbrl_tags.suggestion_taxonomies(path), ["invest", "us-gaap"])
+        keep = select_xbrl_tags.resolve_facts_taxonomies(("std", "invest"))
+        self.assertEqual(sorted(select_xbrl_tags.decode_facts_json(self.raw, keep)["facts"]), ["dei", "invest", "us-gaap"])
+
+    def test_huge_integers_still_decode(self):
+        raw = b'{"val": 123456789012345678901234567890}'
+        for name in select_xbrl_tags.available_json_decoders():
+            with self.subTest(decoder=name):
+                val = select_xbrl_tags.decode_json(raw, decoder=name)["val"]
+                self.assertEqual(float(val), 1.2345678901234568e+29)
+
+    def test_load_json_file_reads_gzip_objects(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "obj.json.gz")
+            with open(path, "wb") as f:
+                f.write(gzip.compress(self.raw))
+            self.assertEqual(select_xbrl_tags.load_json_file(path), FACTS)
+
+    def test_unknown_decoder_is_rejected(self):
+        with self.assertRaises(RuntimeError):
+            select_xbrl_tags.configure_json("simdjson")
+
+
+if __name__ == '__main__':
+    unittest.main()
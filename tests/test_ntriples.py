@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import gzip
+import tempfile
+
+import rdflib
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+COMPANIES = [{"cik": "320193", "symbol": "AAPL", "name": "Apple \"Inc.\"", "sector": "Information Technology",
+              "industry": "Technology Hardware", "sic": "3571", "fye": "0930"}]
+OBSERVATIONS = [
+    {"cik": "320193", "fy": "2024", "metric": "Revenue", "end": "2024-09-28", "period_type": "duration",
+     "is_derived": "false", "unit": "USD", "value": "391035000000", "form": "10-K", "source_type": "annual",
+     "selected_tag": "us-gaap:Revenues", "computed_from": ""},
+    {"cik": "320193", "fy": "2024", "metric": "ROE", "end": "2024-09-28", "period_type": "duration",
+     "is_derived": "true", "unit": "", "value": "1.5", "form": "10-K", "source_type": "derived",
+     "selected_tag": "", "computed_from": "NetIncome,Equity"},
+]
+RANKINGS = [{"cik": "320193", "symbol": "AAPL", "industry": "", "sector": "", "metric": "ROE",
+             "ranking_type": "Top10", "rank": 1, "value": 1.5, "composite_score": None}]
+
+
+class TestNTriplesEmission(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _emit(self, name, **kw):
+        return select_xbrl_tags.emit_efin_ttl(COMPANIES, OBSERVATIONS, os.path.join(self.tmp.name, name),
+                                              rankings=RANKINGS, **kw)
+
+    def test_nt_has_same_triples_as_turtle(self):
+        ttl = rdflib.Graph().parse(self._emit("inst.ttl"), format="turtle")
+        nt_path = self._emit("inst.nt", fmt="nt")
+        nt = rdflib.Graph().parse(nt_path, format="nt")
+        self.assertEqual(len(nt), len(ttl))
+        self.assertEqual(set(nt), set(ttl))
+        # 트리플마다 정확히 한 줄
+        with open(nt_path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), len(ttl))
+
+    def test_nq_uses_named_graph_and_gzip(self):
+        graph = select_xbrl_tags.default_emit_graph(2024)
+        path = self._emit("inst.nq", fmt="nq", compress="gzip", graph=graph)
+        self.assertTrue(path.endswith(".nq.gz"))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = f.read()
+        ds = rdflib.Dataset().parse(data=data, format="nquads")
+        named = {str(g.identifier): len(g) for g in ds.graphs() if len(g)}
+        self.assertEqual(list(named), [graph[1:-1]])
+        with self.assertRaises(ValueError):
+            self._emit("nograph.nq", fmt="nq")
+
+    def test_term_conversion(self):
+        lines = ["@prefix ex: <http://example.org/> .", "", "ex:s a ex:C ;", "  ex:n 3 ;", "  ex:b true ;",
+                 '  ex:l "x\\"y"@en .', 'ex:s ex:d "2024"^^ex:T .']
+        self.assertEqual(list(select_xbrl_tags.iter_ntriples(lines)), [
+            "<http://example.org/s> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/C> .",
+            '<http://example.org/s> <http://example.org/n> "3"^^<http://www.w3.org/2001/XMLSchema#integer> .',
+            '<http://example.org/s> <http://example.org/b> "true"^^<http://www.w3.org/2001/XMLSchema#boolean> .',
+            '<http://example.org/s> <http://example.org/l> "x\\"y"@en .',
+            '<http://example.org/s> <http://example.org/d> "2024"^^<http://example.org/T> .',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
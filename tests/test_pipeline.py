@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import company_facts
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+class TestBoundedPipeline(unittest.TestCase):
+    def test_zip_bounded_limits_items_in_flight(self):
+        consumed = []
+        lock = threading.Lock()
+        state = {"live": 0, "peak": 0}
+
+        def source():
+            for i in range(20):
+                consumed.append(i)
+                yield i
+
+        def work(i):
+            with lock:
+                state["live"] += 1
+                state["peak"] = max(state["peak"], state["live"])
+            return i * 2
+
+        out = []
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            for item, result in select_xbrl_tags.zip_bounded(ex, work, source(), 3):
+                # 소비자가 결과를 받기 전에는 생산자가 depth개 이상 앞서가지 않음
+                self.assertLessEqual(len(consumed) - len(out), 3)
+                out.append((item, result))
+                with lock:
+                    state["live"] -= 1
+
+        self.assertEqual(sorted(out), [(i, i * 2) for i in range(20)])
+        self.assertLessEqual(state["peak"], 3)
+
+
+CONCEPTS = {"Revenues": 10.0, "NetIncomeLoss": 1.0, "Assets": 50.0, "StockholdersEquity": 20.0,
+            "LiabilitiesCurrent": 5.0, "AssetsCurrent": 8.0, "NetCashProvidedByUsedInOperatingActivities": 1.5}
+
+
+class TestWorkersCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.facts_dir = os.path.join(self.tmp.name, "facts")
+        os.makedirs(self.facts_dir)
+        for i, cik in enumerate((11, 22, 33, 44, 55)):
+            # 마지막 회사는 파일명에 CIK가 없어 워커 경로에서도 JSON의 cik를 읽어야 함
+            name = f"CIK{cik:010d}.json" if cik != 55 else "acme.json"
+            with open(os.path.join(self.facts_dir, name), "w", encoding="utf-8") as f:
+                json.dump(company_facts(cik, {c: scale * (100 + 37 * i) for c, scale in CONCEPTS.items()},
+                                          years=range(2021, 2025)), f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, out, *extra):
+        argv = ["select_xbrl_tags.py", "--fy", "2024", "--facts-dir", self.facts_dir,
+                "--subs-cache-dir", os.path.join(self.tmp.name, "subs"),
+                "--out-tags", os.path.join(out, "tags.csv"), "--out-companies", os.path.join(out, "companies.csv"),
+                "--out-benchmarks", os.path.join(out, "benchmarks.csv"), "--out-rankings", os.path.join(out, "rankings.csv"),
+                "--out-wide", os.path.join(out, "wide.csv"), "--emit-ttl", os.path.join(out, "inst.ttl")] + list(extra)
+        with mock.patch.object(sys, "argv", argv), mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            select_xbrl_tags.main()
+        outputs = {}
+        for name in ("tags.csv", "companies.csv", "benchmarks.csv", "rankings.csv", "wide.csv", "inst.ttl"):
+            with open(os.path.join(out, name), encoding="utf-8") as f:
+                outputs[name] = f.read()
+        return outputs
+
+    def test_parallel_workers_match_serial(self):
+        serial = self._run(os.path.join(self.tmp.name, "serial"))
+        self.assertIn("0000000055", serial["companies.csv"])
+        for extra in (("--workers", "2"), ("--workers", "2", "--derived-batch")):
+            with self.subTest(extra=extra):
+                parallel = self._run(os.path.join(self.tmp.name, "_".join(extra)), *extra)
+                for name, text in serial.items():
+                    self.assertEqual(parallel[name], text, msg=name)
+
+    def test_cik_from_facts_path_falls_back_to_json(self):
+        self.assertEqual(select_xbrl_tags.cik_from_facts_path(os.path.join(self.facts_dir, "CIK0000000011.json")),
+                         "0000000011")
+        self.assertEqual(select_xbrl_tags.cik_from_facts_path(os.path.join(self.facts_dir, "acme.json")), "0000000055")
+
+
+if __name__ == '__main__':
+    unittest.main()
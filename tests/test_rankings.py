@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+import csv
+import tempfile
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+ROWS = [
+    # cik, symbol, industry, sector, metric, value
+    ("1", "A", "Banks", "Financials", "ROE", "0.10"),
+    ("1", "A", "Banks", "Financials", "DebtToEquity", "2.0"),
+    ("2", "B", "Banks", "Financials", "ROE", "0.30"),
+    ("2", "B", "Banks", "Financials", "DebtToEquity", "1.0"),
+    ("3", "C", "Banks", "Financials", "ROE", "0.20"),
+    ("4", "D", "Software", "Technology", "ROE", "0.50"),
+    ("4", "D", "Software", "Technology", "DebtToEquity", "nan"),
+    ("4", "D", "Software", "Technology", "Revenue", "100"),
+]
+
+
+class TestComputeRankings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tags = os.path.join(self.tmp.name, "tags.csv")
+        with open(self.tags, "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["cik", "symbol", "industry", "sector", "metric", "value"])
+            w.writerows(ROWS)
+        self.rankings = select_xbrl_tags.compute_rankings(self.tags, "", 2024)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _pick(self, industry, metric, ranking_type="All"):
+        return [r for r in self.rankings
+                if r["industry"] == industry and r["metric"] == metric and r["ranking_type"] == ranking_type]
+
+    def test_metric_rankings_direction_and_sector(self):
+        roe = self._pick("Banks", "ROE")
+        self.assertEqual([(r["cik"], r["rank"]) for r in roe], [("2", 1), ("3", 2), ("1", 3)])
+        self.assertEqual({r["sector"] for r in roe}, {"Financials"})
+        dte = self._pick("Banks", "DebtToEquity")
+        self.assertEqual([r["cik"] for r in dte], ["2", "1"])
+        self.assertEqual([r["cik"] for r in self._pick("", "ROE")], ["4", "2", "3", "1"])
+        self.assertEqual(self._pick("", "Revenue"), [])
+
+    def test_composite_scores_use_group_min_max(self):
+        banks = {r["cik"]: r["composite_score"] for r in self._pick("Banks", "Composite")}
+        # ROE는 0.1~0.3으로 정규화, DebtToEquity는 1.0~2.0에서 반전
+        self.assertAlmostEqual(banks["2"], 1.0 + 1.0)
+        self.assertAlmostEqual(banks["3"], 0.5)
+        self.assertAlmostEqual(banks["1"], 0.0 + 0.0)
+        # 값이 하나뿐인 그룹은 정규화하지 않음
+        self.assertEqual(self._pick("Software", "Composite")[0]["composite_score"], 0.0)
+        overall = {r["cik"]: r["composite_score"] for r in self._pick("", "Composite")}
+        self.assertAlmostEqual(overall["4"], 1.0)
+        self.assertAlmostEqual(overall["2"], 0.5 + 1.0)
+
+    def test_top10_and_all_rows_emitted_per_group(self):
+        types = [(r["industry"], r["metric"], r["ranking_type"]) for r in self.rankings]
+        self.assertEqual(types[:6], [("Banks", "ROE", "Top10")] * 3 + [("Banks", "ROE", "All")] * 3)
+        self.assertEqual(types[-2:], [("", "Composite", "All")] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
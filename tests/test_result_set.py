@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import pickle
+import tempfile
+from types import SimpleNamespace
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+COMPANIES = [
+    {"symbol": "AAA", "cik": "0000000001", "name": "A Bank", "sector": "Financials", "industry": "Banks",
+     "sic": "6021", "sic_description": "National Commercial Banks", "fye": "1231"},
+    {"symbol": "BBB", "cik": "0000000002", "name": "B Bank", "sector": "Financials", "industry": "Banks",
+     "sic": "6021", "sic_description": "National Commercial Banks", "fye": "1231"},
+    {"symbol": "CCC", "cik": "0000000003", "name": "C Bank", "sector": "Financials", "industry": "Banks",
+     "sic": "6021", "sic_description": "National Commercial Banks", "fye": "1231"},
+]
+
+
+def _tags():
+    rows = []
+    values = {"ROE": (0.1, 0.3, 0.2), "DebtToEquity": (2.0, 1.0, None), "Revenue": (100.0, 300.0, 200.0)}
+    for i, meta in enumerate(COMPANIES):
+        for metric, vals in values.items():
+            select_xbrl_tags.add_row(rows, meta, 2024, metric, metric == "ROE", vals[i], "USD", "duration",
+                                     "2024-12-31", "10-K", f"accn-{i}", "annual", f"us-gaap:{metric}", "",
+                                     "", 0.9, "", None)
+    return rows
+
+
+class TestTagRow(unittest.TestCase):
+    def test_mapping_access_and_parsed_value(self):
+        row = _tags()[0]
+        self.assertEqual((row["metric"], row.get("value"), row.get("missing", "-")), ("ROE", "0.100000", "-"))
+        self.assertEqual(row.num, 0.1)
+        self.assertIsNone(_tags()[7].num)  # DebtToEquity 값 없음
+        with self.assertRaises(KeyError):
+            row["missing"]
+
+    def test_round_trip_through_mapping_and_pickle(self):
+        row = _tags()[1]
+        self.assertEqual(select_xbrl_tags.TagRow.from_mapping(dict(zip(select_xbrl_tags.TAGS_FIELDS, row.values()))), row)
+        again = pickle.loads(pickle.dumps(row))
+        self.assertEqual(again, row)
+        self.assertEqual(again.num, row.num)
+
+
+class TestStagesFromMemoryAndFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = {name: os.path.join(self.tmp.name, f"{name}.csv") for name in ("tags", "companies", "benchmarks", "rankings")}
+        self.results = select_xbrl_tags.ResultSet(2024, list(COMPANIES), _tags())
+        self.results.benchmarks = select_xbrl_tags.compute_benchmarks(self.results.tags, 2024)
+        self.results.rankings = select_xbrl_tags.compute_rankings(self.results.tags, self.results.benchmarks, 2024)
+        select_xbrl_tags.write_csv_rows(self.paths["tags"], select_xbrl_tags.TAGS_FIELDS, self.results.tags)
+        select_xbrl_tags.write_csv_rows(self.paths["companies"], select_xbrl_tags.COMPANIES_FIELDS, self.results.companies)
+        select_xbrl_tags.write_csv_rows(self.paths["benchmarks"], select_xbrl_tags.benchmark_fieldnames(), self.results.benchmarks)
+        select_xbrl_tags.write_csv_rows(self.paths["rankings"], select_xbrl_tags.RANKINGS_FIELDS, self.results.rankings)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_from_csv_restores_tags(self):
+        loaded = select_xbrl_tags.ResultSet.from_csv(2024, self.paths["tags"], self.paths["companies"],
+                                                     self.paths["benchmarks"], self.paths["rankings"])
+        self.assertEqual(loaded.tags, self.results.tags)
+        self.assertEqual(loaded.companies, self.results.companies)
+        self.assertEqual(len(loaded.rankings), len(self.results.rankings))
+        self.assertIsNone(select_xbrl_tags.ResultSet.from_csv(2024, self.paths["tags"]).rankings)
+
+    def test_stages_give_same_results_from_files(self):
+        self.assertEqual(select_xbrl_tags.compute_rankings(self.paths["tags"], None, 2024), self.results.rankings)
+        self.assertEqual(select_xbrl_tags.compute_benchmarks(self.paths["tags"], 2024), self.results.benchmarks)
+        mem = os.path.join(self.tmp.name, "wide_mem.csv")
+        disk = os.path.join(self.tmp.name, "wide_disk.csv")
+        select_xbrl_tags.create_wide_format_csv(self.results.tags, self.results.rankings, self.paths["companies"], 2024, mem)
+        select_xbrl_tags.create_wide_format_csv(self.paths["tags"], self.paths["rankings"], self.paths["companies"], 2024, disk)
+        self.assertEqual(self._read(mem), self._read(disk))
+        self.assertIn("ROE_Rank_Industry", self._read(mem).splitlines()[0])
+
+    def test_emit_ttl_from_memory_matches_csv_fallback(self):
+        out = {}
+        for name, benchmarks, rankings in (("mem", self.results.benchmarks, self.results.rankings), ("disk", None, None)):
+            args = SimpleNamespace(emit_ttl=os.path.join(self.tmp.name, f"{name}.ttl"), out_companies=self.paths["companies"],
+                                   out_tags=self.paths["tags"], out_benchmarks=self.paths["benchmarks"],
+                                   out_rankings=self.paths["rankings"], include_industry_scope=True, include_sector_scope=True)
+            select_xbrl_tags.emit_after_csv(args, self.results.companies, self.results.tags, benchmarks, rankings)
+            out[name] = self._read(args.emit_ttl)
+        self.assertIn("efin:IndustryBenchmark", out["mem"])
+        self.assertEqual(out["mem"], out["disk"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+from factories import company_facts
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+
+def _facts(cik, revenue):
+    return company_facts(cik, {"Revenues": revenue, "NetIncomeLoss": revenue / 10, "StockholdersEquity": revenue / 2})
+
+
+class TestIncrementalRun(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.facts_dir = os.path.join(self.dir, "facts")
+        os.makedirs(self.facts_dir)
+        for cik, revenue in ((1, 100.0), (2, 200.0), (3, 300.0)):
+            self._write_facts(cik, revenue)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_facts(self, cik, revenue):
+        with open(os.path.join(self.facts_dir, f"CIK{cik:010d}.json"), "w", encoding="utf-8") as f:
+            json.dump(_facts(cik, revenue), f)
+
+    def _path(self, name):
+        return os.path.join(self.dir, name)
+
+    def _run(self, *extra):
+        argv = ["select_xbrl_tags.py", "--fy", "2024", "--facts-dir", self.facts_dir,
+                "--subs-cache-dir", self._path("subs"), "--cache-dir", self._path("cache"),
+                "--out-tags", self._path("tags.csv"), "--out-companies", self._path("companies.csv"),
+                "--out-benchmarks", self._path("benchmarks.csv"), "--out-rankings", self._path("rankings.csv"),
+                "--out-wide", self._path("wide.csv"), "--run-manifest", self._path("manifest.json")] + list(extra)
+        with mock.patch.object(sys, "argv", argv), \
+                mock.patch.object(select_xbrl_tags, "extract_company", wraps=select_xbrl_tags.extract_company) as spy, \
+                mock.patch("sys.stdout"), mock.patch("sys.stderr"):
+            select_xbrl_tags.main()
+        with open(self._path("tags.csv"), encoding="utf-8") as f:
+            tags = f.read()
+        return sorted(call.args[0]["cik"] for call in spy.call_args_list), tags
+
+    def test_only_changed_companies_are_reextracted(self):
+        extracted, first = self._run()
+        self.assertEqual(extracted, ["0000000001", "0000000002", "0000000003"])
+        extracted, again = self._run()
+        self.assertEqual(extracted, [])
+        self.assertEqual(again, first)
+
+        self._write_facts(2, 250.0)
+        extracted, changed = self._run()
+        self.assertEqual(extracted, ["0000000002"])
+        self.assertIn("250.000000", changed)
+        self.assertNotIn("200.000000", changed)
+        with open(self._path("manifest.json"), encoding="utf-8") as f:
+            self.assertEqual(sorted(json.load(f)["companies"]), ["0000000001", "0000000002", "0000000003"])
+
+    def test_parameter_change_or_edited_csv_forces_full_run(self):
+        self._run()
+        extracted, _ = self._run("--fy-tol-days", "120")
+        self.assertEqual(len(extracted), 3)
+        with open(self._path("tags.csv"), "a", encoding="utf-8") as f:
+            f.write("\n")
+        extracted, _ = self._run("--fy-tol-days", "120")
+        self.assertEqual(len(extracted), 3)
+
+    def test_content_digest_uses_cache_object_name(self):
+        digest = "ab" * 32
+        self.assertEqual(select_xbrl_tags.content_digest(f"/nowhere/{digest}.json.gz"), digest)
+        self.assertEqual(select_xbrl_tags.content_digest(None), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
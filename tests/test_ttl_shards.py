@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+import glob
+import tempfile
+
+import rdflib
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+COMPANIES = [{"cik": str(cik), "symbol": f"S{cik}", "name": f"Company {cik}", "sector": "Financials" if cik % 2 else "Energy",
+              "industry": f"Industry{cik % 3}", "sic": "6021", "fye": "1231"} for cik in range(1, 8)]
+OBSERVATIONS = [{"cik": str(1 + i % 6), "fy": "2024", "metric": f"Metric{i % 5}", "end": f"2024-12-{1 + i % 28:02d}",
+                 "period_type": "duration", "is_derived": "false", "unit": "USD" if i % 3 else "shares",
+                 "value": str(i * 2.5), "form": "10-K", "source_type": "annual", "selected_tag": f"us-gaap:Tag{i % 4}"}
+                for i in range(120)]
+BENCHMARKS = [{"industry": "", "sector": "", "metric": "Metric1", "fy": 2024, "average_value": 1.0, "sample_size": 6}]
+RANKINGS = [{"cik": "2", "symbol": "S2", "industry": "", "sector": "", "metric": "Metric1",
+             "ranking_type": "Top10", "rank": 1, "value": 5.0, "composite_score": None}]
+
+
+class TestShardedEmission(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _graph(self, paths, fmt):
+        g = rdflib.Graph()
+        for path in paths:
+            g.parse(path, format=fmt)  # 샤드 하나하나가 독립적으로 파싱되어야 함
+        return g
+
+    def test_shards_union_equals_single_file(self):
+        single = os.path.join(self.tmp.name, "single.ttl")
+        select_xbrl_tags.emit_efin_ttl(COMPANIES, OBSERVATIONS, single, BENCHMARKS, RANKINGS)
+        expected = set(self._graph([single], "turtle"))
+        for workers in (1, 2):
+            out = os.path.join(self.tmp.name, f"w{workers}", "inst.ttl")
+            os.makedirs(os.path.dirname(out))
+            paths = select_xbrl_tags.emit_efin_ttl_sharded(COMPANIES, iter(OBSERVATIONS), out, 3, BENCHMARKS, RANKINGS,
+                                                          workers=workers)
+            self.assertEqual(paths[0], os.path.join(os.path.dirname(out), "inst.header.ttl"))
+            self.assertEqual(sorted(paths), sorted(glob.glob(os.path.join(os.path.dirname(out), "*.ttl"))))
+            self.assertEqual(len(paths), 4)
+            self.assertEqual(set(self._graph(paths, "turtle")), expected)
+            # 공유 인스턴스는 header에만
+            for path in paths[1:]:
+                with open(path, encoding="utf-8") as f:
+                    content = f.read()
+                self.assertNotIn("a efin:Unit", content)
+                self.assertNotIn("a efin:XBRLConcept", content)
+                self.assertNotIn("owl:Ontology", content)
+
+    def test_industry_without_sector_in_first_company(self):
+        # Industry X를 처음 가진 회사는 sector가 없고, 다른 샤드의 뒤 회사만 sector가 있으면
+        # 단일 파일에는 X의 inSectorOf가 없으므로 샤드에도 없어야 함
+        companies = [dict(c, sector="" if c["cik"] in ("1", "2") else c["sector"]) for c in COMPANIES]
+        single = os.path.join(self.tmp.name, "single.ttl")
+        select_xbrl_tags.emit_efin_ttl(companies, OBSERVATIONS, single, BENCHMARKS, RANKINGS)
+        expected = set(self._graph([single], "turtle"))
+        for shards in (2, 4):
+            paths = select_xbrl_tags.emit_efin_ttl_sharded(companies, OBSERVATIONS, os.path.join(self.tmp.name, f"s{shards}.ttl"),
+                                                          shards, BENCHMARKS, RANKINGS, workers=1)
+            self.assertEqual(set(self._graph(paths, "turtle")), expected, msg=shards)
+
+    def test_partition_keeps_companies_whole(self):
+        parts = select_xbrl_tags.partition_by_cik(COMPANIES, OBSERVATIONS, 4)
+        self.assertEqual(sum(len(obs) for _, obs in parts), len(OBSERVATIONS))
+        seen = set()
+        for companies, obs in parts:
+            ciks = {c["cik"] for c in companies}
+            self.assertTrue({o["cik"] for o in obs} <= ciks)
+            self.assertFalse(ciks & seen)
+            seen |= ciks
+        self.assertEqual(len(select_xbrl_tags.partition_by_cik(COMPANIES[:2], [], 5)), 2)
+
+    def test_nt_shards(self):
+        single = os.path.join(self.tmp.name, "single.nt")
+        select_xbrl_tags.emit_efin_ttl(COMPANIES, OBSERVATIONS, single, BENCHMARKS, RANKINGS, fmt="nt")
+        paths = select_xbrl_tags.emit_efin_ttl_sharded(COMPANIES, OBSERVATIONS, os.path.join(self.tmp.name, "inst.nt"),
+                                                      2, BENCHMARKS, RANKINGS, fmt="nt", workers=1)
+        self.assertEqual(set(self._graph(paths, "nt")), set(self._graph([single], "nt")))
+
+
+if __name__ == '__main__':
+    unittest.main()
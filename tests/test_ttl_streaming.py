@@ -0,0 +1,59 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+COMPANIES = [{"cik": "320193", "symbol": "AAPL", "name": "Apple Inc.", "sector": "Information Technology",
+              "industry": "Technology Hardware", "sic": "3571", "fye": "0930"}]
+
+
+def _observations(n):
+    for i in range(n):
+        yield {"cik": "320193", "fy": "2024", "metric": f"Metric{i % 7}", "end": f"2024-09-{1 + i % 28:02d}",
+               "period_type": "duration" if i % 3 else "instant", "is_derived": "true" if i % 2 else "false",
+               "unit": "USD" if i % 4 else "shares", "value": str(i * 1.5), "form": "10-K",
+               "source_type": "annual", "selected_tag": f"us-gaap:Tag{i % 5}", "computed_from": "Revenue(cur),NetIncome"}
+
+
+class TestStreamingTTL(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_chunked_writer_matches_join(self):
+        lines = ["a", "", "b ;", ".", ""]
+        for chunk in (1, 2, 3, 100):
+            path = os.path.join(self.tmp.name, f"{chunk}.txt")
+            select_xbrl_tags.write_lines_chunked(path, iter(lines), chunk_lines=chunk)
+            self.assertEqual(self._read(path), "\n".join(lines))
+
+    def test_observations_can_be_a_one_shot_iterator(self):
+        rankings = [{"cik": "320193", "symbol": "AAPL", "industry": "", "sector": "", "metric": "ROE",
+                     "ranking_type": "Top10", "rank": 1, "value": 0.5, "composite_score": None}]
+        streamed = os.path.join(self.tmp.name, "streamed.ttl")
+        listed = os.path.join(self.tmp.name, "listed.ttl")
+        select_xbrl_tags.emit_efin_ttl(COMPANIES, _observations(500), streamed, rankings=rankings)
+        select_xbrl_tags.emit_efin_ttl(COMPANIES, list(_observations(500)), listed, rankings=rankings)
+        content = self._read(streamed)
+        self.assertEqual(content, self._read(listed))
+        self.assertEqual(content, "\n".join(select_xbrl_tags.iter_efin_ttl_lines(COMPANIES, _observations(500), rankings=rankings)))
+        # 중복 제거된 Unit/XBRLConcept는 관측값 뒤에 한 번씩만
+        self.assertEqual(content.count("efin:UnitUsd a efin:Unit ."), 1)
+        self.assertEqual(content.count("a efin:XBRLConcept ;"), 5)
+        # 랭킹 fy는 첫 번째 관측값에서
+        self.assertIn("efin:TopRankingAllRoeTop102024" + "0000320193", content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import glob
+import random
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+# Add scripts directory to path to import select_xbrl_tags
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+import select_xbrl_tags
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.cache/companyfacts'))
+
+
+def _random_facts(rng, n_concepts=20):
+    # 같은 end/점수의 중복, 여러 unit, 날짜 형식 혼합, 숫자 아닌 val 포함
+    concepts = {}
+    for c in range(n_concepts):
+        units = {}
+        for unit in rng.sample(["USD", "EUR", "shares"], k=rng.randint(1, 3)):
+            arr = []
+            for i in range(rng.randint(0, 60)):
+                end = date(2019, 1, 1) + timedelta(days=rng.choice([rng.randint(0, 2200), 365 * rng.randint(0, 6)]))
+                r = {"end": end.isoformat() if rng.random() < 0.9 else end.strftime("%m/%d/%Y"),
+                     "val": rng.choice([1.0, 2, rng.random(), "n/a"]), "accn": f"{c}-{unit}-{i}",
+                     "fp": rng.choice(["FY", "fy", "CY", "Q1", "Q2", "Q3", "Q4", "", None]), "form": "10-K"}
+                if rng.random() < 0.4:
+                    r["qtrs"] = rng.choice([1, 3, 4])
+                arr.append(r)
+            units[unit] = arr
+        concepts[f"C{c}"] = {"units": units}
+    return {"facts": {"us-gaap": concepts}}
+
+
+def _expected(facts, qname, anchors, tol, prefer_unit, only, dbg):
+    unit_map = select_xbrl_tags.get_unit_records(facts, qname)
+    order = [prefer_unit] + [u for u in unit_map if u != prefer_unit]
+    pool = [r for u in order for r in unit_map.get(u, []) if isinstance(r.get("val"), (int, float))]
+    if only == "annual":
+        pool = [r for r in pool if str(r.get("fp") or "").upper() in ("FY", "CY", "FYR")]
+    elif only == "q4":
+        pool = [r for r in pool if r.get("qtrs") == 4]
+    return select_xbrl_tags.smart_pick(pool, anchors, tol, dbg)
+
+
+@unittest.skipIf(select_xbrl_tags.np is None, "numpy not installed")
+class TestVectorizedSmartPick(unittest.TestCase):
+    """smart_pick_arrays 경로(VECTOR_PICK_MIN_ROWS=0으로 강제)가 기존 smart_pick과 같은 레코드를 고르는지 비교"""
+
+    def setUp(self):
+        self.dbg = select_xbrl_tags.Debugger(enabled=False)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _check(self, facts, indexes, fys, subs):
+        qnames = list(indexes[0].qnames())
+        for fy in fys:
+            anchors = select_xbrl_tags.anchors_for_fy(fy, subs)
+            for qname in qnames:
+                for tol in (0, 30, 90, 400):
+                    for only in (None, "annual", "q4"):
+                        for unit in ("USD", "shares"):
+                            expected = _expected(facts, qname, anchors, tol, unit, only, self.dbg)
+                            for index in indexes:
+                                with self.subTest(index=type(index).__name__, qname=qname, fy=fy, tol=tol, only=only, unit=unit):
+                                    with mock.patch.object(select_xbrl_tags, "VECTOR_PICK_MIN_ROWS", 0):
+                                        got = select_xbrl_tags.smart_pick_indexed(index, qname, anchors, tol, unit, only)
+                                    if expected is None:
+                                        self.assertIsNone(got)
+                                    else:
+                                        self.assertEqual((got.accn, got.val, got.end), (expected["accn"], expected["val"], expected["end"]))
+
+    def _indexes(self, facts, key):
+        store = select_xbrl_tags.FactColumnStore(self.tmp.name)
+        return [select_xbrl_tags.CompanyFactIndex(facts), store.ingest(key, facts, "sig")]
+
+    def test_random_facts_match_smart_pick(self):
+        rng = random.Random(20240928)
+        for n in range(3):
+            facts = _random_facts(rng)
+            subs = {"fiscalYearEnd": rng.choice(["1231", "0928", "0630"])}
+            self._check(facts, self._indexes(facts, f"CIK{n:010d}"), (2021, 2023), subs)
+
+    def test_empty_concept(self):
+        arrs = select_xbrl_tags.CompanyFactIndex({"facts": {}}).pick_arrays("us-gaap:Missing", "USD")
+        self.assertEqual(select_xbrl_tags.smart_pick_arrays(arrs, [738000], 90), -1)
+
+    @unittest.skipUnless(glob.glob(os.path.join(CACHE_DIR, "**", "*.json*"), recursive=True), "no cached companyfacts")
+    def test_cached_companyfacts_match_smart_pick(self):
+        paths = sorted(glob.glob(os.path.join(CACHE_DIR, "**", "*.json*"), recursive=True))[:3]
+        for n, path in enumerate(paths):
+            facts = select_xbrl_tags.prune_facts(select_xbrl_tags.load_json_file(path),
+                                                 select_xbrl_tags.resolve_facts_taxonomies("std"))
+            self._check(facts, self._indexes(facts, f"CIK{n:010d}"), (2023,), {"fiscalYearEnd": "1231"})
+
+
+if __name__ == '__main__':
+    unittest.main()